@@ -15,23 +15,26 @@
 
 
 import os
-import re
+import io
+import json
+import struct
 import pickle
 import gzip
-from functools import lru_cache
+from functools import lru_cache, partial
 import math
+import hashlib
+import time
+import contextlib
+import threading
+from collections import Counter
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 
 
-from pronto import Ontology
-import matplotlib.pyplot as plt
-import requests
 import numpy
-from scipy import stats
-import p_tqdm,tqdm
+import tqdm
 
-# Not requiring gui so we select agg backend
-import matplotlib
-matplotlib.use("Agg")
+# requests, matplotlib and p_tqdm are imported where they are used, so importing IC_lib stays cheap for lookups that never touch them
 
 ###############################################################################
 # CONFIG CONSTANTS
@@ -39,24 +42,45 @@ matplotlib.use("Agg")
 BASIC_OBO = False  # True for using go-basic.obo, False for go.obo
 CPU_COUNT = int(os.cpu_count())  # Change this to select the number of cores
 
+# This may be deprecated some day
+OBO_URL = "http://purl.obolibrary.org/obo/go.obo"
+OBO_BASIC_URL = (
+    "http://purl.obolibrary.org/obo/go-basic.obo"  # This may be deprecated some day
+)
+
+# Folder structure, folders are created when something is written in them
+DATA_FOLDER = "data/"
+ANNOTATIONS_FOLDER = "annotations/"
+PLOTS_FOLDER = "plots/"
+TSVOUTPUTS_FOLDER = "outputs/"
+
+# Data files
+# We can use go-basic.obo or go.obo (go-basic is a simplified version)
+OBO_PATH = DATA_FOLDER + ("go-basic.obo" if BASIC_OBO else "go.obo")
+DAG_PATH = DATA_FOLDER + "godag.compiled"
+GOA_UNIVERSE = ANNOTATIONS_FOLDER + "goa_uniprot_all.universe"
+
+# PICKLE
+UNIVERSE_COUNT_PICKLE = DATA_FOLDER + "universe.pickle"
+PRECOMPUTED_PICKLE = DATA_FOLDER + "goa_uniprot_all.pickle"
+
 
 ###############################################################################
 # UTILS
 ###############################################################################
 # Creates a new folder if it doesn't exists
 def new_folder(FOLDER):
-    if not os.path.exists(FOLDER):
-        os.mkdir(FOLDER)
+    if FOLDER and not os.path.exists(FOLDER):
+        os.makedirs(FOLDER)
     return FOLDER
 
 # Remote file requests
 
 
-def get_remote_file(URL, FILEPATH):
-    if not os.path.exists(FILEPATH):
-        data = requests.get(URL).text
-        with open(FILEPATH, "w") as fwrite:
-            fwrite.write(data)
+def get_remote_file(URL, FILEPATH, refresh=False):
+    if refresh or not os.path.exists(FILEPATH):
+        new_folder(os.path.dirname(FILEPATH))
+        download_file(URL, FILEPATH, refresh=refresh)
     return FILEPATH
 
 # Pickle object to file
@@ -75,411 +99,3440 @@ def unpickle_object(FILEPATH):
     return data
 
 
+# Hex sha256 of a file, read in chunks
+def file_sha256(FILEPATH, chunk_size=16 * 1024 * 1024):
+    digest = hashlib.sha256()
+    with open(FILEPATH, "rb") as fread:
+        for chunk in iter(lambda: fread.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+###############################################################################
+# DOWNLOADS
+###############################################################################
+# Files are streamed to FILEPATH.part and moved into place once complete and
+# checked. FILEPATH.download.json keeps ETag/Last-Modified, size and sha256,
+# used for conditional refreshes (304 = unchanged) and for resuming
+# interrupted downloads with HTTP Range requests.
+DOWNLOAD_WORKERS = 8
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_TIMEOUT = 60
+
+
+def read_download_meta(FILEPATH):
+    if os.path.exists(FILEPATH + ".download.json"):
+        with open(FILEPATH + ".download.json", "r") as fread:
+            return json.load(fread)
+    return {}
+
+
+def write_download_meta(FILEPATH, meta):
+    with open(FILEPATH + ".download.json", "w") as fwrite:
+        json.dump(meta, fwrite)
+
+
+# Total size announced by a 200 or 206 response, None if unknown
+def response_size(response):
+    if response.status_code == 206:
+        total = response.headers.get("Content-Range", "").rsplit("/", 1)[-1]
+        return int(total) if total.isdigit() else None
+    length = response.headers.get("Content-Length")
+    return int(length) if length and length.isdigit() else None
+
+
+# Downloads URL into FILEPATH.
+# An existing file is kept unless refresh is set, in which case it is only
+# downloaded again if the server says it changed. A leftover .part file is
+# resumed. Returns (FILEPATH, changed)
+def download_file(URL, FILEPATH, refresh=False, sha256=None):
+    import requests
+
+    part_path = FILEPATH + ".part"
+    if os.path.exists(FILEPATH) and not refresh:
+        return FILEPATH, False
+
+    meta = read_download_meta(FILEPATH)
+    # Compressed transfers would break both Range offsets and .gz files
+    headers = {"Accept-Encoding": "identity"}
+    if os.path.exists(FILEPATH):
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+    partial_meta = meta.get("partial", {})
+    if os.path.exists(part_path) and (partial_meta.get("etag") or partial_meta.get("last_modified")):
+        headers["Range"] = "bytes=%d-" % os.path.getsize(part_path)
+        headers["If-Range"] = partial_meta.get("etag") or partial_meta.get("last_modified")
+
+    with requests.get(URL, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+        if response.status_code == 304:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            return FILEPATH, False
+        if response.status_code == 416:
+            # The part does not fit the remote file anymore, start again
+            os.remove(part_path)
+            meta.pop("partial", None)
+            write_download_meta(FILEPATH, meta)
+            return download_file(URL, FILEPATH, refresh, sha256)
+        response.raise_for_status()
+
+        meta["partial"] = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+        write_download_meta(FILEPATH, meta)
+        with open(part_path, "ab" if response.status_code == 206 else "wb") as fwrite:
+            for chunk in response.raw.stream(DOWNLOAD_CHUNK_SIZE, decode_content=False):
+                if chunk:
+                    fwrite.write(chunk)
+        expected_size = response_size(response)
+
+    size = os.path.getsize(part_path)
+    if expected_size is not None and size != expected_size:
+        raise IOError("Incomplete download of {URL}: {SIZE} of {EXPECTED} bytes".format(
+            URL=URL, SIZE=size, EXPECTED=expected_size))
+    part_sha256 = file_sha256(part_path)
+    if sha256 is not None and part_sha256 != sha256:
+        os.remove(part_path)
+        raise IOError("Checksum mismatch for " + URL)
+
+    os.replace(part_path, FILEPATH)
+    write_download_meta(FILEPATH, {
+        "url": URL,
+        "etag": meta["partial"]["etag"],
+        "last_modified": meta["partial"]["last_modified"],
+        "size": size,
+        "sha256": part_sha256,
+    })
+    return FILEPATH, True
+
+
+# Downloads (URL, FILEPATH) jobs with a bounded thread pool and yields every
+# FILEPATH as soon as it is ready, so it can be processed meanwhile
+def download_files(jobs, refresh=False, max_workers=DOWNLOAD_WORKERS, progress=False):
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(download_file, url, filepath, refresh) for url, filepath in jobs]
+        for i, future in enumerate(as_completed(futures)):
+            filepath, changed = future.result()
+            if progress:
+                print(filepath, "downloaded" if changed else "unchanged", str(i + 1) + "/" + str(len(futures)))
+            yield filepath
+
+
 ###############################################################################
 # OBO
 ###############################################################################
+# Single pass OBO reader.
+# Collects, for every [Term] stanza: id, name, namespace, alt_ids,
+# is_obsolete, replaced_by, is_a parents and the parents of the requested
+# relationships (e.g. part_of), plus the header tags. Everything is kept in
+# per term lists, nothing else from the file is stored.
+def read_obo(FILEPATH, relationships=("part_of",)):
+    ontology = {
+        "header": {},
+        "ids": [],
+        "names": [],
+        "namespaces": [],
+        "alt_ids": [],
+        "obsolete": [],
+        "replaced_by": [],
+        "is_a": [],
+        "relationships": {x: [] for x in relationships},
+    }
+    ids = ontology["ids"]
+    in_header = True
+    in_term = False
+    with open(FILEPATH, "r", encoding="utf-8") as fread:
+        for line in fread:
+            if line.startswith("["):
+                in_header = False
+                in_term = line.startswith("[Term]")
+                continue
+            tag, _, value = line.partition(": ")
+            value = value.rstrip("\n")
+            if in_header:
+                if value:
+                    ontology["header"][tag] = value
+                continue
+            if not in_term or not value:
+                continue
+            if tag == "id":
+                ids.append(value)
+                ontology["names"].append("")
+                ontology["namespaces"].append(None)
+                ontology["alt_ids"].append([])
+                ontology["obsolete"].append(False)
+                ontology["replaced_by"].append(None)
+                ontology["is_a"].append([])
+                for x in relationships:
+                    ontology["relationships"][x].append([])
+            elif not ids:
+                continue
+            elif tag == "name":
+                ontology["names"][-1] = value
+            elif tag == "namespace":
+                ontology["namespaces"][-1] = value
+            elif tag == "alt_id":
+                ontology["alt_ids"][-1].append(value.split(" ", 1)[0])
+            elif tag == "is_a":
+                ontology["is_a"][-1].append(value.split(" ", 1)[0])
+            elif tag == "relationship":
+                fields = value.split(" ", 2)
+                if fields[0] in ontology["relationships"] and len(fields) > 1:
+                    ontology["relationships"][fields[0]][-1].append(fields[1])
+            elif tag == "is_obsolete":
+                ontology["obsolete"][-1] = value.strip() == "true"
+            elif tag == "replaced_by":
+                ontology["replaced_by"][-1] = value.split(" ", 1)[0]
+    return ontology
+
+
 # Simple OBO parser, Only GO_ids are returned
+# {GO id or alt_id: [name, namespace]}
 def parse_obo(FILEPATH):
-    regex = re.compile("alt_id: (GO:.*)\n")
-    with open(FILEPATH, "r") as fread:
-        data = [
-            [y]
-            + [
-                y.split(": ")[1].strip()
-                for y in x.strip().split("\n")
-                if y and ":" in y
-            ][1:3]
-            for x in fread.read().replace(";", ",").split("\n\n")
-            if x and ("[Term]" in x)
-            for y in (
-                [x.strip().split("\n")[1].split(": ")[
-                    1].strip()] + regex.findall(x)
+    ontology = read_obo(FILEPATH, relationships=())
+    data = {}
+    for i, goterm in enumerate(ontology["ids"]):
+        for x in [goterm] + ontology["alt_ids"][i]:
+            data[x] = [ontology["names"][i].replace(";", ","), ontology["namespaces"][i]]
+    return data
+
+
+###############################################################################
+# COMPILED GO DAG
+###############################################################################
+# The pronto Ontology was slow to build and unpickle and it was copied into
+# every worker. The DAG is compiled once from go.obo into a flat binary file (GO ids as integers, is_a
+# parents/children as CSR arrays, alt_id, namespace and name tables) that is
+# opened with numpy.memmap, so loading is instant and pages are shared.
+ARRAY_FILE_MAGIC = b"CICARR01"
+ARRAY_FILE_ALIGN = 64
+GODAG_FORMAT_VERSION = 3
+NAMESPACES = ("biological_process", "cellular_component", "molecular_function")
+
+
+def _align(offset):
+    return (offset + ARRAY_FILE_ALIGN - 1) // ARRAY_FILE_ALIGN * ARRAY_FILE_ALIGN
+
+
+# Writes a dict of numpy arrays plus a json header into a single file.
+# The file is written to a temporary path and moved, so readers never see
+# a half written file.
+def write_array_file(FILEPATH, arrays, meta=None):
+    arrays = {name: numpy.ascontiguousarray(arrays[name]) for name in arrays}
+    entries = {}
+    offset = 0
+    for name, array in arrays.items():
+        entries[name] = {
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "offset": offset,
+        }
+        offset = _align(offset + array.nbytes)
+    header = json.dumps({"meta": meta or {}, "arrays": entries}).encode()
+    data_start = _align(len(ARRAY_FILE_MAGIC) + 8 + len(header))
+
+    tmp_path = FILEPATH + ".tmp"
+    with open(tmp_path, "wb") as fwrite:
+        fwrite.write(ARRAY_FILE_MAGIC)
+        fwrite.write(struct.pack("<Q", len(header)))
+        fwrite.write(header)
+        for name, array in arrays.items():
+            fwrite.seek(data_start + entries[name]["offset"])
+            # No copy, memory mapped arrays are written straight from disk
+            fwrite.write(array.reshape(-1).view(numpy.uint8))
+        fwrite.truncate(data_start + offset)
+    os.replace(tmp_path, FILEPATH)
+    return FILEPATH
+
+
+# Reads the json header of an array file
+def read_array_header(FILEPATH):
+    with open(FILEPATH, "rb") as fread:
+        if fread.read(len(ARRAY_FILE_MAGIC)) != ARRAY_FILE_MAGIC:
+            raise ValueError(FILEPATH + " is not a compiled array file")
+        (header_len,) = struct.unpack("<Q", fread.read(8))
+        header = json.loads(fread.read(header_len))
+    header["data_start"] = _align(len(ARRAY_FILE_MAGIC) + 8 + header_len)
+    return header
+
+
+# Opens every array of the file as a read only numpy.memmap
+def read_array_file(FILEPATH):
+    header = read_array_header(FILEPATH)
+    arrays = {}
+    for name, entry in header["arrays"].items():
+        dtype = numpy.dtype(entry["dtype"])
+        shape = tuple(entry["shape"])
+        if 0 in shape:
+            arrays[name] = numpy.empty(shape, dtype=dtype)
+        else:
+            arrays[name] = numpy.memmap(
+                FILEPATH,
+                dtype=dtype,
+                mode="r",
+                offset=header["data_start"] + entry["offset"],
+                shape=shape,
             )
+    return header["meta"], arrays
+
+
+# GO:0008150 -> 8150, None for anything that is not a GO id
+def go_number(goterm):
+    digits = goterm[3:]
+    if goterm.startswith("GO:") and digits.isascii() and digits.isdigit():
+        return int(digits)
+    return None
+
+
+def go_number_or_missing(goterm):
+    number = go_number(goterm) if goterm else None
+    return -1 if number is None else number
+
+
+def go_string(number):
+    return "GO:%07d" % number
+
+
+# Vectorized go_number for an array/list of GO id strings, -1 where invalid.
+# Reads the digits straight from the unicode buffer, no per item Python work.
+def go_numbers_array(goterms):
+    goterms = numpy.asarray(goterms)
+    if goterms.dtype.kind == "S":
+        goterms = numpy.char.decode(goterms, "ascii", "replace")
+    elif goterms.dtype.kind != "U":
+        goterms = goterms.astype("U")
+    numbers = numpy.full(goterms.shape, -1, dtype=numpy.int64)
+    if goterms.size == 0:
+        return numbers
+    valid = numpy.char.str_len(goterms) == 10
+    chars = numpy.ascontiguousarray(goterms.astype("U10")).view(numpy.uint32).reshape(goterms.shape + (10,))
+    digits = chars[..., 3:].astype(numpy.int64) - ord("0")
+    valid &= (chars[..., 0] == ord("G")) & (chars[..., 1] == ord("O")) & (chars[..., 2] == ord(":"))
+    valid &= ((digits >= 0) & (digits <= 9)).all(axis=-1)
+    numbers[valid] = (digits[valid] * 10 ** numpy.arange(6, -1, -1)).sum(axis=-1)
+    return numbers
+
+
+# Packs a list of lists of ints into CSR (indptr, indices) arrays
+def to_csr(adjacency):
+    indptr = numpy.zeros(len(adjacency) + 1, dtype=numpy.int64)
+    indptr[1:] = numpy.cumsum([len(x) for x in adjacency])
+    indices = numpy.fromiter(
+        (y for x in adjacency for y in x), dtype=numpy.int32, count=int(indptr[-1])
+    )
+    return indptr, indices
+
+
+# Packs a list of strings into (utf8 bytes, offsets) arrays
+def to_string_table(strings):
+    encoded = [x.encode() for x in strings]
+    offsets = numpy.zeros(len(encoded) + 1, dtype=numpy.int64)
+    offsets[1:] = numpy.cumsum([len(x) for x in encoded])
+    return numpy.frombuffer(b"".join(encoded), dtype=numpy.uint8), offsets
+
+
+# List of strings back from (utf8 bytes, offsets) arrays
+def from_string_table(data, offsets):
+    data = bytes(data)
+    offsets = numpy.asarray(offsets).tolist()
+    return [data[offsets[i]:offsets[i + 1]].decode() for i in range(len(offsets) - 1)]
+
+
+# Gathers several (start, length) slices of `indices` at once.
+# Returns the slice owning each value and the values
+def gather_rows(starts, lengths, indices):
+    owner = numpy.repeat(numpy.arange(len(starts)), lengths)
+    first = numpy.cumsum(lengths) - lengths
+    positions = numpy.repeat(starts - first, lengths) + numpy.arange(int(lengths.sum()))
+    return owner, indices[positions]
+
+
+def csr_rows(indptr, indices, rows):
+    return gather_rows(indptr[rows], indptr[rows + 1] - indptr[rows], indices)
+
+
+# Swaps rows and columns of a CSR adjacency (parents <-> children)
+def transpose_csr(indptr, indices, size):
+    rows = numpy.repeat(numpy.arange(size, dtype=numpy.int32), numpy.diff(indptr))
+    order = numpy.lexsort((rows, indices))
+    new_indptr = numpy.zeros(size + 1, dtype=numpy.int64)
+    new_indptr[1:] = numpy.cumsum(numpy.bincount(indices, minlength=size))
+    return new_indptr, rows[order]
+
+
+# Kahn layering of the is_a graph.
+# Every term lands one generation after its deepest parent, so walking
+# generations in order always visits parents before children.
+def topological_generations(parents_indptr, children_indptr, children_indices):
+    size = len(parents_indptr) - 1
+    indegree = numpy.diff(parents_indptr)
+    frontier = numpy.flatnonzero(indegree == 0)
+    generations = []
+    visited = 0
+    while len(frontier):
+        generations.append(frontier)
+        visited += len(frontier)
+        _, kids = csr_rows(children_indptr, children_indices, frontier)
+        numpy.subtract.at(indegree, kids, 1)
+        kids = numpy.unique(kids)
+        frontier = kids[indegree[kids] == 0]
+    if visited != size:
+        raise ValueError("The is_a graph has a cycle")
+    order = numpy.concatenate(generations) if generations else numpy.zeros(0, dtype=numpy.int64)
+    generation_indptr = numpy.zeros(len(generations) + 1, dtype=numpy.int64)
+    generation_indptr[1:] = numpy.cumsum([len(x) for x in generations])
+    return order.astype(numpy.int32), generation_indptr
+
+
+# Transitive is_a ancestors of every term as CSR, one generation at a time:
+# the ancestors of a term are its parents plus the ancestors of its parents.
+def ancestor_closure(parents_indptr, parents_indices, order, generation_indptr):
+    size = len(parents_indptr) - 1
+    starts = numpy.zeros(size, dtype=numpy.int64)
+    lengths = numpy.zeros(size, dtype=numpy.int64)
+    buffer = numpy.zeros(max(size, 1), dtype=numpy.int32)
+    used = 0
+    for g in range(1, len(generation_indptr) - 1):
+        generation = order[generation_indptr[g]:generation_indptr[g + 1]]
+        owner, parents = csr_rows(parents_indptr, parents_indices, generation)
+        nodes = generation[owner]
+        lifted_owner, lifted = gather_rows(starts[parents], lengths[parents], buffer)
+        keys = numpy.unique(numpy.concatenate([
+            nodes.astype(numpy.int64) * size + parents,
+            nodes[lifted_owner].astype(numpy.int64) * size + lifted,
+        ]))
+        key_nodes = keys // size
+        if used + len(keys) > len(buffer):
+            buffer = numpy.concatenate([buffer, numpy.zeros(max(len(buffer), len(keys)), dtype=numpy.int32)])
+        buffer[used:used + len(keys)] = keys % size
+        unique_nodes, first_key, counts = numpy.unique(key_nodes, return_index=True, return_counts=True)
+        starts[unique_nodes] = used + first_key
+        lengths[unique_nodes] = counts
+        used += len(keys)
+    indptr = numpy.zeros(size + 1, dtype=numpy.int64)
+    indptr[1:] = numpy.cumsum(lengths)
+    _, indices = gather_rows(starts, lengths, buffer)
+    return indptr, indices.astype(numpy.int32)
+
+
+def obo_signature(OBO_FILEPATH):
+    stat = os.stat(OBO_FILEPATH)
+    return {"size": stat.st_size, "mtime": int(stat.st_mtime)}
+
+
+# Compiles the OBO into the DAG_PATH binary file
+def compile_godag(OBO_FILEPATH, FILEPATH):
+    print("Compiling GO DAG", OBO_FILEPATH, "->", FILEPATH)
+    ontology = read_obo(OBO_FILEPATH, relationships=("part_of",))
+    order = sorted(
+        [i for i, x in enumerate(ontology["ids"]) if go_number(x) is not None],
+        key=lambda i: go_number(ontology["ids"][i]),
+    )
+    numbers = numpy.array([go_number(ontology["ids"][i]) for i in order], dtype=numpy.int32)
+    position = {ontology["ids"][i]: p for p, i in enumerate(order)}
+
+    def edges(parent_lists):
+        return [
+            sorted(set(position[y] for y in parent_lists[i] if y in position))
+            for i in order
         ]
-    return {x[0]: x[1::] for x in data}
 
+    parents = edges(ontology["is_a"])
+    children = [[] for x in order]
+    for i, x in enumerate(parents):
+        for y in x:
+            children[y].append(i)
+
+    alt_pairs = sorted(
+        (go_number(alt), p)
+        for p, i in enumerate(order)
+        for alt in set(ontology["alt_ids"][i])
+        if go_number(alt) is not None
+    )
+    term_alts = [[] for x in order]
+    for alt, p in alt_pairs:
+        term_alts[p].append(alt)
+    names, names_offsets = to_string_table([ontology["names"][i] for i in order])
+
+    arrays = {
+        "go_numbers": numbers,
+        "namespace": numpy.array(
+            [NAMESPACES.index(ontology["namespaces"][i]) if ontology["namespaces"][i] in NAMESPACES else -1 for i in order],
+            dtype=numpy.int8,
+        ),
+        "obsolete": numpy.array([ontology["obsolete"][i] for i in order], dtype=numpy.bool_),
+        "replaced_by": numpy.array(
+            [go_number_or_missing(ontology["replaced_by"][i]) for i in order], dtype=numpy.int32
+        ),
+        "alt_numbers": numpy.array([x[0] for x in alt_pairs], dtype=numpy.int32),
+        "alt_targets": numpy.array([x[1] for x in alt_pairs], dtype=numpy.int32),
+        "names": names,
+        "names_offsets": names_offsets,
+    }
+    arrays["parents_indptr"], arrays["parents_indices"] = to_csr(parents)
+    arrays["children_indptr"], arrays["children_indices"] = to_csr(children)
+    arrays["part_of_indptr"], arrays["part_of_indices"] = to_csr(edges(ontology["relationships"]["part_of"]))
+    arrays["term_alt_indptr"], arrays["term_alt_numbers"] = to_csr(term_alts)
+    add_closures(arrays)
+
+    # Direct GO number -> term index table, -1 if missing
+    go_index = numpy.full(int(numbers.max()) + 1 if len(numbers) else 0, -1, dtype=numpy.int32)
+    go_index[numbers] = numpy.arange(len(numbers), dtype=numpy.int32)
+    arrays["go_index"] = go_index
+
+    meta = {
+        "format_version": GODAG_FORMAT_VERSION,
+        "data_version": ontology["header"].get("data-version"),
+        "source": obo_signature(OBO_FILEPATH),
+        "namespaces": list(NAMESPACES),
+    }
+    return write_array_file(FILEPATH, arrays, meta)
+
+
+# Topological layering plus transitive ancestors/descendants, so whole
+# ontology passes never have to walk the graph term by term
+def add_closures(arrays):
+    size = len(arrays["go_numbers"])
+    arrays["topological_order"], arrays["generation_indptr"] = topological_generations(
+        arrays["parents_indptr"], arrays["children_indptr"], arrays["children_indices"]
+    )
+    arrays["ancestors_indptr"], arrays["ancestors_indices"] = ancestor_closure(
+        arrays["parents_indptr"],
+        arrays["parents_indices"],
+        arrays["topological_order"],
+        arrays["generation_indptr"],
+    )
+    arrays["descendants_indptr"], arrays["descendants_indices"] = transpose_csr(
+        arrays["ancestors_indptr"], arrays["ancestors_indices"], size
+    )
+    return arrays
+
+
+class GODag:
+    # Read only view over a compiled GO DAG file
+    def __init__(self, FILEPATH):
+        self.path = FILEPATH
+        self.meta, arrays = read_array_file(FILEPATH)
+        for name, array in arrays.items():
+            setattr(self, name, array)
+        self.size = len(self.go_numbers)
+
+    def __len__(self):
+        return self.size
+
+    # Term index of a GO id, None if it is not a primary id of the DAG
+    def get(self, goterm, default=None):
+        number = go_number(goterm)
+        if number is None or number >= len(self.go_index):
+            return default
+        index = int(self.go_index[number])
+        return index if index >= 0 else default
+
+    # Term index of a GO id following alt_ids, None if it is unknown
+    def resolve(self, goterm):
+        index = self.get(goterm)
+        if index is None:
+            number = go_number(goterm)
+            if number is None:
+                return None
+            pos = int(numpy.searchsorted(self.alt_numbers, number))
+            if pos < len(self.alt_numbers) and self.alt_numbers[pos] == number:
+                index = int(self.alt_targets[pos])
+        return index
+
+    # Vectorized get/resolve over GO numbers, -1 where unknown
+    def indices(self, numbers, resolve_alt_ids=True):
+        numbers = numpy.asarray(numbers)
+        index = numpy.full(numbers.shape, -1, dtype=numpy.int64)
+        in_range = (numbers >= 0) & (numbers < len(self.go_index))
+        index[in_range] = self.go_index[numbers[in_range]]
+        if resolve_alt_ids and len(self.alt_numbers):
+            missing = numpy.flatnonzero((index < 0) & (numbers >= 0))
+            positions = numpy.minimum(
+                numpy.searchsorted(self.alt_numbers, numbers[missing]), len(self.alt_numbers) - 1
+            )
+            hit = self.alt_numbers[positions] == numbers[missing]
+            index[missing[hit]] = self.alt_targets[positions[hit]]
+        return index
+
+    def go_id(self, index):
+        return go_string(int(self.go_numbers[index]))
+
+    def name(self, index):
+        return bytes(self.names[self.names_offsets[index]:self.names_offsets[index + 1]]).decode()
+
+    def aspect(self, index):
+        code = int(self.namespace[index])
+        return NAMESPACES[code] if code >= 0 else None
 
-# Get term depth
-# A lite convoluted, it needs work
-@lru_cache(maxsize=None)
-def get_depth(pronto_Term,aspect):
-    entity = pronto_Term
-    depth = []
-    i = 0
-    entity_iterator = [entity]
+    def alt_ids(self, index):
+        return [go_string(x) for x in self.term_alt_numbers[self.term_alt_indptr[index]:self.term_alt_indptr[index + 1]].tolist()]
 
-    while entity_iterator:
-        entity_aux = set()
-        for x in entity_iterator:
-            parents = [y for y in x.superclasses(distance=1, with_self=False) if annotations[aspect].get(y.id,False)]
-            entity_aux.update(parents)
-        if entity_aux:
-            depth.append(entity_aux)
-        entity_iterator = entity_aux
-        i = i + 1
+    def parents(self, index):
+        return self.parents_indices[self.parents_indptr[index]:self.parents_indptr[index + 1]].tolist()
 
-    return len(depth)
+    def children(self, index):
+        return self.children_indices[self.children_indptr[index]:self.children_indptr[index + 1]].tolist()
+
+    # All is_a offspring of a term, without the term itself
+    def descendants(self, index):
+        return self.descendants_indices[self.descendants_indptr[index]:self.descendants_indptr[index + 1]].tolist()
+
+    # All is_a ancestors of a term, without the term itself
+    def ancestors(self, index):
+        return self.ancestors_indices[self.ancestors_indptr[index]:self.ancestors_indptr[index + 1]].tolist()
+
+    # Terms grouped by topological generation, roots first
+    def generations(self):
+        return [
+            self.topological_order[self.generation_indptr[g]:self.generation_indptr[g + 1]]
+            for g in range(len(self.generation_indptr) - 1)
+        ]
+
+
+# {GO id: [name, namespace]} view of a compiled DAG, alt_ids included.
+# The same table parse_obo returns, without parsing go.obo again.
+class OboTable(Mapping):
+    def __init__(self, dag):
+        self.dag = dag
+
+    def __getitem__(self, goterm):
+        index = self.dag.resolve(goterm)
+        if index is None:
+            raise KeyError(goterm)
+        return [self.dag.name(index).replace(";", ","), self.dag.aspect(index)]
+
+    def __iter__(self):
+        for number in self.dag.go_numbers.tolist():
+            yield go_string(number)
+        for number in self.dag.alt_numbers.tolist():
+            yield go_string(number)
+
+    def __len__(self):
+        return len(self.dag.go_numbers) + len(self.dag.alt_numbers)
+
+
+# Loads the compiled DAG, rebuilding it when go.obo changed
+def load_godag(OBO_FILEPATH, FILEPATH):
+    if os.path.exists(FILEPATH):
+        meta = read_array_header(FILEPATH)["meta"]
+        if (
+            meta.get("format_version") == GODAG_FORMAT_VERSION
+            and meta.get("source") == obo_signature(OBO_FILEPATH)
+        ):
+            return GODag(FILEPATH)
+    compile_godag(OBO_FILEPATH, FILEPATH)
+    return GODag(FILEPATH)
 
 ###############################################################################
 # ANNOTATIONS
 ###############################################################################
-
-# The output of this function IS NOT A SET so IT HAS DUPLICATES
+# Streaming annotation counting
+# Annotation files are read in large binary chunks and only a GO id -> count
+# table is kept, so memory depends on the number of distinct GO terms and not
+# on the number of annotations.
+ANNOTATION_CHUNK_SIZE = 16 * 1024 * 1024
+
+# 0-based columns of (GO id, qualifier/negation, evidence) per format
+ANNOTATION_COLUMNS = {
+    "gaf": (4, 3, 6),
+    "gpad": (3, 2, 5),  # gpad 1.1
+    "gpad2": (3, 1, 5),
+    "list": (0, None, None),
+}
+
+# GPAD uses ECO ids instead of GAF evidence codes (GO gaf-eco-mapping)
+GAF_ECO_CODES = {
+    "EXP": ["ECO:0000269"],
+    "IDA": ["ECO:0000314"],
+    "IPI": ["ECO:0000353"],
+    "IMP": ["ECO:0000315"],
+    "IGI": ["ECO:0000316"],
+    "IEP": ["ECO:0000270"],
+    "HTP": ["ECO:0006056"],
+    "HDA": ["ECO:0007005"],
+    "HMP": ["ECO:0007001"],
+    "HGI": ["ECO:0007003"],
+    "HEP": ["ECO:0007007"],
+    "ISS": ["ECO:0000250"],
+    "ISO": ["ECO:0000266"],
+    "ISA": ["ECO:0000247"],
+    "ISM": ["ECO:0000255"],
+    "IGC": ["ECO:0000317"],
+    "IBA": ["ECO:0000318"],
+    "IBD": ["ECO:0000319"],
+    "IKR": ["ECO:0000320"],
+    "IRD": ["ECO:0000321"],
+    "RCA": ["ECO:0000245"],
+    "TAS": ["ECO:0000304"],
+    "NAS": ["ECO:0000303"],
+    "IC": ["ECO:0000305"],
+    "ND": ["ECO:0000307"],
+    "IEA": [
+        "ECO:0000501",
+        "ECO:0000256",
+        "ECO:0000265",
+        "ECO:0000322",
+        "ECO:0000323",
+        "ECO:0000363",
+        "ECO:0000364",
+        "ECO:0000365",
+        "ECO:0000366",
+        "ECO:0007669",
+    ],
+}
+
+
+# gaf, gpad or a "\n" separated GO list, as precompute_data decides it
+def annotation_format(FILEPATH):
+    if ".gaf" in FILEPATH:
+        return "gaf"
+    if ".gpad" in FILEPATH:
+        return "gpad"
+    return "list"
+
+
+# Gzip or plain text, whatever the extension says
+def open_annotation_file(FILEPATH):
+    with open(FILEPATH, "rb") as fread:
+        magic = fread.read(2)
+    if magic == b"\x1f\x8b":
+        return gzip.open(FILEPATH, "rb")
+    return open(FILEPATH, "rb")
+
+
+# Yields lists of complete lines (bytes, no newline) read in big chunks
+def iter_line_chunks(FILEPATH, chunk_size=ANNOTATION_CHUNK_SIZE):
+    with open_annotation_file(FILEPATH) as fread:
+        tail = b""
+        while True:
+            chunk = fread.read(chunk_size)
+            if not chunk:
+                break
+            lines = (tail + chunk).split(b"\n")
+            tail = lines.pop()
+            yield lines
+        if tail:
+            yield [tail]
+
+
+# Evidence codes to skip as bytes, GAF codes expanded to their ECO ids
+def evidence_filter(exclude_evidence):
+    codes = set()
+    for code in exclude_evidence or []:
+        codes.add(code)
+        codes.update(GAF_ECO_CODES.get(code, []))
+    return set(x.encode() for x in codes)
+
+
+# Counts GO ids of an annotation file line by line.
+# exclude_evidence: evidence codes to drop (e.g. ["IEA"])
+# skip_not: drop NOT qualified (negated) annotations
+def count_annotation_file(FILEPATH, file_format=None, exclude_evidence=None, skip_not=False):
+    file_format = file_format or annotation_format(FILEPATH)
+    go_col, qualifier_col, evidence_col = ANNOTATION_COLUMNS[file_format]
+    excluded = evidence_filter(exclude_evidence)
+    filtered = file_format != "list" and (excluded or skip_not)
+    counts = Counter()
+
+    for lines in iter_line_chunks(FILEPATH):
+        if file_format == "list":
+            counts.update(x.strip() for x in lines if x.strip())
+        elif not filtered:
+            counts.update(
+                x.split(b"\t", go_col + 1)[go_col].strip()
+                for x in lines
+                if x and not x.startswith(b"!")
+            )
+        else:
+            for x in lines:
+                if not x:
+                    continue
+                if x.startswith(b"!"):
+                    if file_format == "gpad" and x.startswith(b"!gpad-version: 2"):
+                        go_col, qualifier_col, evidence_col = ANNOTATION_COLUMNS["gpad2"]
+                    continue
+                fields = x.split(b"\t")
+                if skip_not and b"NOT" in fields[qualifier_col].split(b"|"):
+                    continue
+                if fields[evidence_col].strip() in excluded:
+                    continue
+                counts[fields[go_col].strip()] += 1
+
+    return Counter({x.decode(): y for x, y in counts.items()})
 
 
+# The output of this function IS NOT A SET so IT HAS DUPLICATES
+# GO ids of a GPAD file, read with iter_line_chunks. Use count_annotation_file
+# when only the counts are needed.
 def read_gpad(FILEPATH):
-    with gzip.open(FILEPATH, "rt") as fread:
-        try:
-            data = fread.read()
-        except OSError:
-            print("Annot file is not a valid gzip file by OSError")
-            print("Trying to read as a text file")
-            with open(FILEPATH, "r") as fread_txt:
-                data = fread_txt.read()
-    gpad_go = [
-        x.split("\t")[3] for x in data.split("\n") if x and (not x.startswith("!"))
+    go_col = ANNOTATION_COLUMNS["gpad"][0]
+    return [
+        x.split(b"\t", go_col + 1)[go_col].strip().decode()
+        for lines in iter_line_chunks(FILEPATH)
+        for x in lines
+        if x and not x.startswith(b"!")
     ]
-    return gpad_go
 
 
-def compile_universe(all_annot):
-    universe = {
-        "biological_process": {},
-        "cellular_component": {},
-        "molecular_function": {},
-    }
-    for goterm in all_annot:
-        if obo.get(goterm, None) is not None:
-            aspect = obo[goterm][1]
-            universe[aspect][goterm] = universe[aspect].get(goterm, 0) + 1
-    print("Compiling annotations")
-    print("Total of annotations readed", len(all_annot))
-    for x in universe:
-        universe[x]["total"] = sum(
-            [universe[x][y] for y in universe[x] if y != "total"]
-        )
-        print("", x, universe[x]["total"])
-
-    return universe
-
-
-def get_universe(progress=False):
-    ANNOTATIONS = ANNOTATIONS_FOLDER
-    universe_PICKLE = UNIVERSE_COUNT_PICKLE
-    abc2gpad = {
-        "hsa": "goa_human.gpad.gz",  # human
-        "mmu": "mgi.gpad.gz",  # mouse
-        "dme": "fb.gpad.gz",  # fly
-        "cgd": "cgd.gpad.gz",
-        "dictybase": "dictybase.gpad.gz",
-        "ecocyc": "ecocyc.gpad.gz",
-        "fb": "fb.gpad.gz",
-        "genedb_lmajor": "genedb_lmajor.gpad.gz",
-        "genedb_pfalciparum": "genedb_pfalciparum.gpad.gz",
-        "genedb_tbrucei": "genedb_tbrucei.gpad.gz",
-        "goa_chicken": "goa_chicken.gpad.gz",
-        "goa_chicken_complex": "goa_chicken_complex.gpad.gz",
-        "goa_chicken_isoform": "goa_chicken_isoform.gpad.gz",
-        "goa_chicken_rna": "goa_chicken_rna.gpad.gz",
-        "goa_cow": "goa_cow.gpad.gz",
-        "goa_cow_complex": "goa_cow_complex.gpad.gz",
-        "goa_cow_isoform": "goa_cow_isoform.gpad.gz",
-        "goa_cow_rna": "goa_cow_rna.gpad.gz",
-        "goa_dog": "goa_dog.gpad.gz",
-        "goa_dog_complex": "goa_dog_complex.gpad.gz",
-        "goa_dog_isoform": "goa_dog_isoform.gpad.gz",
-        "goa_dog_rna": "goa_dog_rna.gpad.gz",
-        "goa_human": "goa_human.gpad.gz",
-        "goa_human_complex": "goa_human_complex.gpad.gz",
-        "goa_human_isoform": "goa_human_isoform.gpad.gz",
-        "goa_human_rna": "goa_human_rna.gpad.gz",
-        "goa_pig": "goa_pig.gpad.gz",
-        "goa_pig_complex": "goa_pig_complex.gpad.gz",
-        "goa_pig_isoform": "goa_pig_isoform.gpad.gz",
-        "goa_pig_rna": "goa_pig_rna.gpad.gz",
-        "goa_uniprot_all_noiea": "goa_uniprot_all_noiea.gpad.gz",
-        "japonicusdb": "japonicusdb.gpad.gz",
-        "mgi": "mgi.gpad.gz",
-        "pombase": "pombase.gpad.gz",
-        "pseudocap": "pseudocap.gpad.gz",
-        "reactome": "reactome.gpad.gz",
-        "rgd": "rgd.gpad.gz",
-        "sgd": "sgd.gpad.gz",
-        "sgn": "sgn.gpad.gz",
-        "tair": "tair.gpad.gz",
-        "wb": "wb.gpad.gz",
-        "xenbase": "xenbase.gpad.gz",
-        "zfin": "zfin.gpad.gz",
+# Sources of the GO annotation universe, several abbreviations point to the
+# same file and every entry adds its counts once
+GPAD_SOURCES = {
+    "hsa": "goa_human.gpad.gz",  # human
+    "mmu": "mgi.gpad.gz",  # mouse
+    "dme": "fb.gpad.gz",  # fly
+    "cgd": "cgd.gpad.gz",
+    "dictybase": "dictybase.gpad.gz",
+    "ecocyc": "ecocyc.gpad.gz",
+    "fb": "fb.gpad.gz",
+    "genedb_lmajor": "genedb_lmajor.gpad.gz",
+    "genedb_pfalciparum": "genedb_pfalciparum.gpad.gz",
+    "genedb_tbrucei": "genedb_tbrucei.gpad.gz",
+    "goa_chicken": "goa_chicken.gpad.gz",
+    "goa_chicken_complex": "goa_chicken_complex.gpad.gz",
+    "goa_chicken_isoform": "goa_chicken_isoform.gpad.gz",
+    "goa_chicken_rna": "goa_chicken_rna.gpad.gz",
+    "goa_cow": "goa_cow.gpad.gz",
+    "goa_cow_complex": "goa_cow_complex.gpad.gz",
+    "goa_cow_isoform": "goa_cow_isoform.gpad.gz",
+    "goa_cow_rna": "goa_cow_rna.gpad.gz",
+    "goa_dog": "goa_dog.gpad.gz",
+    "goa_dog_complex": "goa_dog_complex.gpad.gz",
+    "goa_dog_isoform": "goa_dog_isoform.gpad.gz",
+    "goa_dog_rna": "goa_dog_rna.gpad.gz",
+    "goa_human": "goa_human.gpad.gz",
+    "goa_human_complex": "goa_human_complex.gpad.gz",
+    "goa_human_isoform": "goa_human_isoform.gpad.gz",
+    "goa_human_rna": "goa_human_rna.gpad.gz",
+    "goa_pig": "goa_pig.gpad.gz",
+    "goa_pig_complex": "goa_pig_complex.gpad.gz",
+    "goa_pig_isoform": "goa_pig_isoform.gpad.gz",
+    "goa_pig_rna": "goa_pig_rna.gpad.gz",
+    "goa_uniprot_all_noiea": "goa_uniprot_all_noiea.gpad.gz",
+    "japonicusdb": "japonicusdb.gpad.gz",
+    "mgi": "mgi.gpad.gz",
+    "pombase": "pombase.gpad.gz",
+    "pseudocap": "pseudocap.gpad.gz",
+    "reactome": "reactome.gpad.gz",
+    "rgd": "rgd.gpad.gz",
+    "sgd": "sgd.gpad.gz",
+    "sgn": "sgn.gpad.gz",
+    "tair": "tair.gpad.gz",
+    "wb": "wb.gpad.gz",
+    "xenbase": "xenbase.gpad.gz",
+    "zfin": "zfin.gpad.gz",
+}
+GPAD_URL = "http://current.geneontology.org/annotations/{GZ}"
+
+
+# Counts of one annotation file, cached next to it in COUNTS_FOLDER.
+# The cache is reused while size and mtime are unchanged, or when the file was
+# rewritten with the same content (same sha256); otherwise it is recounted.
+def count_annotation_file_cached(FILEPATH, file_format=None, exclude_evidence=None, skip_not=False, cache_folder=None):
+    cache_folder = new_folder(cache_folder or os.path.join(os.path.dirname(FILEPATH), "counts/"))
+    cache_path = os.path.join(cache_folder, os.path.basename(FILEPATH) + ".counts.pickle")
+    stat = os.stat(FILEPATH)
+    key = {
+        "format": file_format or annotation_format(FILEPATH),
+        "exclude_evidence": sorted(exclude_evidence or []),
+        "skip_not": skip_not,
     }
-    if not os.path.exists(UNIVERSE_COUNT_PICKLE):
-        print("DOWNLOADING ANNOTATION FILEs")
-        all_annot = []
-        for i, file in enumerate(abc2gpad):
-            filepath = ANNOTATIONS + abc2gpad[file]
-            if progress:
-                print(filepath, str(i) + "/" + str(len(abc2gpad)))
-            if not os.path.exists(filepath):
-                wget_gz = "http://current.geneontology.org/annotations/{GZ}".format(
-                    GZ=abc2gpad[file]
-                )
-                r = requests.get(wget_gz, stream=True)
-                with open(filepath, "wb") as f:
-                    for chunk in r.raw.stream(1024, decode_content=False):
-                        if chunk:
-                            f.write(chunk)
-            gpad_go = read_gpad(filepath)
-            all_annot.extend(gpad_go)
-        universe = compile_universe(all_annot)
-        with open(universe_PICKLE, "wb") as fwrite:
-            pickle.dump(universe, fwrite)
-    else:
-        with open(universe_PICKLE, "rb") as fread:
-            universe = pickle.load(fread)
-    return universe
+    sha256 = None
+    if os.path.exists(cache_path):
+        cached = unpickle_object(cache_path)
+        if cached["key"] == key and cached["size"] == stat.st_size:
+            if cached["mtime"] == stat.st_mtime:
+                return cached["counts"]
+            sha256 = file_sha256(FILEPATH)
+            if cached["sha256"] == sha256:
+                cached["mtime"] = stat.st_mtime
+                pickle_object(cached, cache_path)
+                return cached["counts"]
+
+    counts = count_annotation_file(FILEPATH, key["format"], exclude_evidence, skip_not)
+    pickle_object(
+        {
+            "key": key,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "sha256": sha256 or file_sha256(FILEPATH),
+            "counts": counts,
+        },
+        cache_path,
+    )
+    return counts
+
+
+def count_source(FILEPATH, exclude_evidence=None, skip_not=False):
+    return FILEPATH, count_annotation_file_cached(FILEPATH, "gpad", exclude_evidence, skip_not)
+
+
+# Counts every source in a process pool (small per-file counters come back)
+# and merges them. Only files that changed since their cached counts are read.
+# download: optional callable returning the source paths as they finish
+# downloading, so counting overlaps with the network.
+def count_sources(filepaths, exclude_evidence=None, skip_not=False, download=None):
+    unique_paths = sorted(set(filepaths))
+    counted = {}
+    with ProcessPoolExecutor(max_workers=max(1, min(CPU_COUNT, len(unique_paths)))) as pool:
+        # Fork every worker now, before any download thread exists
+        pool.submit(int).result()
+        ready_paths = download() if download is not None else unique_paths
+        futures = [
+            pool.submit(count_source, x, exclude_evidence, skip_not) for x in ready_paths
+        ]
+        for future in tqdm.tqdm(as_completed(futures), total=len(futures)):
+            filepath, counts = future.result()
+            counted[filepath] = counts
+    annot_counts = Counter()
+    for filepath in filepaths:
+        annot_counts.update(counted[filepath])
+    return annot_counts
 
 
 ###############################################################################
-# GENERAL
+# WHOLE ONTOLOGY IC ENGINE
 ###############################################################################
+# Computing term by term walks every descendant set twice and runs one BFS
+# per depth. Here counts are propagated over the precomputed ancestor
+# closure and depths over the topological generations, for all terms at once.
+# Results follow calculate_IC, crow_compute and get_depth.
+
+# Annotation counts of one aspect of the universe as term vectors.
+# `counts` holds the count of each primary id (what offspring add up) and
+# `best` the largest count among the term id and its alt_ids, which is the
+# one giving the min IC over alt_ids. NaN when none of them is annotated.
+def universe_vectors(dag, universe_aspect):
+    counts = numpy.zeros(len(dag))
+    best = numpy.full(len(dag), numpy.nan)
+    for goterm, count in universe_aspect.items():
+        if goterm == "total":
+            continue
+        index = dag.get(goterm)
+        if index is not None:
+            counts[index] = count
+        else:
+            index = dag.resolve(goterm)
+        if index is not None and not best[index] >= count:
+            best[index] = count
+    return counts, best
+
+
+# Longest chain of annotated ancestors for every term (get_depth)
+def annotated_depth(dag, annotated):
+    depth = numpy.zeros(len(dag), dtype=numpy.int64)
+    for generation in dag.generations()[1:]:
+        owner, parents = csr_rows(dag.parents_indptr, dag.parents_indices, generation)
+        steps = numpy.where(annotated[parents], depth[parents] + 1, 0)
+        level = numpy.zeros(len(generation), dtype=numpy.int64)
+        numpy.maximum.at(level, owner, steps)
+        depth[generation] = level
+    return depth
+
+
+# IC definitions. "annotation" is the annotation frequency IC of
+# calculate_IC (the "ic" column), the others only depend on the DAG:
+#   offspring_ratio: -log2(1 - offspring / (offspring + ancestors)), the
+#                    formula in the README
+#   seco: 1 - log(offspring + 1) / log(terms of the aspect)  (Seco et al. 2004)
+#   zhou: k * seco + (1 - k) * log(depth) / log(deepest depth of the aspect)
+#         (Zhou et al. 2008), depth counted from the root (root = 1)
+IC_VARIANTS = ("annotation", "offspring_ratio", "seco", "zhou")
+INTRINSIC_IC_VARIANTS = IC_VARIANTS[1:]
+ZHOU_K = 0.5
+
+
+def check_ic_variants(variants):
+    unknown = [x for x in variants if x not in IC_VARIANTS]
+    if unknown:
+        raise ValueError("Unknown IC variants " + ", ".join(unknown) + ", use " + ", ".join(IC_VARIANTS))
+    return list(variants)
+
+
+# Intrinsic IC variants of every term, {variant: array}, NaN where the
+# formula has no value (offspring_ratio of a root, obsolete terms...).
+# Offspring and ancestor counts are the row lengths of the compiled closures
+# and depths the topological generations, shared by all the variants.
+def compute_intrinsic_ics(dag, variants):
+    size = len(dag)
+    namespace = numpy.asarray(dag.namespace)
+    offspring = numpy.diff(numpy.asarray(dag.descendants_indptr)).astype(numpy.float64)
+    ancestors = numpy.diff(numpy.asarray(dag.ancestors_indptr)).astype(numpy.float64)
+    position = numpy.empty(size, dtype=numpy.int64)
+    position[dag.topological_order] = numpy.arange(size)
+    depth = numpy.searchsorted(dag.generation_indptr, position, side="right").astype(numpy.float64)
+
+    # Live terms and deepest depth of the aspect of every term
+    terms = numpy.full(size, numpy.nan)
+    max_depth = numpy.full(size, numpy.nan)
+    live = ~numpy.asarray(dag.obsolete)
+    for code in range(len(NAMESPACES)):
+        in_aspect = namespace == code
+        if (in_aspect & live).any():
+            terms[in_aspect] = numpy.count_nonzero(in_aspect & live)
+            max_depth[in_aspect] = depth[in_aspect & live].max()
+
+    ics = {}
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        seco = 1 - numpy.log(offspring + 1) / numpy.log(terms)
+        for variant in variants:
+            if variant == "offspring_ratio":
+                ic = -numpy.log2(1 - offspring / (offspring + ancestors))
+            elif variant == "seco":
+                ic = seco.copy()
+            elif variant == "zhou":
+                ic = ZHOU_K * seco + (1 - ZHOU_K) * numpy.log(depth) / numpy.log(max_depth)
+            else:
+                continue
+            ic[~numpy.isfinite(ic) | ~live] = numpy.nan
+            ic[ic == 0] = 0.0
+            ics[variant] = ic
+    return ics
+
+
+# Annotated descendant count, depth and IC (NaN for None) of every term,
+# each term measured against the universe of its own namespace, plus the
+# offspring annotation sum the IC comes from and the intrinsic `variants`
+# (IC_VARIANTS) from the same closures
+def compute_ontology_ics(dag, universe, variants=()):
+    size = len(dag)
+    descendant_count = numpy.zeros(size, dtype=numpy.int64)
+    depth = numpy.zeros(size, dtype=numpy.int64)
+    ic = numpy.full(size, numpy.nan)
+    annotated_sum = numpy.zeros(size)
+
+    # One (term, ancestor) pair per closure entry
+    pair_terms = numpy.repeat(numpy.arange(size), numpy.diff(dag.ancestors_indptr))
+    pair_ancestors = dag.ancestors_indices
+
+    for code, aspect in enumerate(NAMESPACES):
+        if aspect not in universe:
+            continue
+        in_aspect = numpy.asarray(dag.namespace) == code
+        counts, best = universe_vectors(dag, universe[aspect])
+        annotated = counts > 0
+        offspring_sum = numpy.bincount(
+            pair_ancestors, weights=counts[pair_terms], minlength=size
+        )
+        offspring_annotated = numpy.bincount(
+            pair_ancestors, weights=annotated[pair_terms].astype(numpy.float64), minlength=size
+        )
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            aspect_ic = -numpy.log2((best + offspring_sum) / universe[aspect]["total"])
+        # -0.0 is reported as 0.0
+        aspect_ic[aspect_ic == 0] = 0.0
+
+        descendant_count[in_aspect] = offspring_annotated[in_aspect]
+        depth[in_aspect] = annotated_depth(dag, annotated)[in_aspect]
+        ic[in_aspect] = aspect_ic[in_aspect]
+        annotated_sum[in_aspect] = offspring_sum[in_aspect]
+
+    ics = {"descendant_count": descendant_count, "depth": depth, "ic": ic, "offspring_sum": annotated_sum}
+    ics.update(compute_intrinsic_ics(dag, variants))
+    return ics
+
+
+# annotated_depth of some terms only, walking their ancestors generation by
+# generation and nothing else
+def annotated_depth_of(dag, annotated, terms):
+    _, ancestors = csr_rows(dag.ancestors_indptr, dag.ancestors_indices, terms)
+    closure = numpy.union1d(terms, ancestors)
+    position = numpy.empty(len(dag), dtype=numpy.int64)
+    position[dag.topological_order] = numpy.arange(len(dag))
+    closure = closure[numpy.argsort(position[closure], kind="stable")]
+    generation = numpy.searchsorted(dag.generation_indptr, position[closure], side="right") - 1
+    depth = numpy.zeros(len(dag), dtype=numpy.int64)
+    for level_terms in numpy.split(closure, numpy.flatnonzero(numpy.diff(generation)) + 1):
+        owner, parents = csr_rows(dag.parents_indptr, dag.parents_indices, level_terms)
+        if not len(parents):
+            continue
+        steps = numpy.where(annotated[parents], depth[parents] + 1, 0)
+        level = numpy.zeros(len(level_terms), dtype=numpy.int64)
+        numpy.maximum.at(level, owner, steps)
+        depth[level_terms] = level
+    return depth[terms]
+
+
+# compute_ontology_ics for some terms (DAG indices) only: offspring are
+# summed over their descendants and depths walked over their ancestors, the
+# rest of the ontology is not computed. Arrays follow `terms`.
+def compute_term_ics(dag, universe, terms):
+    terms = numpy.asarray(terms, dtype=numpy.int64)
+    descendant_count = numpy.zeros(len(terms), dtype=numpy.int64)
+    depth = numpy.zeros(len(terms), dtype=numpy.int64)
+    ic = numpy.full(len(terms), numpy.nan)
+    annotated_sum = numpy.zeros(len(terms))
+    namespace = numpy.asarray(dag.namespace)[terms]
+
+    for code, aspect in enumerate(NAMESPACES):
+        selected = numpy.flatnonzero(namespace == code)
+        if aspect not in universe or not len(selected):
+            continue
+        counts, best = universe_vectors(dag, universe[aspect])
+        annotated = counts > 0
+        owner, offspring = csr_rows(dag.descendants_indptr, dag.descendants_indices, terms[selected])
+        offspring_sum = numpy.bincount(owner, weights=counts[offspring], minlength=len(selected))
+        offspring_annotated = numpy.bincount(owner, weights=annotated[offspring].astype(numpy.float64), minlength=len(selected))
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            aspect_ic = -numpy.log2((best[terms[selected]] + offspring_sum) / universe[aspect]["total"])
+        aspect_ic[aspect_ic == 0] = 0.0
+
+        descendant_count[selected] = offspring_annotated
+        depth[selected] = annotated_depth_of(dag, annotated, terms[selected])
+        ic[selected] = aspect_ic
+        annotated_sum[selected] = offspring_sum
+
+    return {"descendant_count": descendant_count, "depth": depth, "ic": ic, "offspring_sum": annotated_sum}
+
+
+# Same rows as compute_compute, taken from the whole ontology pass (or from
+# already computed `ics`)
+def compute_ontology(input_data, annotations, godag, ics=None):
+    if ics is None:
+        ics = compute_ontology_ics(godag, annotations)
+    input_data_ic = []
+    for prot_id, goterm, aspect, desc in input_data:
+        index = godag.get(goterm)
+        if index is not None:
+            ic = float(ics["ic"][index])
+            input_data_ic.append([
+                prot_id,
+                aspect,
+                goterm,
+                int(ics["descendant_count"][index]),
+                int(ics["depth"][index]),
+                None if math.isnan(ic) else ic,
+                desc,
+            ])
+    return input_data_ic
 
 
-def process_file(file_data):
-    data = [x + [obo[x[1]][1], obo[x[1]][0]] for x in file_data if obo.get(x[1],None)]
-    return data
 
-def read_input(input_filepath):
-    with open(input_filepath, "r") as fread:
-        input_data = process_file(
-            [x.split("\t")[0:2] for x in fread.read().split("\n") if x and not x.startswith("#")] 
-        )
-    return input_data
 
 ###############################################################################
-# IC CALCULATIONs
+# SEMANTIC SIMILARITY
 ###############################################################################
-@lru_cache(maxsize=None)
-def calculate_IC(x, aspect):
-    universe = annotations[aspect]
-
-    if godag.get(x):
-        alt_ids = godag[x].alternate_ids | set([x])
-        alt_ics = []
-        for x in alt_ids:
-            if universe.get(x, None) is not None:
-                offprings = godag[x].subclasses(with_self=False)
-                result = -1 * math.log2(
-                    (universe[x] + sum([universe.get(y.id, 0)
-                     for y in offprings]))
-                    / (universe["total"])
-                )
-                alt_ics.append(result)
-        if alt_ics:
-            if min(alt_ics):
-                return min(alt_ics)
-            else:
-                return 0.0
-        else:
-            return None
+# Term and protein similarity from the ICs (precomputed DB or universe).
+# For a set of terms of one aspect the MICA (IC of the most informative
+# common is_a ancestor, the terms themselves included) of every pair is
+# computed once into a table, then:
+#   resnik = MICA
+#   lin = 2 * MICA / (IC(a) + IC(b))
+#   jiang_conrath = 1 / (1 + IC(a) + IC(b) - 2 * MICA)
+# Proteins are compared through their GO sets of one aspect, with the best
+# match average (bma) or the best pair (max). Ancestors without IC are not
+# used and two terms without a common ancestor with IC have MICA 0.
+SIMILARITY_METHODS = ("resnik", "lin", "jiang_conrath")
+SIMILARITY_AGGREGATES = ("bma", "max")
+SIMILARITY_BLOCK = 256  # proteins per block in all vs all
+MICA_CHUNK_CELLS = 4 * 1024 * 1024
+MICA_MEMORY_BYTES = 1024 * 1024 * 1024  # bigger MICA tables go to a temporary file
+
+
+# MICA of every pair of `terms` (DAG indices of one aspect), ic: IC of every
+# DAG term (NaN = no IC). For a block of columns (terms b) every ancestor a
+# of the terms gets, generation by generation, the best of its parents rows
+# and its own IC where it is an ancestor of b:
+#   MICA(a, b) = max(IC(a) if a is b or an ancestor of b, MICA(parents of a, b))
+# so the cost is (ancestors x parents x terms), one pass per column block.
+def mica_table(dag, ic, terms):
+    terms = numpy.asarray(terms, dtype=numpy.int64)
+    size = len(terms)
+    if size * size * 4 > MICA_MEMORY_BYTES:
+        import tempfile
+        table = numpy.memmap(tempfile.TemporaryFile(), dtype=numpy.float32, mode="w+", shape=(size, size))
     else:
-        return None
+        table = numpy.zeros((size, size), dtype=numpy.float32)
+    if not size:
+        return table
+    # The terms and all their ancestors, with a compact index
+    owner, ancestors = csr_rows(dag.ancestors_indptr, dag.ancestors_indices, terms)
+    owner = numpy.concatenate([owner, numpy.arange(size)])
+    ancestors = numpy.concatenate([ancestors, terms])
+    involved = numpy.unique(ancestors)
+    compact = numpy.full(len(dag), -1, dtype=numpy.int64)
+    compact[involved] = numpy.arange(len(involved))
+    score = numpy.where(ic[ancestors] > 0, ic[ancestors], 0).astype(numpy.float32)
+    generation_of = numpy.zeros(len(dag), dtype=numpy.int64)
+    steps = []
+    for number, generation in enumerate(dag.generations()):
+        generation_of[generation] = number
+        generation = generation[compact[generation] >= 0]
+        parent_owner, parents = csr_rows(dag.parents_indptr, dag.parents_indices, generation)
+        # One (children, parents) step per parent rank, the first one copies
+        first = numpy.concatenate([[True], parent_owner[1:] != parent_owner[:-1]]) if len(parents) else numpy.zeros(0, dtype=bool)
+        rank = numpy.arange(len(parents)) - numpy.maximum.accumulate(numpy.where(first, numpy.arange(len(parents)), 0))
+        steps.append([
+            (compact[generation[parent_owner[rank == x]]], compact[parents[rank == x]])
+            for x in range(int(rank.max()) + 1 if len(rank) else 0)
+        ])
+    # (ancestor, term) pairs grouped by the generation of the ancestor
+    order = numpy.argsort(generation_of[ancestors], kind="stable")
+    owner, ancestors, score = owner[order], ancestors[order], score[order]
+    pair_bounds = numpy.searchsorted(generation_of[ancestors], numpy.arange(len(steps) + 1))
+
+    width = max(1, min(size, MICA_CHUNK_CELLS // len(involved)))
+    for first in range(0, size, width):
+        last = min(first + width, size)
+        in_block = (owner >= first) & (owner < last)
+        rows = numpy.zeros((len(involved), last - first), dtype=numpy.float32)
+        for number, ranks in enumerate(steps):
+            for x, (children, parents) in enumerate(ranks):
+                if x:
+                    rows[children] = numpy.maximum(rows[children], rows[parents])
+                else:
+                    rows[children] = rows[parents]
+            pairs = slice(pair_bounds[number], pair_bounds[number + 1])
+            keep = in_block[pairs]
+            row = compact[ancestors[pairs][keep]]
+            column = owner[pairs][keep] - first
+            rows[row, column] = numpy.maximum(rows[row, column], score[pairs][keep])
+        table[:, first:last] = rows[compact[terms]]
+    return table
+
+
+class SemanticSimilarity:
+    # MICA table and ICs of `terms` (DAG indices of one aspect, with IC)
+    def __init__(self, dag, ic, terms):
+        self.terms = numpy.unique(numpy.asarray(terms, dtype=numpy.int64))
+        self.ic = numpy.asarray(ic[self.terms], dtype=numpy.float32)
+        self.local = numpy.full(len(dag), -1, dtype=numpy.int64)
+        self.local[self.terms] = numpy.arange(len(self.terms))
+        self.mica = mica_table(dag, ic, self.terms)
+
+    # Similarity of local term indices a (rows) x b (columns)
+    def term_block(self, a, b, method="resnik"):
+        mica = self.mica[a[:, None], b]
+        if method == "resnik":
+            return mica
+        ic_sum = self.ic[a][:, None] + self.ic[b]
+        if method == "lin":
+            with numpy.errstate(divide="ignore", invalid="ignore"):
+                return numpy.where(ic_sum > 0, 2 * mica / ic_sum, numpy.float32(1.0)).astype(numpy.float32)
+        if method == "jiang_conrath":
+            return (1 / (1 + numpy.maximum(ic_sum - 2 * mica, 0))).astype(numpy.float32)
+        raise ValueError("Unknown similarity method " + str(method))
+
+    # Protein x protein similarity of two blocks of GO sets given as CSR
+    # (indptr, local term indices), every set with at least one term
+    def protein_block(self, a_indptr, a_terms, b_indptr, b_terms, method="resnik", aggregate="bma"):
+        scores = self.term_block(a_terms, b_terms, method)
+        a_starts, b_starts = a_indptr[:-1], b_indptr[:-1]
+        best_in_b = numpy.maximum.reduceat(scores, b_starts, axis=1)
+        if aggregate == "max":
+            return numpy.maximum.reduceat(best_in_b, a_starts, axis=0)
+        if aggregate != "bma":
+            raise ValueError("Unknown aggregate " + str(aggregate))
+        best_in_a = numpy.maximum.reduceat(scores, a_starts, axis=0)
+        a_side = numpy.add.reduceat(best_in_b, a_starts, axis=0) / numpy.diff(a_indptr)[:, None]
+        b_side = numpy.add.reduceat(best_in_a, b_starts, axis=1) / numpy.diff(b_indptr)
+        return ((a_side + b_side) / 2).astype(numpy.float32)
+
+
+# Rows of a CSR as a smaller CSR (indptr from 0, indices)
+def csr_slice(indptr, indices, start, end):
+    return indptr[start:end + 1] - indptr[start], indices[indptr[start]:indptr[end]]
+
+
+# GO sets per protein and aspect from [accession, GO id] rows. alt_ids are
+# resolved, terms without IC and repeated terms are dropped.
+# {aspect: {"accessions": array, "indptr": array, "terms": DAG indices}}
+def protein_term_sets(dag, ic, accessions, goterms):
+    accessions = numpy.asarray(accessions)
+    term_index = dag.indices(go_numbers_array(goterms), True)
+    known = term_index >= 0
+    known[known] = numpy.isfinite(ic[term_index[known]])
+    accessions, term_index = accessions[known], term_index[known]
+    namespace = numpy.asarray(dag.namespace)[term_index]
+    sets = {}
+    for code, aspect in enumerate(NAMESPACES):
+        in_aspect = namespace == code
+        if not in_aspect.any():
+            continue
+        names, protein = numpy.unique(accessions[in_aspect], return_inverse=True)
+        pairs = numpy.unique(numpy.stack([protein.ravel(), term_index[in_aspect]]), axis=1)
+        indptr = numpy.zeros(len(names) + 1, dtype=numpy.int64)
+        indptr[1:] = numpy.cumsum(numpy.bincount(pairs[0], minlength=len(names)))
+        sets[aspect] = {"accessions": names, "indptr": indptr, "terms": pairs[1]}
+    return sets
 
 
-def crow_compute(row_data):
-    prot_id, goterm, aspect, desc = row_data
-    if godag.get(goterm, None):
-        entity = godag[goterm]
-        ic_row = [
-            prot_id,
-            aspect,
-            goterm,
-            len(sorted([sc for sc in entity.subclasses(with_self=False) if annotations[aspect].get(sc.id,False)])),
-            get_depth(entity,aspect),
-            calculate_IC(goterm, aspect),
-            desc,
-        ]
-        return ic_row
-    else:
+###############################################################################
+# PRECOMPUTED IC DATABASE
+###############################################################################
+# Binary replacement for the pickled {GO id: [descendant count, depth, IC]}
+# dict: sorted integer GO ids plus parallel typed columns in an array file,
+# opened with numpy.memmap and searched with a binary search. The header
+# records the ontology release and a hash of the universe it was built from.
+# Missing values ("None") are stored as -1 (ints) and NaN (IC).
+# IC variants other than "annotation" (IC_VARIANTS) are extra ic_<variant>
+# columns, listed in the "ic_variants" header entry.
+PRECOMPUTED_FORMAT_VERSION = 1
+PRECOMPUTED_DB_EXTENSION = ".icdb"
+
+
+def to_int_or_missing(value):
+    return -1 if value is None or value == "None" else int(value)
+
+
+def to_float_or_missing(value):
+    return numpy.nan if value is None or value == "None" else float(value)
+
+
+# sha256 of a universe dict ({aspect: {GO id: count}})
+def universe_sha256(universe):
+    return hashlib.sha256(json.dumps(universe, sort_keys=True).encode()).hexdigest()
+
+
+# ic_dict values are [descendant count, depth, IC] followed by one IC per
+# ic_variants entry
+def write_precomputed_db(FILEPATH, ic_dict, meta=None, ic_variants=()):
+    goterms = sorted(
+        [x for x in ic_dict if go_number(x) is not None], key=go_number
+    )
+    arrays = {
+        "go_numbers": numpy.array([go_number(x) for x in goterms], dtype=numpy.int32),
+        "descendant_count": numpy.array([to_int_or_missing(ic_dict[x][0]) for x in goterms], dtype=numpy.int32),
+        "depth": numpy.array([to_int_or_missing(ic_dict[x][1]) for x in goterms], dtype=numpy.int32),
+        "ic": numpy.array([to_float_or_missing(ic_dict[x][2]) for x in goterms], dtype=numpy.float64),
+    }
+    for i, variant in enumerate(ic_variants):
+        arrays["ic_" + variant] = numpy.array([to_float_or_missing(ic_dict[x][3 + i]) for x in goterms], dtype=numpy.float64)
+    header = {"kind": "precomputed_ic", "format_version": PRECOMPUTED_FORMAT_VERSION, "ic_variants": list(ic_variants)}
+    header.update(meta or {})
+    return write_array_file(FILEPATH, arrays, header)
+
+
+# Path, size and mtime of a pickled DB, kept in the header of its conversion
+def pickle_signature(PICKLE_PATH):
+    stat = os.stat(PICKLE_PATH)
+    return {"path": os.path.abspath(PICKLE_PATH), "size": stat.st_size, "mtime": int(stat.st_mtime)}
+
+
+# Converts a pickled precomputed dict into the binary format
+def convert_precomputed_pickle(PICKLE_PATH, FILEPATH):
+    print("Converting", PICKLE_PATH, "->", FILEPATH)
+    return write_precomputed_db(
+        FILEPATH, unpickle_object(PICKLE_PATH), {"source": pickle_signature(PICKLE_PATH)}
+    )
+
+
+class PrecomputedDB(Mapping):
+    # Read only {GO id: [descendant count, depth, IC]} view of a .icdb file,
+    # values come back as in the pickled dicts ("None" when missing)
+    def __init__(self, FILEPATH):
+        self.path = FILEPATH
+        self.meta, arrays = read_array_file(FILEPATH)
+        if self.meta.get("kind") != "precomputed_ic":
+            raise ValueError(FILEPATH + " is not a precomputed IC database")
+        for name, array in arrays.items():
+            setattr(self, name, array)
+
+    # IC variants stored in the database, "annotation" is the ic column
+    @property
+    def ic_variants(self):
+        return ["annotation"] + list(self.meta.get("ic_variants", []))
+
+    def variant_column(self, variant):
+        return self.ic if variant == "annotation" else getattr(self, "ic_" + variant)
+
+    # Row of every GO number, -1 when it is not in the database
+    def rows(self, numbers):
+        numbers = numpy.asarray(numbers)
+        if not len(self.go_numbers):
+            return numpy.full(numbers.shape, -1, dtype=numpy.int64)
+        positions = numpy.minimum(
+            numpy.searchsorted(self.go_numbers, numbers), len(self.go_numbers) - 1
+        )
+        return numpy.where(self.go_numbers[positions] == numbers, positions, -1)
+
+    def row(self, goterm):
+        number = go_number(goterm)
+        if number is None or not len(self.go_numbers):
+            return None
+        position = int(numpy.searchsorted(self.go_numbers, number))
+        if position < len(self.go_numbers) and self.go_numbers[position] == number:
+            return position
         return None
 
-def crow_precalc(row_data):
-    prot_id, goterm, aspect, desc = row_data
-    if godag.get(goterm, None):
-        entity = godag[goterm]
-        ic_row = [
-            prot_id,
-            aspect,
-            goterm,
-            precomputed_ics.get(goterm,["None"]*3)[0],
-            precomputed_ics.get(goterm,["None"]*3)[1],
-            precomputed_ics.get(goterm,["None"]*3)[2],
-            desc,
+    def __getitem__(self, goterm):
+        row = self.row(goterm)
+        if row is None:
+            raise KeyError(goterm)
+        count = int(self.descendant_count[row])
+        depth = int(self.depth[row])
+        ic = float(self.ic[row])
+        return [
+            "None" if count < 0 else count,
+            "None" if depth < 0 else depth,
+            "None" if math.isnan(ic) else ic,
         ]
-        return ic_row
-    else:
+
+    def __iter__(self):
+        for number in self.go_numbers.tolist():
+            yield go_string(number)
+
+    def __len__(self):
+        return len(self.go_numbers)
+
+
+def is_array_file(FILEPATH):
+    with open(FILEPATH, "rb") as fread:
+        return fread.read(len(ARRAY_FILE_MAGIC)) == ARRAY_FILE_MAGIC
+
+
+# Opens a precomputed DB, binary or pickled.
+# A pickle is converted once into a .icdb in cache_folder (nothing is written
+# next to the pickle, which may be read only or shared) and the copy is used
+# while the pickle keeps its path, size and mtime. Without cache_folder, or
+# if the copy cannot be written, the pickle is used as is.
+def open_precomputed(FILEPATH, cache_folder=None):
+    if is_array_file(FILEPATH):
+        return PrecomputedDB(FILEPATH)
+    if cache_folder is None:
+        return unpickle_object(FILEPATH)
+    source = pickle_signature(FILEPATH)
+    compiled_path = os.path.join(
+        cache_folder,
+        os.path.splitext(os.path.basename(FILEPATH))[0] + "."
+        + hashlib.sha256(source["path"].encode()).hexdigest()[:12] + PRECOMPUTED_DB_EXTENSION,
+    )
+    if os.path.exists(compiled_path) and read_array_header(compiled_path)["meta"].get("source") == source:
+        return PrecomputedDB(compiled_path)
+    try:
+        new_folder(cache_folder)
+        convert_precomputed_pickle(FILEPATH, compiled_path)
+    except OSError as error:
+        print("Could not write", compiled_path, error, "using the pickle")
+        return unpickle_object(FILEPATH)
+    return PrecomputedDB(compiled_path)
+
+
+###############################################################################
+# INCREMENTAL PRECOMPUTE
+###############################################################################
+# precompute_data leaves a manifest next to the DB (OUTPUTPATH.manifest) with
+# the is_a edges, namespaces and universe counts it was built from and the
+# state of every term. With a new go.obo or universe only the terms whose
+# values can change are computed again:
+#   - changed terms: added, removed, other namespace, other parents, other
+#     annotation count (alt_ids included)
+#   - descendant counts and ICs of their ancestors, old and new
+#   - depths of their descendants
+#   - ICs of a whole aspect when its total changed (from the kept offspring
+#     sums, no graph work)
+# and the result is the same as a full rebuild.
+PRECOMPUTE_MANIFEST_VERSION = 1
+PRECOMPUTE_MANIFEST_EXTENSION = ".manifest"
+
+
+# Annotation count and best alt_id count (universe_vectors) of every term in
+# the universe of its namespace
+def term_count_vectors(dag, universe):
+    namespace = numpy.asarray(dag.namespace)
+    counts = numpy.zeros(len(dag))
+    best = numpy.full(len(dag), numpy.nan)
+    for code, aspect in enumerate(NAMESPACES):
+        if aspect in universe:
+            in_aspect = namespace == code
+            aspect_counts, aspect_best = universe_vectors(dag, universe[aspect])
+            counts[in_aspect] = aspect_counts[in_aspect]
+            best[in_aspect] = aspect_best[in_aspect]
+    return counts, best
+
+
+def universe_totals(universe):
+    return {x: universe[x]["total"] for x in universe}
+
+
+def write_precompute_manifest(FILEPATH, dag, universe, ics, meta=None):
+    counts, best = term_count_vectors(dag, universe)
+    arrays = {
+        "go_numbers": numpy.asarray(dag.go_numbers),
+        "namespace": numpy.asarray(dag.namespace),
+        "parents_indptr": numpy.asarray(dag.parents_indptr),
+        "parents_indices": numpy.asarray(dag.parents_indices),
+        "counts": counts,
+        "best": best,
+        "offspring_sum": ics["offspring_sum"],
+        "descendant_count": ics["descendant_count"],
+        "depth": ics["depth"],
+        "ic": ics["ic"],
+    }
+    header = {
+        "kind": "precompute_manifest",
+        "format_version": PRECOMPUTE_MANIFEST_VERSION,
+        "totals": universe_totals(universe),
+    }
+    header.update(meta or {})
+    return write_array_file(FILEPATH, arrays, header)
+
+
+# (meta, arrays) of a manifest, None if there is none or it is outdated
+def read_precompute_manifest(FILEPATH):
+    if not os.path.exists(FILEPATH) or not is_array_file(FILEPATH):
+        return None
+    meta, arrays = read_array_file(FILEPATH)
+    if meta.get("kind") != "precompute_manifest" or meta.get("format_version") != PRECOMPUTE_MANIFEST_VERSION:
         return None
+    return meta, arrays
+
+
+# Mask of the nodes reachable from `start` (included) over a CSR adjacency
+def reachable(indptr, indices, start):
+    seen = numpy.zeros(len(indptr) - 1, dtype=numpy.bool_)
+    frontier = numpy.unique(start)
+    while len(frontier):
+        seen[frontier] = True
+        _, following = csr_rows(indptr, indices, frontier)
+        frontier = numpy.unique(following[~seen[following]])
+    return seen
+
+
+# (child GO number << 32 | parent GO number) of every is_a edge
+def edge_keys(go_numbers, parents_indptr, parents_indices):
+    go_numbers = numpy.asarray(go_numbers, dtype=numpy.int64)
+    children = numpy.repeat(numpy.arange(len(go_numbers)), numpy.diff(parents_indptr))
+    return numpy.sort((go_numbers[children] << 32) | go_numbers[numpy.asarray(parents_indices)])
+
+
+# GO numbers of the terms that differ between a manifest and dag + universe
+def changed_go_numbers(dag, counts, best, previous):
+    _, old = previous
+    numbers = numpy.asarray(dag.go_numbers)
+    old_numbers = old["go_numbers"]
+    kept = numpy.isin(numbers, old_numbers)
+    old_index = numpy.searchsorted(old_numbers, numbers[kept])
+    changed = ~kept
+    changed[kept] = (
+        (old["namespace"][old_index] != numpy.asarray(dag.namespace)[kept])
+        | (old["counts"][old_index] != counts[kept])
+        | ~((old["best"][old_index] == best[kept]) | (numpy.isnan(old["best"][old_index]) & numpy.isnan(best[kept])))
+    )
+    moved = numpy.setxor1d(
+        edge_keys(old_numbers, old["parents_indptr"], old["parents_indices"]),
+        edge_keys(numbers, dag.parents_indptr, dag.parents_indices),
+    ) >> 32
+    removed = numpy.setdiff1d(old_numbers, numbers)
+    return numpy.union1d(numpy.union1d(numbers[changed], removed), moved.astype(numpy.int32))
+
+
+# compute_ontology_ics for a new dag and universe from a previous manifest.
+# Returns the ics and the number of changed and recomputed terms.
+def update_ontology_ics(dag, universe, previous, variants=()):
+    meta, old = previous
+    size = len(dag)
+    numbers = numpy.asarray(dag.go_numbers)
+    old_numbers = old["go_numbers"]
+    counts, best = term_count_vectors(dag, universe)
+    changed = changed_go_numbers(dag, counts, best, previous)
+
+    # Changed terms in both DAGs
+    changed_new = numpy.flatnonzero(numpy.isin(numbers, changed))
+    changed_old = numpy.flatnonzero(numpy.isin(old_numbers, changed))
+    new_of_old = dag.indices(old_numbers, resolve_alt_ids=False)
+
+    # Offspring (descendant count and IC) of the ancestors, depth of the
+    # descendants
+    recompute = numpy.zeros(size, dtype=numpy.bool_)
+    recompute[changed_new] = True
+    recompute[csr_rows(dag.ancestors_indptr, dag.ancestors_indices, changed_new)[1]] = True
+    recompute[csr_rows(dag.descendants_indptr, dag.descendants_indices, changed_new)[1]] = True
+    old_ancestors = new_of_old[reachable(old["parents_indptr"], old["parents_indices"], changed_old)]
+    recompute[old_ancestors[old_ancestors >= 0]] = True
+    recompute = numpy.flatnonzero(recompute)
+
+    # Everything else is kept, new terms are always recomputed
+    old_index = numpy.minimum(numpy.searchsorted(old_numbers, numbers), len(old_numbers) - 1)
+    old_index[recompute] = 0
+    ics = {name: old[name][old_index] for name in ("descendant_count", "depth", "ic", "offspring_sum")}
+    patch = compute_term_ics(dag, universe, recompute)
+    for name in ics:
+        ics[name][recompute] = patch[name]
+
+    # A new total changes every IC of its aspect
+    kept = numpy.ones(size, dtype=numpy.bool_)
+    kept[recompute] = False
+    namespace = numpy.asarray(dag.namespace)
+    for code, aspect in enumerate(NAMESPACES):
+        if aspect not in universe or universe[aspect]["total"] == meta["totals"].get(aspect):
+            continue
+        terms = numpy.flatnonzero(kept & (namespace == code))
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            aspect_ic = -numpy.log2((best[terms] + ics["offspring_sum"][terms]) / universe[aspect]["total"])
+        aspect_ic[aspect_ic == 0] = 0.0
+        ics["ic"][terms] = aspect_ic
+    # Intrinsic variants only need the DAG, no graph walk
+    ics.update(compute_intrinsic_ics(dag, variants))
+    return ics, len(changed), len(recompute)
+
+
+###############################################################################
+# STREAMING I/O
+###############################################################################
+# Inputs, outputs and the density plot are processed row by row so memory
+# does not grow with the input. Inputs may be gzip compressed and outputs
+# ending in .gz are written compressed.
+TSV_BUFFER_ROWS = 100000
+# Columns of the output rows (crow_compute/crow_precalc)
+OUTPUT_COLUMNS = [
+    "Seq_ID",
+    "Category",
+    "GOid",
+    "Descendant_count",
+    "Depth_level",
+    "Information_content",
+    "Description",
+]
+
+
+# Opens a text file, gzip or plain whatever the extension says
+def open_text_file(FILEPATH):
+    return io.TextIOWrapper(open_annotation_file(FILEPATH), encoding="utf-8")
+
+
+# Yields [accession, GO id] rows of an input file
+def iter_input_rows(input_filepath):
+    with open_text_file(input_filepath) as fread:
+        for line in fread:
+            line = line.rstrip("\r\n")
+            if line and not line.startswith("#"):
+                row = line.split("\t")[0:2]
+                if len(row) == 2:
+                    yield row
+
+
+# Writes TSV lines (without newline), buffer_rows lines at a time
+def write_tsv_lines(lines, FILEPATH, buffer_rows=TSV_BUFFER_ROWS):
+    opener = gzip.open if FILEPATH.endswith(".gz") else open
+    written = 0
+    with opener(FILEPATH, "wt") as fwrite:
+        buffer = []
+        for line in lines:
+            buffer.append(line)
+            if len(buffer) >= buffer_rows:
+                fwrite.write("\n".join(buffer) + "\n")
+                written += len(buffer)
+                buffer = []
+        if buffer or not written:
+            fwrite.write("\n".join(buffer) + "\n")
+    return FILEPATH
 
 
+def write_tsv_rows(rows, FILEPATH, buffer_rows=TSV_BUFFER_ROWS):
+    return write_tsv_lines(
+        ("\t".join([str(y) for y in x]) for x in rows if x), FILEPATH, buffer_rows
+    )
 
-def compute_compute(input_data, annotations, godag):
-    input_data_ic = [x for x in p_tqdm.p_umap(
-        crow_compute, input_data, num_cpus=CPU_COUNT) if x]
-    # input_data_ic = [crow_compute(x) for x in tqdm.tqdm(
-    #     input_data) if x]
-    return input_data_ic
 
+# ICs collected for the density plot while rows stream by.
+# Like plot_density, only the first row of every GO id counts. ICs are binned
+# per aspect into a fixed grid (DENSITY_RANGE, DENSITY_BIN_WIDTH) every
+# DENSITY_FLUSH values, so plotting costs the same for any input size.
+DENSITY_RANGE = (0.0, 32.0)
+DENSITY_BIN_WIDTH = 0.025
+DENSITY_FLUSH = 65536
+DENSITY_PLOT_MAX = 25.0
+PLOT_LOCK = threading.Lock()
+
+
+class ICDensity:
+    def __init__(self, ic_range=DENSITY_RANGE, bin_width=DENSITY_BIN_WIDTH):
+        nbins = int(round((ic_range[1] - ic_range[0]) / bin_width))
+        self.edges = numpy.linspace(ic_range[0], ic_range[1], nbins + 1)
+        self.counts = {}
+        self.moments = {}
+        self.pending = {}
+        self.go_set = set()
+
+    def add(self, x):
+        if x and x[5] not in (None, "None") and x[2] not in self.go_set:
+            self.go_set.add(x[2])
+            pending = self.pending.setdefault(x[1], [])
+            pending.append(float(x[5]))
+            if len(pending) >= DENSITY_FLUSH:
+                self.flush(x[1])
+
+    def update(self, rows):
+        for x in rows:
+            self.add(x)
+        return self
+
+    # Bins the pending ICs of aspect (all aspects by default). Values out of
+    # range land in the first/last bin, the moments use the exact values
+    def flush(self, aspect=None):
+        for key in ([aspect] if aspect is not None else list(self.pending)):
+            values = numpy.asarray(self.pending.pop(key, []), dtype=numpy.float64)
+            if not len(values):
+                continue
+            if key not in self.counts:
+                self.counts[key] = numpy.zeros(len(self.edges) - 1, dtype=numpy.int64)
+                self.moments[key] = numpy.zeros(3)
+            clipped = numpy.clip(values, self.edges[0], numpy.nextafter(self.edges[-1], self.edges[0]))
+            self.counts[key] += numpy.histogram(clipped, bins=self.edges)[0]
+            self.moments[key] += (len(values), values.sum(), numpy.square(values).sum())
+        return self
+
+    @property
+    def centers(self):
+        return (self.edges[:-1] + self.edges[1:]) / 2
+
+    # Scott's rule bandwidth, the one scipy.stats.gaussian_kde uses
+    def bandwidth(self, aspect):
+        n, total, squares = self.moments[aspect]
+        if n < 2:
+            return 0.0
+        variance = max((squares - total * total / n) / (n - 1), 0.0)
+        return math.sqrt(variance) * n ** (-1.0 / 5)
+
+    # {aspect: density over centers}, "kde" (binned gaussian KDE) or "hist".
+    # Aspects with less than two ICs (or a single repeated one) are skipped
+    def densities(self, mode="kde"):
+        self.flush()
+        width = self.edges[1] - self.edges[0]
+        densities = {}
+        for aspect in self.counts:
+            counts = self.counts[aspect]
+            n = counts.sum()
+            if n < 2:
+                continue
+            if mode == "hist":
+                densities[aspect] = counts / (n * width)
+                continue
+            sigma = self.bandwidth(aspect)
+            if sigma <= 0:
+                continue
+            densities[aspect] = binned_kde(counts, width, sigma) / n
+        return densities
+
+
+# Gaussian kernel (sigma, same units as width) convolved over binned counts
+# with an FFT, O(bins log bins) whatever the number of values binned
+def binned_kde(counts, width, sigma):
+    half = min(len(counts), int(math.ceil(5 * sigma / width)))
+    offsets = numpy.arange(-half, half + 1) * width
+    kernel = numpy.exp(-0.5 * (offsets / sigma) ** 2) / (math.sqrt(2 * math.pi) * sigma)
+    size = 1 << int(len(counts) + len(kernel) - 1).bit_length()
+    convolved = numpy.fft.irfft(
+        numpy.fft.rfft(counts.astype(numpy.float64), size) * numpy.fft.rfft(kernel, size), size
+    )
+    return numpy.maximum(convolved[half:half + len(counts)], 0.0)
+
+
+# Per-aspect densities as a small TSV: IC bin center, one column per aspect
+def write_density_tsv(centers, densities, FILEPATH):
+    aspects = sorted(densities)
+    lines = ["\t".join(["#IC"] + aspects)]
+    for i, center in enumerate(centers):
+        lines.append("\t".join(["%.4f" % center] + ["%.6g" % densities[a][i] for a in aspects]))
+    return write_tsv_lines(lines, FILEPATH)
+
+
+# Per input file summary of precalc_IC/precalc_files
+SUMMARY_COLUMNS = [
+    "inputfile",
+    "status",
+    "output",
+    "input_rows",
+    "output_rows",
+    "rows_dropped_unknown_go",
+    "rows_dropped_alt_id",
+    "distinct_go",
+] + [x + y for x in NAMESPACES for y in ("_terms", "_mean_ic")]
+
+
+def file_summary(filepath, outputpath, stats, density):
+    dropped = stats["rows_dropped_unknown_go"] + stats["rows_dropped_alt_id"]
+    summary = {
+        "inputfile": filepath,
+        "output": outputpath,
+        "input_rows": stats["input_rows"],
+        "output_rows": stats["input_rows"] - dropped,
+        "rows_dropped_unknown_go": stats["rows_dropped_unknown_go"],
+        "rows_dropped_alt_id": stats["rows_dropped_alt_id"],
+        "distinct_go": stats["distinct_go"],
+    }
+    density.flush()
+    for aspect in NAMESPACES:
+        n, total, _ = density.moments.get(aspect, (0, 0.0, 0.0))
+        summary[aspect + "_terms"] = int(n)
+        summary[aspect + "_mean_ic"] = float(total / n) if n else "None"
+    return summary
 
 
-def compute_precalc(input_data, annotations, godag):
-    input_data_ic = [crow_precalc(x) for x in tqdm.tqdm(input_data) if x]
-    return input_data_ic
+def write_summary_table(summaries, FILEPATH):
+    lines = ["#" + "\t".join(SUMMARY_COLUMNS)]
+    for summary in summaries:
+        lines.append("\t".join(str(summary.get(x, "")) for x in SUMMARY_COLUMNS))
+    return write_tsv_lines(lines, FILEPATH)
 
 
-def dump_ic_data(ic_data, outputfile="ic_data.tsv"):
-    # Same format as GOATOOLS
-    with open(TSVOUTPUTS_FOLDER+outputfile, "w") as fwrite:
-        fwrite.write("\n".join(["\t".join([str(y) for y in x])
-                     for x in ic_data if x])+"\n")
-
-def plot_density(ic_data, filename):
-    bins = numpy.linspace(0, 25, 1000)
-    fig, ax = plt.subplots()
-    ic_vector = {}
-    go_set = set()
-    aspect_color = {
-        "biological_process": "red",
-        "cellular_component": "blue",
-        "molecular_function": "green"
+# True if all outputs exist and are newer than every input
+def is_up_to_date(outputs, inputs):
+    try:
+        oldest = min(os.path.getmtime(x) for x in outputs)
+    except OSError:
+        return False
+    return all(os.path.getmtime(x) <= oldest for x in inputs if os.path.exists(x))
+
+
+###############################################################################
+# PER PROTEIN SUMMARY
+###############################################################################
+# Optional precalc_IC output (outputs/<name>.proteins.tsv) with one row per
+# protein and aspect: annotation rows, distinct GO terms, max/mean/sum IC and
+# the most specific GO terms, i.e. without any term that is an is_a ancestor
+# of another term of the same protein.
+# Rows are kept as (protein, term) int32 pairs; when the buffer fills they
+# are spilled to temporary files by protein range. Every range is summarized
+# with numpy over the compiled ancestor closure, so memory depends on the
+# number of proteins and not on the number of rows, and the input does not
+# need to be sorted by accession. Proteins come out in input order.
+PROTEIN_BUFFER_ROWS = 1 << 22
+PROTEIN_PART_SIZE = 1 << 16
+# (term, ancestor) pairs expanded at once by the redundancy filter
+PROTEIN_CHUNK_PAIRS = 1 << 18
+PROTEIN_COLUMNS = [
+    "Seq_ID",
+    "Category",
+    "Annotations",
+    "GO_terms",
+    "Specific_GO_terms",
+    "Max_IC",
+    "Mean_IC",
+    "Sum_IC",
+    "Specific_GOs",
+]
+
+
+# Mask of the sorted (protein * len(dag) + term) keys whose term is an is_a
+# ancestor of another term of the same protein. Ancestors are expanded for
+# whole proteins at a time, about chunk_pairs pairs per step, and only the
+# ancestors found among the terms of the step are looked up.
+def redundant_terms(dag, keys, protein, term, chunk_pairs=PROTEIN_CHUNK_PAIRS):
+    size = len(dag)
+    indptr, indices = numpy.asarray(dag.ancestors_indptr), numpy.asarray(dag.ancestors_indices)
+    redundant = numpy.zeros(len(keys), dtype=numpy.bool_)
+    present = numpy.zeros(size, dtype=numpy.bool_)
+    ends = numpy.flatnonzero(numpy.r_[numpy.diff(protein) != 0, True]) + 1
+    pairs_before = numpy.r_[0, numpy.cumsum(numpy.diff(indptr)[term])]
+    pairs_at_ends = pairs_before[ends]
+    start = 0
+    while start < len(keys):
+        end = ends[max(
+            numpy.searchsorted(ends, start, side="right"),
+            numpy.searchsorted(pairs_at_ends, pairs_before[start] + chunk_pairs, side="right") - 1,
+        )]
+        owner, ancestors = csr_rows(indptr, indices, term[start:end])
+        present[term[start:end]] = True
+        found = present[ancestors]
+        present[term[start:end]] = False
+        ancestor_keys = protein[start:end][owner[found]] * size + ancestors[found]
+        positions = numpy.minimum(numpy.searchsorted(keys[start:end], ancestor_keys), end - start - 1)
+        hit = keys[start:end][positions] == ancestor_keys
+        redundant[start + positions[hit]] = True
+        start = end
+    return redundant
+
+
+class ProteinSummary:
+    # ic: IC of every DAG term, NaN where there is none
+    def __init__(self, dag, ic, buffer_rows=PROTEIN_BUFFER_ROWS, part_size=PROTEIN_PART_SIZE):
+        self.dag = dag
+        self.ic = ic
+        self.part_size = part_size
+        self.buffer_rows = buffer_rows
+        self.accessions = {}
+        self.term_index = {}
+        # Plain lists while streaming (the ints are shared with the dicts),
+        # turned into int32 arrays when spilled
+        self.proteins = []
+        self.terms = []
+        self.folder = None
+
+    def add(self, accession, goterm):
+        protein = self.accessions.get(accession)
+        if protein is None:
+            protein = self.accessions[accession] = len(self.accessions)
+        term = self.term_index.get(goterm)
+        if term is None:
+            term = self.term_index[goterm] = self.dag.get(goterm)
+        self.proteins.append(protein)
+        self.terms.append(term)
+        if len(self.proteins) >= self.buffer_rows:
+            self.spill()
+
+    def part_path(self, part):
+        return os.path.join(self.folder.name, "part_%d.i32" % part)
+
+    # Buffered rows as (protein, term) parts, one per range of part_size
+    # proteins
+    def buffered_parts(self):
+        proteins = numpy.array(self.proteins, dtype=numpy.int32)
+        terms = numpy.array(self.terms, dtype=numpy.int32)
+        part = proteins // self.part_size
+        order = numpy.argsort(part, kind="stable")
+        part = part[order]
+        bounds = numpy.flatnonzero(numpy.diff(part)) + 1
+        for rows in numpy.split(order, bounds) if len(order) else []:
+            yield int(proteins[rows[0]] // self.part_size), proteins[rows], terms[rows]
+
+    # Appends the buffer to the part files
+    def spill(self):
+        import tempfile
+        if self.folder is None:
+            self.folder = tempfile.TemporaryDirectory(prefix="goic_proteins_")
+        for part, proteins, terms in self.buffered_parts():
+            with open(self.part_path(part), "ab") as fwrite:
+                numpy.stack([proteins, terms], axis=1).tofile(fwrite)
+        self.proteins = []
+        self.terms = []
+
+    # Summary TSV lines, header first. Can only be read once.
+    def lines(self):
+        yield "#" + "\t".join(PROTEIN_COLUMNS)
+        accessions = list(self.accessions)
+        if self.folder is None:
+            for _, proteins, terms in self.buffered_parts():
+                yield from self.part_lines(accessions, proteins, terms)
+            return
+        self.spill()
+        try:
+            for part in range((len(accessions) + self.part_size - 1) // self.part_size):
+                if os.path.exists(self.part_path(part)):
+                    rows = numpy.fromfile(self.part_path(part), dtype=numpy.int32).reshape(-1, 2)
+                    yield from self.part_lines(accessions, rows[:, 0], rows[:, 1])
+        finally:
+            self.folder.cleanup()
+            self.folder = None
+
+    def part_lines(self, accessions, proteins, terms):
+        size = len(self.dag)
+        dag = self.dag
+        # Distinct (protein, term) pairs, sorted by protein then term
+        keys, rows = numpy.unique(proteins.astype(numpy.int64) * size + terms, return_counts=True)
+        protein = keys // size
+        term = keys % size
+        specific = ~redundant_terms(dag, keys, protein, term)
+
+        aspect = numpy.asarray(dag.namespace)[term].astype(numpy.int64)
+        known = aspect >= 0
+        group = (protein * len(NAMESPACES) + aspect)[known]
+        order = numpy.argsort(group, kind="stable")
+        group = group[order]
+        term, rows, specific = term[known][order], rows[known][order], specific[known][order]
+        if not len(group):
+            return
+        starts = numpy.flatnonzero(numpy.r_[True, numpy.diff(group) != 0])
+        ic = self.ic[term]
+        has_ic = ~numpy.isnan(ic)
+        annotations = numpy.add.reduceat(rows, starts).tolist()
+        go_terms = numpy.diff(numpy.r_[starts, len(group)]).tolist()
+        n_specific = numpy.add.reduceat(specific.astype(numpy.int64), starts)
+        n_ic = numpy.add.reduceat(has_ic.astype(numpy.int64), starts).tolist()
+        sum_ic = numpy.add.reduceat(numpy.where(has_ic, ic, 0.0), starts).tolist()
+        max_ic = numpy.maximum.reduceat(numpy.where(has_ic, ic, -numpy.inf), starts).tolist()
+        specific_ends = numpy.cumsum(n_specific).tolist()
+        specific_ids = [go_string(x) for x in numpy.asarray(dag.go_numbers)[term[specific]].tolist()]
+        group = group[starts].tolist()
+        n_specific = n_specific.tolist()
+
+        for i in range(len(group)):
+            if n_ic[i]:
+                values = str(max_ic[i]) + "\t" + str(sum_ic[i] / n_ic[i]) + "\t" + str(sum_ic[i])
+            else:
+                values = "None\tNone\tNone"
+            yield "\t".join([
+                accessions[group[i] // len(NAMESPACES)],
+                NAMESPACES[group[i] % len(NAMESPACES)],
+                str(annotations[i]),
+                str(go_terms[i]),
+                str(n_specific[i]),
+                values,
+                ",".join(specific_ids[specific_ends[i] - n_specific[i]:specific_ends[i]]),
+            ])
+
+
+###############################################################################
+# BINARY RESULTS
+###############################################################################
+# Columnar alternative to the output TSV (.icres, an array file like the
+# compiled DAG and the precomputed DB). One int32 accession code, int32 term
+# code and int8 aspect per row; accessions are stored once in a string
+# table and the GO ids, counts, depths, ICs and descriptions once in a term
+# table. Rows are appended to temporary column files in chunks while the
+# input streams and put together when the writer is closed.
+# read_ic_results opens it with numpy.memmap, nothing is parsed or copied.
+ICRESULTS_FORMAT_VERSION = 1
+ICRESULTS_EXTENSION = ".icres"
+ICRESULTS_CHUNK_ROWS = 1 << 20
+ICRESULTS_ROW_COLUMNS = {"accession": numpy.int32, "term": numpy.int32, "aspect": numpy.int8}
+
+
+class ICResultsWriter:
+    # ic_variants: names of the IC columns of the rows (IC_VARIANTS)
+    def __init__(self, FILEPATH, ic_variants=None, chunk_rows=ICRESULTS_CHUNK_ROWS):
+        import tempfile
+        self.path = FILEPATH
+        self.ic_variants = list(ic_variants or ["annotation"])
+        self.chunk_rows = chunk_rows
+        self.accessions = {}
+        self.term_codes = {}
+        self.terms = []
+        self.term_aspects = []
+        # Rows given one by one with add, waiting for a chunk
+        self.pending_accessions = []
+        self.pending_terms = []
+        self.rows = 0
+        # Next to the output, the columns can be as big as the results
+        self.folder = tempfile.TemporaryDirectory(
+            prefix="goic_results_", dir=os.path.dirname(os.path.abspath(FILEPATH))
+        )
+        self.files = {
+            name: open(os.path.join(self.folder.name, name), "wb") for name in ICRESULTS_ROW_COLUMNS
+        }
+
+    def __enter__(self):
+        return self
+
+    # Written when the block ends, dropped if it raised
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    # Code of an output term row ([aspect, GO id, descendant count, depth,
+    # ICs..., description], as precalc_term gives it)
+    def add_term(self, term):
+        self.terms.append(term)
+        self.term_aspects.append(NAMESPACES.index(term[0]) if term[0] in NAMESPACES else -1)
+        return len(self.terms) - 1
+
+    # A chunk of rows: accessions and the codes of their terms. New
+    # accessions get the next code, one dict operation per row.
+    def add_rows(self, accessions, term_codes):
+        known = self.accessions
+        codes = [known.setdefault(x, len(known)) for x in accessions]
+        terms = numpy.array(term_codes, dtype=numpy.int32)
+        numpy.array(codes, dtype=numpy.int32).tofile(self.files["accession"])
+        terms.tofile(self.files["term"])
+        numpy.array(self.term_aspects, dtype=numpy.int8)[terms].tofile(self.files["aspect"])
+        self.rows += len(terms)
+
+    # Output row [accession, aspect, GO id, ...] (crow_compute/crow_precalc)
+    def add(self, row):
+        code = self.term_codes.get(row[2])
+        if code is None:
+            code = self.term_codes[row[2]] = self.add_term(row[1:])
+        self.pending_accessions.append(row[0])
+        self.pending_terms.append(code)
+        if len(self.pending_terms) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        self.add_rows(self.pending_accessions, self.pending_terms)
+        self.pending_accessions = []
+        self.pending_terms = []
+
+    def column(self, name):
+        path = os.path.join(self.folder.name, name)
+        if not self.rows:
+            return numpy.zeros(0, dtype=ICRESULTS_ROW_COLUMNS[name])
+        return numpy.memmap(path, dtype=ICRESULTS_ROW_COLUMNS[name], mode="r", shape=(self.rows,))
+
+    def close(self):
+        self.flush()
+        for fwrite in self.files.values():
+            fwrite.close()
+        terms = self.terms
+        arrays = {name: self.column(name) for name in ICRESULTS_ROW_COLUMNS}
+        arrays["accession_names"], arrays["accession_offsets"] = to_string_table(list(self.accessions))
+        arrays["term_go_numbers"] = numpy.array([go_number_or_missing(x[1]) for x in terms], dtype=numpy.int32)
+        arrays["term_aspect"] = numpy.array(self.term_aspects, dtype=numpy.int8)
+        arrays["term_descendant_count"] = numpy.array([to_int_or_missing(x[2]) for x in terms], dtype=numpy.int32)
+        arrays["term_depth"] = numpy.array([to_int_or_missing(x[3]) for x in terms], dtype=numpy.int32)
+        for i, variant in enumerate(self.ic_variants):
+            arrays["term_ic_" + variant] = numpy.array([to_float_or_missing(x[4 + i]) for x in terms], dtype=numpy.float64)
+        arrays["term_names"], arrays["term_names_offsets"] = to_string_table([x[-1] for x in terms])
+        try:
+            write_array_file(self.path, arrays, {
+                "kind": "ic_results",
+                "format_version": ICRESULTS_FORMAT_VERSION,
+                "rows": self.rows,
+                "ic_variants": self.ic_variants,
+            })
+        finally:
+            del arrays
+            self.folder.cleanup()
+        return self.path
+
+    def discard(self):
+        for fwrite in self.files.values():
+            fwrite.close()
+        self.folder.cleanup()
+
+
+class ICResults:
+    # Read only view of an .icres file. Row columns: accession, term (code
+    # into the term_* table) and aspect (index into NAMESPACES, -1 if none).
+    # Term table: term_go_numbers, term_aspect, term_descendant_count and
+    # term_depth (-1 for None), term_ic_<variant> (NaN for None) and the
+    # descriptions.
+    def __init__(self, FILEPATH):
+        self.path = FILEPATH
+        self.meta, arrays = read_array_file(FILEPATH)
+        if self.meta.get("kind") != "ic_results":
+            raise ValueError(FILEPATH + " is not an IC results file")
+        for name, array in arrays.items():
+            setattr(self, name, array)
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    @property
+    def ic_variants(self):
+        return self.meta["ic_variants"]
+
+    def accession_ids(self):
+        return from_string_table(self.accession_names, self.accession_offsets)
+
+    def go_ids(self):
+        return [go_string(x) for x in self.term_go_numbers.tolist()]
+
+    def descriptions(self):
+        return from_string_table(self.term_names, self.term_names_offsets)
+
+    # Per row values of a term table column ("descendant_count", "depth",
+    # "ic_<variant>"), or of the first IC with "ic"
+    def column(self, name):
+        if name == "ic":
+            name = "ic_" + self.ic_variants[0]
+        return getattr(self, "term_" + name)[self.term]
+
+    # The TSV lines of the same results, without newline
+    def lines(self, chunk_rows=ICRESULTS_CHUNK_ROWS):
+        accessions = self.accession_ids()
+        columns = [
+            [NAMESPACES[x] if x >= 0 else "None" for x in self.term_aspect.tolist()],
+            self.go_ids(),
+            ["None" if x < 0 else str(x) for x in self.term_descendant_count.tolist()],
+            ["None" if x < 0 else str(x) for x in self.term_depth.tolist()],
+        ]
+        for variant in self.ic_variants:
+            columns.append(["None" if math.isnan(x) else str(x) for x in getattr(self, "term_ic_" + variant).tolist()])
+        columns.append(self.descriptions())
+        term_lines = ["\t".join(x) for x in zip(*columns)]
+        for start in range(0, len(self), chunk_rows):
+            rows = zip(self.accession[start:start + chunk_rows].tolist(), self.term[start:start + chunk_rows].tolist())
+            for accession, term in rows:
+                yield accessions[accession] + "\t" + term_lines[term]
+
+
+def read_ic_results(FILEPATH):
+    return ICResults(FILEPATH)
+
+
+###############################################################################
+# PROFILING
+###############################################################################
+# Wall/CPU time and memory per phase, plus counters and sections (caches,
+# workers) added by the engine. Used by ICEngine when engine.profiler is set:
+#   engine.profiler = Profiler()
+#   engine.precalc_IC(...)
+#   engine.profile_report()
+PROFILE_FORMAT_VERSION = 1
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as fread:
+            return int(fread.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+# Peak RSS since the last reset_peak_rss() (Linux), or of the whole process
+def peak_rss_mb():
+    try:
+        with open("/proc/self/status") as fread:
+            for line in fread:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if os.uname().sysname == "Darwin" else peak / 1024
+
+
+def reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as fwrite:
+            fwrite.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def children_cpu_s():
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def round_or_none(value, digits):
+    return None if value is None else round(value, digits)
+
+
+class Profiler:
+    def __init__(self):
+        self.phases = []
+        self.counters = Counter()
+        self.sections = {}
+        self.peak_resets = True
+
+    # with profiler.phase("name") as record: ... record["rows"] = n
+    @contextlib.contextmanager
+    def phase(self, name):
+        record = {"phase": name}
+        self.peak_resets = reset_peak_rss() and self.peak_resets
+        rss_start = rss_mb()
+        children_start = children_cpu_s()
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["wall_s"] = round(time.perf_counter() - wall_start, 6)
+            record["cpu_s"] = round(time.process_time() - cpu_start, 6)
+            record["children_cpu_s"] = round(children_cpu_s() - children_start, 6)
+            record["rss_start_mb"] = round_or_none(rss_start, 2)
+            record["rss_end_mb"] = round_or_none(rss_mb(), 2)
+            record["peak_rss_mb"] = round_or_none(peak_rss_mb(), 2)
+            if record.get("rows") is not None:
+                record["rows_per_s"] = round(record["rows"] / record["wall_s"], 2) if record["wall_s"] else None
+            self.phases.append(record)
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def report(self):
+        return {
+            "format_version": PROFILE_FORMAT_VERSION,
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "pid": os.getpid(),
+            "cpu_count": CPU_COUNT,
+            # False: peak_rss_mb is the peak of the whole process so far
+            "peak_rss_per_phase": self.peak_resets,
+            "phases": self.phases,
+            "total": {
+                "wall_s": round(sum(x["wall_s"] for x in self.phases), 6),
+                "cpu_s": round(sum(x["cpu_s"] + x["children_cpu_s"] for x in self.phases), 6),
+                "peak_rss_mb": max([x["peak_rss_mb"] for x in self.phases if x["peak_rss_mb"] is not None] or [None]),
+            },
+            "counters": dict(self.counters),
+            **self.sections,
+        }
+
+    def write(self, FILEPATH, report=None):
+        with open(FILEPATH, "w") as fwrite:
+            json.dump(report or self.report(), fwrite, indent=1)
+        return FILEPATH
+
+
+def cache_counts(cache_info):
+    return {"hits": cache_info.hits, "misses": cache_info.misses, "size": cache_info.currsize}
+
+
+def cache_rates(hits, misses):
+    return {"hits": hits, "misses": misses, "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None}
+
+
+# Per worker busy time, rows and cache hits/misses from the job stats of
+# compute_compute (chunks of rows) or precalc_files (files),
+# utilization = busy time / (wall time * workers)
+def worker_summary(job_stats, wall_s, workers):
+    per_worker = {}
+    caches = {}
+    for stats in job_stats:
+        worker = per_worker.setdefault(stats["pid"], {"jobs": 0, "rows": 0, "busy_s": 0.0, "cpu_s": 0.0})
+        worker["jobs"] += 1
+        worker["rows"] += stats["rows"]
+        worker["busy_s"] += stats["busy_s"]
+        worker["cpu_s"] += stats["cpu_s"]
+        for cache, (hits, misses) in stats.get("caches", {}).items():
+            total = caches.setdefault(cache, [0, 0])
+            total[0] += hits
+            total[1] += misses
+    busy = sum(x["busy_s"] for x in per_worker.values())
+    return {
+        "workers": workers,
+        "workers_used": len(per_worker),
+        "jobs": len(job_stats),
+        "busy_s": round(busy, 6),
+        "utilization": round(busy / (wall_s * workers), 4) if wall_s and workers else None,
+        "per_worker": [
+            dict(pid=pid, **{x: round(y, 6) if isinstance(y, float) else y for x, y in worker.items()})
+            for pid, worker in sorted(per_worker.items())
+        ],
+        "caches": {x: cache_rates(*y) for x, y in caches.items()},
     }
-    for x in ic_data:
-        if x and x[5] != "None" and x[2] not in go_set:
-            ic_vector[x[1]] = ic_vector.get(x[1], []) + [float(x[5])]
-            go_set.update([x[2]])
-
-    plot_vector = []
-
-    for aspect in ic_vector:
-        if len(ic_vector[aspect]) > 1:
-            n, x, _ = plt.hist(
-                ic_vector[aspect],
-                bins=bins,
-                density=True,
-                histtype="step",
-                color=aspect_color[aspect],
-                label=aspect,
+
+
+###############################################################################
+# IC ENGINE
+###############################################################################
+# Holds the GO resources (go.obo, compiled DAG, universe, precomputed DB).
+# Nothing is read, downloaded or created until it is first used and every
+# path can be configured, so several engines (e.g. with different universes)
+# can live in the same process.
+class ICEngine:
+    def __init__(
+        self,
+        data_folder=DATA_FOLDER,
+        annotations_folder=ANNOTATIONS_FOLDER,
+        plots_folder=PLOTS_FOLDER,
+        outputs_folder=TSVOUTPUTS_FOLDER,
+        obo_path=None,
+        dag_path=None,
+        precomputed_path=None,
+        universe_path=None,
+        universe_count_path=None,
+        basic_obo=BASIC_OBO,
+        profiler=None,
+    ):
+        self.data_folder = data_folder
+        self.annotations_folder = annotations_folder
+        self.plots_folder = plots_folder
+        self.outputs_folder = outputs_folder
+        self.obo_url = OBO_BASIC_URL if basic_obo else OBO_URL
+        self.obo_path = obo_path or data_folder + ("go-basic.obo" if basic_obo else "go.obo")
+        self.dag_path = dag_path or data_folder + "godag.compiled"
+        self.precomputed_path = precomputed_path or data_folder + "goa_uniprot_all.pickle"
+        self.universe_path = universe_path or annotations_folder + "goa_uniprot_all.universe"
+        self.universe_count_path = universe_count_path or data_folder + "universe.pickle"
+        # Profiler() to record phases, counters, caches and workers
+        self.profiler = profiler
+
+        self._godag = None
+        self._obo = None
+        self._precomputed_ics = None
+        self._annotations = None
+        self._intrinsic_ics = None
+        # Per engine caches, an engine with another universe gets its own
+        self.calculate_IC = lru_cache(maxsize=None)(self._calculate_IC)
+        self.get_depth = lru_cache(maxsize=None)(self._get_depth)
+
+    ###########################################################################
+    # Lazy resources
+    ###########################################################################
+    # profiler.phase(name) or a no-op context when not profiling
+    def _phase(self, name):
+        if self.profiler is None:
+            return contextlib.nullcontext({})
+        return self.profiler.phase(name)
+
+    def _count(self, name, n=1):
+        if self.profiler is not None and n:
+            self.profiler.count(name, n)
+
+    # Profiler report plus the caches that were used: the GO id cache of
+    # precalc (one lookup per distinct GO id of a file, the other rows are
+    # hits) and calculate_IC/get_depth when they ran in this process
+    def profile_report(self):
+        report = self.profiler.report()
+        counters = self.profiler.counters
+        caches = {}
+        if counters["input_rows"]:
+            caches["precalc_terms"] = cache_rates(counters["input_rows"] - counters["distinct_go"], counters["distinct_go"])
+        for name, cache in (("calculate_IC", self.calculate_IC), ("get_depth", self.get_depth)):
+            info = cache.cache_info()
+            if info.hits or info.misses:
+                caches[name] = cache_counts(info)
+        report["caches"] = caches
+        return report
+
+    def write_profile(self, FILEPATH):
+        print("Writing profile", FILEPATH)
+        return self.profiler.write(FILEPATH, self.profile_report())
+
+    @property
+    def godag(self):
+        if self._godag is None:
+            if os.path.exists(self.dag_path) and not os.path.exists(self.obo_path):
+                self._godag = GODag(self.dag_path)
+            else:
+                get_remote_file(self.obo_url, self.obo_path)
+                self._godag = load_godag(self.obo_path, self.dag_path)
+        return self._godag
+
+    @property
+    def obo(self):
+        if self._obo is None:
+            self._obo = OboTable(self.godag)
+        return self._obo
+
+    # A pickled DB is converted once into data/precomputed/ (open_precomputed)
+    @property
+    def precomputed_ics(self):
+        if self._precomputed_ics is None:
+            self._precomputed_ics = open_precomputed(self.precomputed_path, self.data_folder + "precomputed/")
+        return self._precomputed_ics
+
+    def set_precomputed_path(self, precomputed_path):
+        self.precomputed_path = precomputed_path
+        self._precomputed_ics = None
+
+    # Engine sharing the resources this one already loaded (they are read
+    # only) but with another precomputed DB and its own caches
+    def with_precomputed(self, precomputed_path):
+        engine = ICEngine.__new__(ICEngine)
+        engine.__dict__.update(self.__dict__)
+        engine.profiler = None
+        engine.calculate_IC = lru_cache(maxsize=None)(engine._calculate_IC)
+        engine.get_depth = lru_cache(maxsize=None)(engine._get_depth)
+        engine.set_precomputed_path(precomputed_path)
+        return engine
+
+    # Intrinsic IC variants of every DAG term (compute_intrinsic_ics), for
+    # the terms or variants a precomputed table does not store
+    @property
+    def intrinsic_ics(self):
+        if self._intrinsic_ics is None:
+            self._intrinsic_ics = compute_intrinsic_ics(self.godag, INTRINSIC_IC_VARIANTS)
+        return self._intrinsic_ics
+
+    # Universe used by calculate_IC/get_depth, by default the goa_uniprot_all
+    # GO list counts
+    @property
+    def annotations(self):
+        if self._annotations is None:
+            self._annotations = self.load_universe()
+        return self._annotations
+
+    @annotations.setter
+    def annotations(self, universe):
+        self._annotations = universe
+        self.calculate_IC.cache_clear()
+        self.get_depth.cache_clear()
+
+    def load_universe(self):
+        if not os.path.exists(self.universe_count_path):
+            universe = self.compile_universe_counts(
+                count_annotation_file(self.universe_path, "list"))
+            new_folder(os.path.dirname(self.universe_count_path))
+            with open(self.universe_count_path, "wb") as fwrite:
+                pickle.dump(universe, fwrite)
+        else:
+            with open(self.universe_count_path, "rb") as fread:
+                universe = pickle.load(fread)
+        return universe
+
+    ###########################################################################
+    # ANNOTATIONS
+    ###########################################################################
+    def compile_universe_counts(self, annot_counts):
+        obo = self.obo
+        universe = {
+            "biological_process": {},
+            "cellular_component": {},
+            "molecular_function": {},
+        }
+        for goterm, count in annot_counts.items():
+            if obo.get(goterm, None) is not None:
+                aspect = obo[goterm][1]
+                universe[aspect][goterm] = universe[aspect].get(goterm, 0) + count
+        print("Compiling annotations")
+        print("Total of annotations readed", sum(annot_counts.values()))
+        for x in universe:
+            universe[x]["total"] = sum(
+                [universe[x][y] for y in universe[x] if y != "total"]
             )
-            density = stats.gaussian_kde(ic_vector[aspect])
-            plot_vector.append([x, density, aspect])
-            plt.clf()
-    plt.title("Information Content " + filename)
-    for x in plot_vector:
-        plt.plot(
-            x[0],
-            x[1](x[0]),
-            color=aspect_color[x[2]],
-            label=x[2],
+            print("", x, universe[x]["total"])
+
+        return universe
+
+    def compile_universe(self, all_annot):
+        return self.compile_universe_counts(Counter(all_annot))
+
+    def get_universe(self, progress=False, refresh=False, exclude_evidence=None, skip_not=False):
+        ANNOTATIONS = new_folder(self.annotations_folder)
+        universe_PICKLE = self.universe_count_path
+        if refresh or not os.path.exists(universe_PICKLE):
+            print("DOWNLOADING AND COUNTING ANNOTATION FILEs")
+            filepaths = [ANNOTATIONS + GPAD_SOURCES[x] for x in GPAD_SOURCES]
+            jobs = [(GPAD_URL.format(GZ=x), ANNOTATIONS + x) for x in sorted(set(GPAD_SOURCES.values()))]
+            annot_counts = count_sources(
+                filepaths,
+                exclude_evidence,
+                skip_not,
+                download=partial(download_files, jobs, refresh, progress=progress),
+            )
+            universe = self.compile_universe_counts(annot_counts)
+            new_folder(os.path.dirname(universe_PICKLE))
+            with open(universe_PICKLE, "wb") as fwrite:
+                pickle.dump(universe, fwrite)
+        else:
+            with open(universe_PICKLE, "rb") as fread:
+                universe = pickle.load(fread)
+        return universe
+
+    # Universe of one annotation file (gaf, gpad or GO list) as the engine
+    # universe. The counts are cached in data/counts/ and reused while the
+    # file keeps its size and mtime or its content (sha256).
+    def load_annotation_universe(self, annotpath, exclude_evidence=None, skip_not=False):
+        with self._phase("count_annotations") as record:
+            annot_counts = count_annotation_file_cached(
+                annotpath, None, exclude_evidence, skip_not, self.data_folder + "counts/"
+            )
+            record["rows"] = sum(annot_counts.values())
+        with self._phase("compile_universe"):
+            self.annotations = self.compile_universe_counts(annot_counts)
+        return self.annotations
+
+    # Direct mode (--annotation): ICs of the GO ids found in the input files
+    # against the universe of annotpath, without a whole --precompute pass.
+    # Only those terms, their descendants and their ancestors are computed,
+    # and the result becomes the precomputed table of this engine, so
+    # precalc_IC and precalc_files give the rows a DB precomputed from
+    # annotpath would give.
+    def set_annotation_universe(self, annotpath, filepaths, exclude_evidence=None, skip_not=False):
+        self.load_annotation_universe(annotpath, exclude_evidence, skip_not)
+        with self._phase("input_terms") as record:
+            goterms = set()
+            for filepath in filepaths:
+                goterms.update(goterm for _, goterm in iter_input_rows(filepath))
+            record["rows"] = len(goterms)
+        print("Computing ICs of", len(goterms), "GO terms")
+        with self._phase("compute_terms") as record:
+            table = self.term_ic_table(goterms)
+            record["rows"] = len(table)
+        self.precomputed_path = annotpath
+        self._precomputed_ics = table
+        self.calculate_IC.cache_clear()
+        self.get_depth.cache_clear()
+        return table
+
+    # {GO id: [descendant count, depth, IC]} of some GO ids against the
+    # universe, as precompute_data writes it: only primary ids annotated in
+    # the universe get a row
+    def term_ic_table(self, goterms):
+        godag = self.godag
+        universe = self.annotations
+        goterms = sorted(
+            x for x in goterms
+            if godag.get(x) is not None and x in universe.get(godag.aspect(godag.get(x)), {})
         )
-    fig.legend()
-    plt.xlabel("IC ( $-log_{2}(p(t))$ )")
-    plt.savefig(PLOTS_FOLDER + "InformationContent_" + filename + ".jpeg")
-    plt.close()
-
-
-def precalc_IC(filepath,precomputed_user_path=None):
-    global PRECOMPUTED_PICKLE
-    global precomputed_ics
-
-    print("Using Precalculated IC values")
-    input_data = read_input(filepath)
-    if precomputed_user_path is not None:
-        PRECOMPUTED_PICKLE=precomputed_user_path
-        precomputed_ics=unpickle_object(PRECOMPUTED_PICKLE)
-    with open(GOA_UNIVERSE, "r") as fread:
-        if not os.path.exists(UNIVERSE_COUNT_PICKLE):
-            annotations = compile_universe(
-                [x for x in fread.read().split("\n")])
-            with open(UNIVERSE_COUNT_PICKLE, "wb") as fwrite:
-                pickle.dump(annotations, fwrite)
+        ics = compute_term_ics(godag, universe, [godag.get(x) for x in goterms])
+        return {
+            goterm: [
+                int(ics["descendant_count"][i]),
+                int(ics["depth"][i]),
+                "None" if math.isnan(ics["ic"][i]) else float(ics["ic"][i]),
+            ]
+            for i, goterm in enumerate(goterms)
+        }
+
+    ###########################################################################
+    # GENERAL
+    ###########################################################################
+    def process_file(self, file_data):
+        obo = self.obo
+        data = [x + [obo[x[1]][1], obo[x[1]][0]] for x in file_data if obo.get(x[1],None)]
+        return data
+
+    def read_input(self, input_filepath):
+        with open(input_filepath, "r") as fread:
+            file_data = [x.split("\t")[0:2] for x in fread.read().split("\n") if x and not x.startswith("#")]
+        input_data = self.process_file(file_data)
+        self._count("input_rows", len(file_data))
+        self._count("rows_dropped_unknown_go", len(file_data) - len(input_data))
+        return input_data
+
+    ###########################################################################
+    # IC CALCULATIONs
+    ###########################################################################
+    # Get term depth
+    # Longest chain of annotated is_a ancestors, walked level by level
+    def _get_depth(self, term_index, aspect):
+        godag = self.godag
+        annotations = self.annotations
+        depth = []
+        entity_iterator = [term_index]
+
+        while entity_iterator:
+            entity_aux = set()
+            for x in entity_iterator:
+                parents = [y for y in godag.parents(x) if annotations[aspect].get(godag.go_id(y), False)]
+                entity_aux.update(parents)
+            if entity_aux:
+                depth.append(entity_aux)
+            entity_iterator = entity_aux
+
+        return len(depth)
+
+    def _calculate_IC(self, x, aspect):
+        godag = self.godag
+        universe = self.annotations[aspect]
+
+        index = godag.get(x)
+        if index is not None:
+            alt_ids = set(godag.alt_ids(index)) | set([x])
+            alt_ics = []
+            offprings_count = None
+            for x in alt_ids:
+                if universe.get(x, None) is not None:
+                    if offprings_count is None:
+                        offprings_count = sum(
+                            [universe.get(godag.go_id(y), 0) for y in godag.descendants(index)]
+                        )
+                    result = -1 * math.log2(
+                        (universe[x] + offprings_count)
+                        / (universe["total"])
+                    )
+                    alt_ics.append(result)
+            if alt_ics:
+                if min(alt_ics):
+                    return min(alt_ics)
+                else:
+                    return 0.0
+            else:
+                return None
         else:
-            with open(UNIVERSE_COUNT_PICKLE, "rb") as fread:
-                annotations = pickle.load(fread)
-    print("Computing ICs")
-    ic_data = compute_precalc(input_data, annotations, godag)
-    print("Writing data file")
-    dump_ic_data(
-        ic_data, outputfile=filepath.split(
-            "/")[-1].split(".")[0] + ".tsv"
-    )
-    # try:
-    print("Plotting results")
-    plot_density(ic_data, filepath.split("/")[-1].split(".")[0])
-
-def precompute_data(annotpath,outputpath):
-    global annotations
-    if ".gaf" in annotpath:
-        print("Parsing gaf file")
-        if ".gz" in annotpath:
-            with gzip.open(annotpath,"rt") as fread:
-                annot_data=[x.split("\t")[4] for x in fread.read().split("\n") if x and (not x.startswith("!"))]        
+            return None
+
+    def crow_compute(self, row_data):
+        godag = self.godag
+        annotations = self.annotations
+        prot_id, goterm, aspect, desc = row_data
+        index = godag.get(goterm)
+        if index is not None:
+            ic_row = [
+                prot_id,
+                aspect,
+                goterm,
+                len([sc for sc in godag.descendants(index) if annotations[aspect].get(godag.go_id(sc), False)]),
+                self.get_depth(index, aspect),
+                self.calculate_IC(goterm, aspect),
+                desc,
+            ]
+            return ic_row
         else:
-            with open(annotpath,"r") as fread:
-                annot_data=[x.split("\t")[4] for x in fread.read().split("\n") if x and (not x.startswith("!"))]        
-    else:
-        print("Reading '\n' separated GO list")
-        with open(annotpath,"r") as fread:
-            annot_data=[x for x in fread.read().split("\n") if x]
+            return None
+
+    def crow_precalc(self, row_data):
+        prot_id, goterm, aspect, desc = row_data
+        if self.godag.get(goterm) is not None:
+            precomputed = self.precomputed_ics.get(goterm, ["None"]*3)
+            ic_row = [
+                prot_id,
+                aspect,
+                goterm,
+                precomputed[0],
+                precomputed[1],
+                precomputed[2],
+                desc,
+            ]
+            return ic_row
+        else:
+            return None
+
+    # Rows are sent to the workers in chunks of COMPUTE_CHUNK_ROWS, every
+    # chunk also returns its busy time and cache hits/misses for the profile
+    def compute_compute(self, input_data):
+        import p_tqdm
+
+        global _worker_engine
+        # Load everything before forking so the workers inherit it
+        with self._phase("load_godag"):
+            self.godag
+        with self._phase("load_universe"):
+            self.annotations
+        _worker_engine = self
+        chunks = [input_data[i:i + COMPUTE_CHUNK_ROWS] for i in range(0, len(input_data), COMPUTE_CHUNK_ROWS)]
+        with self._phase("compute_compute") as record:
+            results = p_tqdm.p_umap(_crow_compute_chunk, chunks, num_cpus=CPU_COUNT)
+            record["rows"] = len(input_data)
+        input_data_ic = [x for rows, _ in results for x in rows if x]
+        self._count("rows_dropped_alt_id", sum(len(rows) for rows, _ in results) - len(input_data_ic))
+        if self.profiler is not None:
+            self.profiler.sections["compute_compute"] = worker_summary(
+                [stats for _, stats in results], record["wall_s"], min(CPU_COUNT, len(chunks)))
+        return input_data_ic
+
+    def compute_precalc(self, input_data):
+        input_data_ic = [self.crow_precalc(x) for x in tqdm.tqdm(input_data) if x]
+        return input_data_ic
+
+    # Output columns after the accession for a GO id, False if it is dropped.
+    # Same values as process_file + crow_precalc, with one IC column per
+    # ic_variants entry (IC_VARIANTS) instead of the annotation IC if given.
+    def precalc_term(self, goterm, ic_variants=None):
+        term = self.obo.get(goterm, None)
+        if not term or self.godag.get(goterm) is None:
+            return False
+        precomputed = self.precomputed_ics.get(goterm, ["None"]*3)
+        if ic_variants is None:
+            ics = [precomputed[2]]
+        else:
+            ics = [precomputed[2] if x == "annotation" else self.variant_ic(goterm, x) for x in ic_variants]
+        return [term[1], goterm, precomputed[0], precomputed[1]] + ics + [term[0]]
+
+    # Precomputed value of an IC variant for a GO id, "None" if missing
+    def variant_ic(self, goterm, variant):
+        ic = float(self.precomputed_columns(numpy.array([self.godag.get(goterm)]), variant)[2][0])
+        return "None" if math.isnan(ic) else ic
+
+    # Streaming precalc: [accession, GO id] rows in, output rows out.
+    # Terms are looked up once and cached, the cache is bounded by the
+    # number of GO terms.
+    def iter_precalc(self, input_rows):
+        terms = {}
+        for prot_id, goterm in input_rows:
+            term = terms.get(goterm)
+            if term is None:
+                term = terms[goterm] = self.precalc_term(goterm)
+            if term:
+                yield [prot_id] + term
+
+    # Same as iter_precalc but yielding finished TSV lines. Every term is
+    # formatted once, and added to `density` the first time it shows up.
+    # Input, dropped (unknown GO id or alt_id) and distinct GO counts are
+    # added to the `stats` Counter when given, and every output row to the
+    # `proteins` ProteinSummary when given.
+    def iter_precalc_lines(self, input_rows, density=None, stats=None, proteins=None, ic_variants=None):
+        lines = {}
+        rows = 0
+        dropped = Counter()
+        try:
+            for prot_id, goterm in input_rows:
+                rows += 1
+                line = lines.get(goterm)
+                if line is None:
+                    term = self.precalc_term(goterm, ic_variants)
+                    line = lines[goterm] = term and "\t".join([str(y) for y in term])
+                    if term and density is not None:
+                        density.add([prot_id] + term)
+                if line:
+                    if proteins is not None:
+                        proteins.add(prot_id, goterm)
+                    yield prot_id + "\t" + line
+                else:
+                    dropped[goterm] += 1
+        finally:
+            self._add_precalc_stats(stats, rows, dropped, len(lines))
+
+    # Same as iter_precalc_lines but adding the rows to an ICResultsWriter,
+    # every term once and the rows in chunks
+    def write_precalc_results(self, input_rows, results, density=None, stats=None, proteins=None, ic_variants=None):
+        codes = {}
+        rows = 0
+        dropped = Counter()
+        accessions = []
+        terms = []
+        try:
+            for prot_id, goterm in input_rows:
+                rows += 1
+                code = codes.get(goterm)
+                if code is None:
+                    term = self.precalc_term(goterm, ic_variants)
+                    code = codes[goterm] = term and results.add_term(term)
+                    if term and density is not None:
+                        density.add([prot_id] + term)
+                if code is not False:
+                    if proteins is not None:
+                        proteins.add(prot_id, goterm)
+                    accessions.append(prot_id)
+                    terms.append(code)
+                    if len(terms) >= results.chunk_rows:
+                        results.add_rows(accessions, terms)
+                        accessions = []
+                        terms = []
+                else:
+                    dropped[goterm] += 1
+            results.add_rows(accessions, terms)
+        finally:
+            self._add_precalc_stats(stats, rows, dropped, len(codes))
+        return results
+
+    def _add_precalc_stats(self, stats, rows, dropped, distinct_go):
+        if stats is not None:
+            unknown = sum(n for goterm, n in dropped.items() if goterm not in self.obo)
+            stats["input_rows"] += rows
+            stats["rows_dropped_unknown_go"] += unknown
+            stats["rows_dropped_alt_id"] += sum(dropped.values()) - unknown
+            stats["distinct_go"] += distinct_go
+
+    ###########################################################################
+    # BATCH LOOKUPS
+    ###########################################################################
+    # Precomputed (descendant count, depth, IC) columns for term indices,
+    # -1/NaN where missing. The IC is the one of `variant` (IC_VARIANTS).
+    # The intrinsic variants only depend on the DAG, so every known term gets
+    # one: from the DB where it stores the term and the variant, from the
+    # DAG otherwise (unannotated terms, pickled DBs, --annotation tables).
+    def precomputed_columns(self, term_index, variant="annotation"):
+        godag = self.godag
+        db = self.precomputed_ics
+        count = numpy.full(term_index.shape, -1, dtype=numpy.int32)
+        depth = numpy.full(term_index.shape, -1, dtype=numpy.int32)
+        ic = numpy.full(term_index.shape, numpy.nan)
+        known = term_index >= 0
+        if variant != "annotation":
+            ic[known] = self.intrinsic_ics[variant][term_index[known]]
+        if isinstance(db, PrecomputedDB):
+            rows = db.rows(numpy.asarray(godag.go_numbers)[term_index[known]])
+            found = rows >= 0
+            positions = numpy.flatnonzero(known)[found]
+            count[positions] = db.descendant_count[rows[found]]
+            depth[positions] = db.depth[rows[found]]
+            if variant in db.ic_variants:
+                ic[positions] = db.variant_column(variant)[rows[found]]
+        else:
+            for position in numpy.flatnonzero(known).tolist():
+                values = db.get(godag.go_id(term_index[position]))
+                if values is None:
+                    continue
+                count[position] = to_int_or_missing(values[0])
+                depth[position] = to_int_or_missing(values[1])
+                if variant == "annotation":
+                    ic[position] = to_float_or_missing(values[2])
+        return count, depth, ic
+
+    # Vectorized IC lookup for in-memory columns, no per row Python work and
+    # nothing written to disk. GO strings are parsed once into integers and
+    # alt_ids resolved to their term (unless resolve_alt_ids is False).
+    # Returns masked arrays (masked = unknown term or missing value):
+    #   aspect: index into NAMESPACES, term: compiled DAG index,
+    #   descendant_count, depth and ic
+    def batch_IC(self, accessions, goterms, resolve_alt_ids=True):
+        godag = self.godag
+        term_index = godag.indices(go_numbers_array(goterms), resolve_alt_ids)
+        unknown = term_index < 0
+        count, depth, ic = self.precomputed_columns(term_index)
+        aspect = numpy.where(unknown, -1, numpy.asarray(godag.namespace)[numpy.maximum(term_index, 0)])
+        return {
+            "accession": numpy.asarray(accessions),
+            "go_id": numpy.asarray(goterms),
+            "term": numpy.ma.masked_array(term_index, mask=unknown),
+            "aspect": numpy.ma.masked_array(aspect.astype(numpy.int8), mask=unknown | (aspect < 0)),
+            "descendant_count": numpy.ma.masked_array(count, mask=count < 0),
+            "depth": numpy.ma.masked_array(depth, mask=depth < 0),
+            "ic": numpy.ma.masked_invalid(ic),
+        }
+
+    ###########################################################################
+    # SEMANTIC SIMILARITY
+    ###########################################################################
+    # IC (of an IC_VARIANTS variant) of every DAG term from the precomputed
+    # DB ("precomputed") or from the universe ("universe"), NaN where there
+    # is none
+    def term_ics(self, ic_source="precomputed", variant="annotation"):
+        check_ic_variants([variant])
+        if ic_source == "precomputed":
+            return self.precomputed_columns(numpy.arange(len(self.godag)), variant)[2]
+        if ic_source == "universe":
+            variants = [] if variant == "annotation" else [variant]
+            ic = compute_ontology_ics(self.godag, self.annotations, variants)[variant if variants else "ic"]
+            ic[~numpy.isfinite(ic)] = numpy.nan
+            return ic
+        raise ValueError("Unknown IC source " + str(ic_source))
+
+    # len(goterms_a) x len(goterms_b) similarity matrix, NaN for terms of
+    # different aspects, unknown or without IC
+    def term_similarity(self, goterms_a, goterms_b, method="resnik", ic_source="precomputed"):
+        godag = self.godag
+        ic = self.term_ics(ic_source)
+        namespace = numpy.asarray(godag.namespace)
+        a = godag.indices(go_numbers_array(goterms_a), True)
+        b = godag.indices(go_numbers_array(goterms_b), True)
+        result = numpy.full((len(a), len(b)), numpy.nan, dtype=numpy.float32)
+        usable_a = (a >= 0) & numpy.isfinite(ic[numpy.maximum(a, 0)])
+        usable_b = (b >= 0) & numpy.isfinite(ic[numpy.maximum(b, 0)])
+        for code in range(len(NAMESPACES)):
+            rows = numpy.flatnonzero(usable_a & (namespace[numpy.maximum(a, 0)] == code))
+            columns = numpy.flatnonzero(usable_b & (namespace[numpy.maximum(b, 0)] == code))
+            if len(rows) and len(columns):
+                similarity = SemanticSimilarity(godag, ic, numpy.concatenate([a[rows], b[columns]]))
+                result[rows[:, None], columns] = similarity.term_block(
+                    similarity.local[a[rows]], similarity.local[b[columns]], method)
+        return result
+
+    # GO sets per aspect of [accession, GO id] rows (or an input file) and
+    # the SemanticSimilarity of their terms, see protein_term_sets
+    def similarity_sets(self, input_rows, ic_source="precomputed"):
+        if isinstance(input_rows, str):
+            input_rows = iter_input_rows(input_rows)
+        accessions, goterms = [], []
+        for prot_id, goterm in input_rows:
+            accessions.append(prot_id)
+            goterms.append(goterm)
+        ic = self.term_ics(ic_source)
+        sets = protein_term_sets(self.godag, ic, accessions, goterms)
+        similarities = {}
+        for aspect, protein_set in sets.items():
+            similarities[aspect] = SemanticSimilarity(self.godag, ic, protein_set["terms"])
+            protein_set["local"] = similarities[aspect].local[protein_set["terms"]]
+        return sets, similarities
+
+    # Dense protein x protein similarity per aspect, for small inputs:
+    # {aspect: {"accessions": array, "similarity": matrix}}
+    def protein_similarity(self, input_rows, method="resnik", aggregate="bma", ic_source="precomputed"):
+        sets, similarities = self.similarity_sets(input_rows, ic_source)
+        result = {}
+        for aspect, protein_set in sets.items():
+            indptr, local = protein_set["indptr"], protein_set["local"]
+            result[aspect] = {
+                "accessions": protein_set["accessions"],
+                "similarity": similarities[aspect].protein_block(indptr, local, indptr, local, method, aggregate),
+            }
+        return result
+
+    # All vs all protein similarity of an input file, per aspect, in blocks
+    # of block_size proteins spread over `workers` forked processes, so the
+    # memory depends on the block size and the number of distinct terms, not
+    # on the number of pairs. Rows "accession\taccession\taspect\tscore" are
+    # streamed to outputpath: the top_k best partners of every protein
+    # and/or the pairs scoring at least min_score, every pair once if none.
+    def similarity_all_vs_all(self, filepath, outputpath, method="resnik", aggregate="bma", ic_source="precomputed", aspects=None, block_size=SIMILARITY_BLOCK, workers=CPU_COUNT, top_k=None, min_score=None):
+        if method not in SIMILARITY_METHODS or aggregate not in SIMILARITY_AGGREGATES:
+            raise ValueError("Unknown similarity method or aggregate")
+        print("Reading GO sets and computing MICA tables")
+        sets, similarities = self.similarity_sets(filepath, ic_source)
+
+        def lines():
+            global _worker_similarity
+            for aspect in NAMESPACES:
+                if aspect not in sets or (aspects and aspect not in aspects):
+                    continue
+                protein_set = sets[aspect]
+                names = protein_set["accessions"]
+                _worker_similarity = (protein_set, similarities[aspect], method, aggregate, block_size, top_k, min_score)
+                starts = list(range(0, len(names), block_size))
+                print(aspect, len(names), "proteins,", len(similarities[aspect].terms), "terms")
+                pool = None
+                if workers > 1 and len(starts) > 1:
+                    import multiprocessing
+                    pool = multiprocessing.get_context("fork").Pool(min(workers, len(starts)))
+                try:
+                    results = pool.imap(_similarity_rows, starts) if pool else map(_similarity_rows, starts)
+                    for rows, columns, scores in tqdm.tqdm(results, total=len(starts)):
+                        for row, column, score in zip(names[rows].tolist(), names[columns].tolist(), scores.tolist()):
+                            yield row + "\t" + column + "\t" + aspect + "\t" + repr(score)
+                finally:
+                    if pool:
+                        pool.close()
+                        pool.join()
+
+        return write_tsv_lines(lines(), outputpath)
+
+    def dump_ic_data(self, ic_data, outputfile="ic_data.tsv"):
+        outputpath = new_folder(self.outputs_folder)+outputfile
+        if outputfile.endswith(ICRESULTS_EXTENSION):
+            with ICResultsWriter(outputpath) as results:
+                for x in ic_data:
+                    if x:
+                        results.add(x)
+            return outputpath
+        # Same format as GOATOOLS
+        return write_tsv_rows(ic_data, outputpath)
+
+    # Density of the ICs per aspect: "kde" (binned gaussian KDE) or "hist".
+    # Writes plots/InformationContent_<filename>.density.tsv and, unless
+    # plot is False, the .jpeg plot
+    def plot_density(self, ic_data, filename, mode="kde", plot=True):
+        if not isinstance(ic_data, ICDensity):
+            ic_data = ICDensity().update(ic_data)
+        centers = ic_data.centers
+        densities = ic_data.densities(mode)
+        basepath = new_folder(self.plots_folder) + "InformationContent_" + filename
+        write_density_tsv(centers, densities, basepath + ".density.tsv")
+        if not plot:
+            return
+        # Not requiring gui so we select agg backend
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+
+        aspect_color = {
+            "biological_process": "red",
+            "cellular_component": "blue",
+            "molecular_function": "green"
+        }
+        shown = centers <= DENSITY_PLOT_MAX
+        # pyplot keeps global state, plots from several threads take turns
+        with PLOT_LOCK:
+            fig, ax = plt.subplots()
+            plt.title("Information Content " + filename)
+            for aspect in densities:
+                if mode == "hist":
+                    plt.step(centers[shown], densities[aspect][shown], where="mid", color=aspect_color[aspect], label=aspect)
+                else:
+                    plt.plot(centers[shown], densities[aspect][shown], color=aspect_color[aspect], label=aspect)
+            fig.legend()
+            plt.xlabel("IC ( $-log_{2}(p(t))$ )")
+            plt.savefig(basepath + ".jpeg")
+            plt.close(fig)
+
+    # Output name of an input file: outputs/<name>.tsv, plots/..._<name>.jpeg
+    @staticmethod
+    def output_name(filepath):
+        return filepath.split("/")[-1].split(".")[0]
+
+    # Input file -> outputs/<name>.tsv (.tsv.gz with gzip_output) and its
+    # density plot, streamed so memory stays flat whatever the input size.
+    # profile=True also writes outputs/<name>.profile.json and proteins=True
+    # outputs/<name>.proteins.tsv (ProteinSummary). ic_variants (IC_VARIANTS)
+    # selects the IC columns written, the first one is plotted and used for
+    # the protein summaries. output_format="binary" writes outputs/<name>.icres
+    # (ICResultsWriter) instead of the TSV.
+    # Returns the summary of the file (rows, dropped rows, ICs per aspect)
+    def precalc_IC(self, filepath, precomputed_user_path=None, gzip_output=False, plot=True, plot_mode="kde", profile=False, progress=True, proteins=False, ic_variants=None, output_format="tsv"):
+        print("Using Precalculated IC values")
+        if ic_variants is not None:
+            ic_variants = check_ic_variants(ic_variants) or None
+        if profile and self.profiler is None:
+            self.profiler = Profiler()
+        if precomputed_user_path is not None:
+            self.set_precomputed_path(precomputed_user_path)
+        name = self.output_name(filepath)
+        outputpath = self.result_output_path(name, gzip_output, output_format)
+        density = ICDensity()
+        stats = Counter()
+        with self._phase("load_godag"):
+            self.obo
+        with self._phase("load_precomputed"):
+            self.precomputed_ics
+        protein_summary = ProteinSummary(self.godag, self.term_ics(variant=ic_variants[0] if ic_variants else "annotation")) if proteins else None
+        print("Computing ICs and writing data file")
+        with self._phase("precalc") as record:
+            input_rows = iter_input_rows(filepath)
+            if progress:
+                input_rows = tqdm.tqdm(input_rows)
+            if output_format == "binary":
+                with ICResultsWriter(outputpath, ic_variants) as results:
+                    self.write_precalc_results(input_rows, results, density, stats, protein_summary, ic_variants)
+            else:
+                write_tsv_lines(
+                    self.iter_precalc_lines(input_rows, density, stats, protein_summary, ic_variants),
+                    outputpath,
+                )
+            record["rows"] = stats["input_rows"]
+        if proteins:
+            print("Writing protein summaries")
+            with self._phase("protein_summary") as record:
+                proteinpath = write_tsv_lines(protein_summary.lines(), self.protein_output_path(name, gzip_output))
+                record["rows"] = len(protein_summary.accessions)
+            self._count("proteins", len(protein_summary.accessions))
+        print("Plotting results" if plot else "Writing density data")
+        with self._phase("plot_density"):
+            self.plot_density(density, name, plot_mode, plot)
+        if self.profiler is not None:
+            self.profiler.counters.update(stats)
+            if profile:
+                self.write_profile(new_folder(self.outputs_folder) + name + ".profile.json")
+        summary = file_summary(filepath, outputpath, stats, density)
+        if proteins:
+            summary["proteins"] = proteinpath
+        return summary
+
+    def result_output_path(self, name, gzip_output=False, output_format="tsv"):
+        if output_format == "binary":
+            return new_folder(self.outputs_folder) + name + ICRESULTS_EXTENSION
+        if output_format != "tsv":
+            raise ValueError("Unknown output format " + str(output_format))
+        return new_folder(self.outputs_folder) + name + (".tsv.gz" if gzip_output else ".tsv")
+
+    def protein_output_path(self, name, gzip_output=False):
+        return new_folder(self.outputs_folder) + name + (".proteins.tsv.gz" if gzip_output else ".proteins.tsv")
+
+    # Many input files in one go. The ontology and the precomputed DB are
+    # loaded once here and shared with `workers` forked processes (copy on
+    # write, the compiled arrays are memory mapped), every file gets its TSV
+    # and plot as with precalc_IC, and outputs/summary.tsv (or summary_path)
+    # gets one row per file. With skip_up_to_date, files whose output is newer
+    # than the input and the precomputed DB and was written with the same
+    # options (kept in outputs/<name>.summary.json) are not processed again.
+    def precalc_files(self, filepaths, precomputed_user_path=None, gzip_output=False, plot=True, plot_mode="kde", workers=CPU_COUNT, skip_up_to_date=False, summary_path=None, profile=False, proteins=False, ic_variants=None, output_format="tsv"):
+        if profile and self.profiler is None:
+            self.profiler = Profiler()
+        if precomputed_user_path is not None:
+            self.set_precomputed_path(precomputed_user_path)
+        names = Counter(self.output_name(x) for x in filepaths)
+        if any(n > 1 for n in names.values()):
+            raise ValueError("Input files with the same output name: " + ", ".join(sorted(x for x in names if names[x] > 1)))
+        with self._phase("load_godag"):
+            self.obo
+        with self._phase("load_precomputed"):
+            self.precomputed_ics
+        outputs_folder = new_folder(self.outputs_folder)
+        options = {
+            "precomputed_db": os.path.abspath(self.precomputed_path),
+            "gzip": gzip_output,
+            "plot": plot,
+            "plot_mode": plot_mode,
+            "proteins": proteins,
+            "ic_variants": list(ic_variants or []) or None,
+            "output_format": output_format,
+        }
+        summaries = {}
+        jobs = []
+        for filepath in filepaths:
+            name = self.output_name(filepath)
+            outputpath = self.result_output_path(name, gzip_output, output_format)
+            summarypath = outputs_folder + name + ".summary.json"
+            outputs = [outputpath, summarypath]
+            if proteins:
+                outputs.append(self.protein_output_path(name, gzip_output))
+            previous = None
+            if skip_up_to_date and is_up_to_date(outputs, [filepath, self.precomputed_path]):
+                with open(summarypath) as fread:
+                    previous = json.load(fread)
+            if previous is not None and previous.pop("options", None) == options:
+                summaries[filepath] = dict(previous, status="skipped")
+            else:
+                jobs.append(filepath)
+        print("Processing", len(jobs), "files,", len(summaries), "up to date")
+
+        global _worker_engine
+        _worker_engine = self
+        job_args = [(x, gzip_output, plot, plot_mode, proteins, ic_variants, output_format) for x in jobs]
+        workers = max(1, min(workers, len(jobs)))
+        with self._phase("precalc_files") as record:
+            if workers == 1:
+                results = map(_precalc_file, job_args)
+            else:
+                import multiprocessing
+                pool = multiprocessing.get_context("fork").Pool(workers)
+                results = pool.imap_unordered(_precalc_file, job_args)
+            job_stats = []
+            try:
+                for summary, stats in tqdm.tqdm(results, total=len(jobs)):
+                    summaries[summary["inputfile"]] = summary
+                    job_stats.append(stats)
+                    if summary["status"] == "done":
+                        with open(outputs_folder + self.output_name(summary["inputfile"]) + ".summary.json", "w") as fwrite:
+                            json.dump(dict(summary, options=options), fwrite)
+                        for x in ("input_rows", "rows_dropped_unknown_go", "rows_dropped_alt_id", "distinct_go"):
+                            self._count(x, summary[x])
+                    else:
+                        print("Error processing", summary["inputfile"], summary["error"])
+            finally:
+                if workers > 1:
+                    pool.close()
+                    pool.join()
+            record["rows"] = sum(summaries[x].get("input_rows", 0) for x in jobs if x in summaries)
+        if self.profiler is not None:
+            self.profiler.sections["precalc_files"] = worker_summary(job_stats, record["wall_s"], workers)
+        summaries = [summaries[x] for x in filepaths]
+        summary_path = summary_path or outputs_folder + "summary.tsv"
+        write_summary_table(summaries, summary_path)
+        print("Summary written to", summary_path)
+        if profile:
+            self.write_profile(os.path.splitext(summary_path)[0] + ".profile.json")
+        return summaries
+
+    # profile=True also writes <outputpath>.profile.json.
+    # <outputpath>.manifest is written too; with incremental=True the terms
+    # not affected by the go.obo/universe changes since that manifest are
+    # taken from it instead of being computed again, and the universe counts
+    # are cached (data/counts/) for the next release.
+    # ic_variants (IC_VARIANTS, all by default) are stored as extra .icdb
+    # columns next to the annotation IC, computed in the same pass.
+    def precompute_data(self, annotpath, outputpath, exclude_evidence=None, skip_not=False, profile=False, incremental=False, ic_variants=None):
+        if profile and self.profiler is None:
+            self.profiler = Profiler()
+        variants=[x for x in check_ic_variants(INTRINSIC_IC_VARIANTS if ic_variants is None else ic_variants) if x!="annotation"]
+        file_format=annotation_format(annotpath)
+        if file_format=="list":
+            print("Reading '\n' separated GO list")
+        else:
+            print("Parsing",file_format,"file")
+        with self._phase("count_annotations") as record:
+            if incremental:
+                # An unchanged universe file is not counted again
+                annot_counts=count_annotation_file_cached(annotpath,file_format,exclude_evidence,skip_not,self.data_folder+"counts/")
+            else:
+                annot_counts=count_annotation_file(annotpath,file_format,exclude_evidence,skip_not)
+            record["rows"]=sum(annot_counts.values())
+
+        with self._phase("load_godag"):
+            input_data=self.process_file([[x,x] for x in annot_counts])
+        self._count("universe_terms", len(annot_counts))
+        self._count("universe_terms_unknown_go", len(annot_counts) - len(input_data))
+
+        with self._phase("compile_universe"):
+            self.annotations=self.compile_universe_counts(annot_counts)
+
+        manifest_path=outputpath+PRECOMPUTE_MANIFEST_EXTENSION
+        previous=read_precompute_manifest(manifest_path) if incremental else None
+        print("Computing ICs")
+        with self._phase("compute_ontology") as record:
+            if previous is None:
+                if incremental:
+                    print("No manifest in",manifest_path,"computing every term")
+                ics=compute_ontology_ics(self.godag,self.annotations,variants)
+            else:
+                ics,changed,recomputed=update_ontology_ics(self.godag,self.annotations,previous,variants)
+                print("Changed terms:",changed,"recomputed:",recomputed,"of",len(self.godag))
+                self._count("terms_changed",changed)
+                self._count("terms_recomputed",recomputed)
+            ic_data=compute_ontology(input_data,self.annotations,self.godag,ics)
+            record["rows"]=len(ic_data)
+        if self.profiler is not None:
+            # Size of the whole ontology pass (compute_ontology_ics)
+            self.profiler.sections["compute_ontology"]={
+                "terms":len(self.godag),
+                "closure_pairs":int(self.godag.ancestors_indptr[-1]),
+                "generations":len(self.godag.generation_indptr)-1,
+                "terms_computed":len(self.godag) if previous is None else recomputed,
+                "ic_variants":variants,
+            }
+        ic_dict={x[2]:[x[3],x[4],float(x[5]) if x[5] is not None else "None"] for x in ic_data}
+        print("Writing",outputpath)
+        with self._phase("write_precomputed"):
+            if outputpath.endswith(".pickle"):
+                # Pickled DBs keep the [descendant count, depth, IC] rows
+                pickle_object(ic_dict,outputpath)
+            else:
+                for goterm in ic_dict:
+                    index=self.godag.get(goterm)
+                    ic_dict[goterm]+=[float(ics[x][index]) for x in variants]
+                write_precomputed_db(outputpath, ic_dict, {
+                    "data_version": self.godag.meta.get("data_version"),
+                    "universe_sha256": universe_sha256(self.annotations),
+                    "annotations": os.path.basename(annotpath),
+                }, variants)
+            write_precompute_manifest(manifest_path, self.godag, self.annotations, ics, {
+                "data_version": self.godag.meta.get("data_version"),
+            })
+        if profile:
+            self.write_profile(outputpath + ".profile.json")
+
+
+# p_umap workers reach the engine through this global, inherited on fork
+_worker_engine = None
+
+
+COMPUTE_CHUNK_ROWS = 256
+
+
+# precalc_IC of one file in a precalc_files worker, errors are reported in
+# the summary so one bad file does not stop the others. The job is not
+# profiled; with one worker it runs in the parent, whose profiler is put
+# back afterwards. Returns the summary and the worker stats of the job
+# (worker_summary).
+def _precalc_file(job):
+    filepath, gzip_output, plot, plot_mode, proteins, ic_variants, output_format = job
+    engine = _worker_engine
+    profiler = engine.profiler
+    engine.profiler = None
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            summary = engine.precalc_IC(filepath, gzip_output=gzip_output, plot=plot, plot_mode=plot_mode, progress=False, proteins=proteins, ic_variants=ic_variants, output_format=output_format)
+        summary["status"] = "done"
+    except Exception as error:
+        summary = {"inputfile": filepath, "status": "error", "error": repr(error)}
+    finally:
+        engine.profiler = profiler
+    return summary, {
+        "pid": os.getpid(),
+        "rows": summary.get("input_rows", 0),
+        "busy_s": time.perf_counter() - wall_start,
+        "cpu_s": time.process_time() - cpu_start,
+    }
+
+
+# similarity_all_vs_all workers reach the GO sets through this global
+_worker_similarity = None
+
+
+# (rows, columns, scores) of the proteins [start, start + block_size) against
+# all the others (pairs after the row only, unless top_k is used)
+def _similarity_rows(start):
+    protein_set, similarity, method, aggregate, block_size, top_k, min_score = _worker_similarity
+    indptr, local = protein_set["indptr"], protein_set["local"]
+    size = len(indptr) - 1
+    end = min(start + block_size, size)
+    a_indptr, a_terms = csr_slice(indptr, local, start, end)
+    rows = numpy.arange(start, end)[:, None]
+    found_rows, found_columns, found_scores = [], [], []
+    best_scores = numpy.empty((end - start, 0), dtype=numpy.float32)
+    best_columns = numpy.empty((end - start, 0), dtype=numpy.int64)
+    for column in range(0 if top_k else start, size, block_size):
+        column_end = min(column + block_size, size)
+        b_indptr, b_terms = csr_slice(indptr, local, column, column_end)
+        block = similarity.protein_block(a_indptr, a_terms, b_indptr, b_terms, method, aggregate)
+        columns = numpy.arange(column, column_end)[None, :]
+        if top_k:
+            block[rows == columns] = -numpy.inf
+            if min_score is not None:
+                block[block < min_score] = -numpy.inf
+            best_scores = numpy.concatenate([best_scores, block], axis=1)
+            best_columns = numpy.concatenate([best_columns, numpy.broadcast_to(columns, block.shape)], axis=1)
+            if best_scores.shape[1] > top_k:
+                keep = numpy.argpartition(-best_scores, top_k - 1, axis=1)[:, :top_k]
+                best_scores = numpy.take_along_axis(best_scores, keep, axis=1)
+                best_columns = numpy.take_along_axis(best_columns, keep, axis=1)
+        else:
+            mask = columns > rows
+            if min_score is not None:
+                mask &= block >= min_score
+            row, col = numpy.nonzero(mask)
+            found_rows.append(row + start)
+            found_columns.append(col + column)
+            found_scores.append(block[row, col])
+    if top_k:
+        row = numpy.repeat(numpy.arange(start, end), best_scores.shape[1])
+        col, score = best_columns.ravel(), best_scores.ravel()
+        order = numpy.lexsort((col, -score, row))
+        row, col, score = row[order], col[order], score[order]
+        valid = numpy.isfinite(score)
+        return row[valid], col[valid], score[valid]
+    if not found_rows:
+        return numpy.empty(0, dtype=numpy.int64), numpy.empty(0, dtype=numpy.int64), numpy.empty(0, dtype=numpy.float32)
+    return numpy.concatenate(found_rows), numpy.concatenate(found_columns), numpy.concatenate(found_scores)
+
+
+# Rows of a chunk plus what the worker spent on it and its cache hits/misses
+def _crow_compute_chunk(chunk):
+    engine = _worker_engine
+    ic_before = engine.calculate_IC.cache_info()
+    depth_before = engine.get_depth.cache_info()
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    rows = [engine.crow_compute(x) for x in chunk]
+    ic_after = engine.calculate_IC.cache_info()
+    depth_after = engine.get_depth.cache_info()
+    return rows, {
+        "pid": os.getpid(),
+        "rows": len(chunk),
+        "busy_s": time.perf_counter() - wall_start,
+        "cpu_s": time.process_time() - cpu_start,
+        "caches": {
+            "calculate_IC": (ic_after.hits - ic_before.hits, ic_after.misses - ic_before.misses),
+            "get_depth": (depth_after.hits - depth_before.hits, depth_after.misses - depth_before.misses),
+        },
+    }
 
-    input_data=process_file([[x,x] for x in set(annot_data)])
-    
-    annotations=compile_universe([x for x in annot_data if x])
-    
-    ic_data=compute_compute(input_data,annotations,godag)
-    ic_dict={x[2]:[x[3],x[4],float(x[5])] for x in ic_data}
-    print("Writing",outputpath)
-    pickle_object(ic_dict,outputpath)
 
 ###############################################################################
-# URLs
+# DEFAULT ENGINE
 ###############################################################################
+# The module level API works on a default engine with the default paths,
+# created on first use. IC_lib.godag, IC_lib.obo, IC_lib.annotations and
+# IC_lib.precomputed_ics are still available and are loaded when accessed.
+_default_engine = None
 
-# This may be deprecated some day
-OBO_URL = "http://purl.obolibrary.org/obo/go.obo"
-OBO_BASIC_URL = (
-    "http://purl.obolibrary.org/obo/go-basic.obo"  # This may be deprecated some day
-)
 
-# Folder structure
-DATA_FOLDER = new_folder("data/")
-ANNOTATIONS_FOLDER = new_folder("annotations/")
-PLOTS_FOLDER = new_folder("plots/")
-TSVOUTPUTS_FOLDER = new_folder("outputs/")
+def default_engine():
+    global _default_engine
+    if _default_engine is None:
+        _default_engine = ICEngine()
+    return _default_engine
 
-# Data files
-# We can use go-basic.obo or go.obo (go-basic is a simplified version)
-if BASIC_OBO:
-    OBO_PATH = get_remote_file(OBO_BASIC_URL, DATA_FOLDER + "go-basic.obo")
-else:
-    OBO_PATH = get_remote_file(OBO_URL, DATA_FOLDER + "go.obo")
 
+def __getattr__(name):
+    if name in ("godag", "obo", "annotations", "precomputed_ics"):
+        return getattr(default_engine(), name)
+    raise AttributeError("module {} has no attribute {}".format(__name__, name))
 
-DAG_PATH = DATA_FOLDER + "godag.pronto"
-GOA_UNIVERSE=ANNOTATIONS_FOLDER+"goa_uniprot_all.universe"
 
-# PICKLE
-UNIVERSE_COUNT_PICKLE = DATA_FOLDER + "universe.pickle"
-PRECOMPUTED_PICKLE = DATA_FOLDER+"goa_uniprot_all.pickle"
+def compile_universe_counts(annot_counts):
+    return default_engine().compile_universe_counts(annot_counts)
 
-precomputed_ics = unpickle_object(PRECOMPUTED_PICKLE)
 
-###############################################################################
-# Parse OBO
-###############################################################################
-obo = parse_obo(OBO_PATH)
+def compile_universe(all_annot):
+    return default_engine().compile_universe(all_annot)
 
-###############################################################################
-# GO DAG
-###############################################################################
-if os.path.exists(DAG_PATH):
-    godag = unpickle_object(DAG_PATH)
-else:
-    godag = Ontology(OBO_PATH)
-    pickle_object(godag, DAG_PATH)
+
+def get_universe(progress=False, refresh=False, exclude_evidence=None, skip_not=False):
+    return default_engine().get_universe(progress, refresh, exclude_evidence, skip_not)
+
+
+def process_file(file_data):
+    return default_engine().process_file(file_data)
+
+
+def read_input(input_filepath):
+    return default_engine().read_input(input_filepath)
+
+
+def get_depth(term_index, aspect):
+    return default_engine().get_depth(term_index, aspect)
+
+
+def calculate_IC(x, aspect):
+    return default_engine().calculate_IC(x, aspect)
+
+
+def crow_compute(row_data):
+    return default_engine().crow_compute(row_data)
+
+
+def crow_precalc(row_data):
+    return default_engine().crow_precalc(row_data)
+
+
+def compute_compute(input_data, annotations=None, godag=None):
+    return default_engine().compute_compute(input_data)
+
+
+def compute_precalc(input_data, annotations=None, godag=None):
+    return default_engine().compute_precalc(input_data)
+
+
+def batch_IC(accessions, goterms, resolve_alt_ids=True):
+    return default_engine().batch_IC(accessions, goterms, resolve_alt_ids)
+
+
+def term_similarity(goterms_a, goterms_b, method="resnik", ic_source="precomputed"):
+    return default_engine().term_similarity(goterms_a, goterms_b, method, ic_source)
+
+
+def protein_similarity(input_rows, method="resnik", aggregate="bma", ic_source="precomputed"):
+    return default_engine().protein_similarity(input_rows, method, aggregate, ic_source)
+
+
+def similarity_all_vs_all(filepath, outputpath, method="resnik", aggregate="bma", ic_source="precomputed", aspects=None, block_size=SIMILARITY_BLOCK, workers=CPU_COUNT, top_k=None, min_score=None):
+    return default_engine().similarity_all_vs_all(filepath, outputpath, method, aggregate, ic_source, aspects, block_size, workers, top_k, min_score)
+
+
+def dump_ic_data(ic_data, outputfile="ic_data.tsv"):
+    return default_engine().dump_ic_data(ic_data, outputfile)
+
+
+def plot_density(ic_data, filename, mode="kde", plot=True):
+    return default_engine().plot_density(ic_data, filename, mode, plot)
+
+
+def precalc_IC(filepath, precomputed_user_path=None, gzip_output=False, plot=True, plot_mode="kde", profile=False, proteins=False, ic_variants=None, output_format="tsv"):
+    return default_engine().precalc_IC(filepath, precomputed_user_path, gzip_output, plot, plot_mode, profile, proteins=proteins, ic_variants=ic_variants, output_format=output_format)
+
+
+def precalc_files(filepaths, precomputed_user_path=None, gzip_output=False, plot=True, plot_mode="kde", workers=CPU_COUNT, skip_up_to_date=False, summary_path=None, profile=False, proteins=False, ic_variants=None, output_format="tsv"):
+    return default_engine().precalc_files(filepaths, precomputed_user_path, gzip_output, plot, plot_mode, workers, skip_up_to_date, summary_path, profile, proteins, ic_variants, output_format)
+
+
+def precompute_data(annotpath, outputpath, exclude_evidence=None, skip_not=False, profile=False, incremental=False, ic_variants=None):
+    return default_engine().precompute_data(annotpath, outputpath, exclude_evidence, skip_not, profile, incremental, ic_variants)
+
+
+def load_annotation_universe(annotpath, exclude_evidence=None, skip_not=False):
+    return default_engine().load_annotation_universe(annotpath, exclude_evidence, skip_not)
+
+
+def set_annotation_universe(annotpath, filepaths, exclude_evidence=None, skip_not=False):
+    return default_engine().set_annotation_universe(annotpath, filepaths, exclude_evidence, skip_not)
@@ -0,0 +1,358 @@
+# ----------------------------------------------------------------------------
+# Warm GO Information Content server
+# Loads the ontology and the precomputed IC DB once and answers precalc
+# requests over HTTP on localhost or on a local Unix socket. The precomputed
+# DB is reloaded when its file changes.
+# ---------------------------------------------------------------------------
+# python IC_server.py --port 8765
+# python IC_server.py --socket /tmp/goic.sock --precomputed_db my_db.icdb
+#
+# POST /precalc     JSON {"rows": [["ID", "GO:XXXXXXX"], ...]}
+#                   -> {"columns": [...], "rows": [[...crow_precalc columns], ...], "dropped": n}
+#                   or a "ID\tGO_ID" TSV body -> output TSV lines
+# POST /precalc_IC  JSON {"inputfile": PATH, "gzip": false, "plot": true, "plot_mode": "kde", "proteins": false,
+#                         "ic_variants": ["annotation", "seco"], "output_format": "tsv"}
+#                   -> runs precalc_IC on the server, {"output": PATH, ...}
+# POST /reload      reloads the precomputed DB
+# GET  /health      server and data status
+
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import argparse
+import threading
+import http.client
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import Counter
+
+import IC_lib as IC
+
+###############################################################################
+# CONFIG CONSTANTS
+###############################################################################
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+MAX_REQUEST_BYTES = 1024 * 1024 * 1024
+TSV_CONTENT_TYPES = ("text/tab-separated-values", "text/plain")
+
+
+###############################################################################
+# IC SERVICE
+###############################################################################
+# Holds the warm engine. Requests take the current engine once and use it to
+# the end, a reload builds a new engine (sharing the ontology) and swaps it.
+class ICService:
+    def __init__(self, engine):
+        self.engine = engine
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.stats = Counter()
+        self.signature = None
+        self.reload(force=True)
+
+    def precomputed_signature(self):
+        try:
+            stat = os.stat(self.engine.precomputed_path)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    # Reopens the precomputed DB if its file changed since it was loaded.
+    # A DB that cannot be opened (e.g. being written) keeps the old one.
+    def reload(self, force=False):
+        signature = self.precomputed_signature()
+        if not force and signature == self.signature:
+            return False
+        with self.lock:
+            if not force and signature == self.signature:
+                return False
+            engine = self.engine.with_precomputed(self.engine.precomputed_path)
+            try:
+                engine.obo
+                engine.precomputed_ics
+            except (OSError, ValueError, EOFError) as error:
+                if force and self.signature is None:
+                    raise
+                print("Keeping the loaded precomputed DB:", error)
+                return False
+            self.engine = engine
+            self.signature = signature
+            self.stats["reloads"] += 1
+            print("Loaded precomputed DB", engine.precomputed_path)
+            return True
+
+    def current_engine(self):
+        self.reload()
+        return self.engine
+
+    # crow_precalc rows for [accession, GO id] rows
+    def precalc_rows(self, rows):
+        engine = self.current_engine()
+        stats = Counter()
+        output = [
+            line.split("\t")
+            for line in engine.iter_precalc_lines(([str(x[0]), str(x[1])] for x in rows), stats=stats)
+        ]
+        for row in output:
+            row[3:6] = [to_number(x) for x in row[3:6]]
+        self.stats["requests"] += 1
+        self.stats["rows"] += stats["input_rows"]
+        return {
+            "columns": IC.OUTPUT_COLUMNS,
+            "rows": output,
+            "dropped": stats["rows_dropped_unknown_go"] + stats["rows_dropped_alt_id"],
+        }
+
+    # Output TSV lines for a "ID\tGO_ID" TSV text
+    def precalc_tsv(self, text):
+        engine = self.current_engine()
+        rows = (
+            line.split("\t")[0:2]
+            for line in text.splitlines()
+            if line and not line.startswith("#")
+        )
+        stats = Counter()
+        lines = list(engine.iter_precalc_lines((x for x in rows if len(x) == 2), stats=stats))
+        self.stats["requests"] += 1
+        self.stats["rows"] += stats["input_rows"]
+        return "\n".join(lines) + "\n"
+
+    def precalc_IC(self, inputfile, gzip_output=False, plot=True, plot_mode="kde", proteins=False, ic_variants=None, output_format="tsv"):
+        engine = self.current_engine()
+        name = engine.output_name(inputfile)
+        summary = engine.precalc_IC(inputfile, gzip_output=gzip_output, plot=plot, plot_mode=plot_mode, progress=False, proteins=proteins, ic_variants=ic_variants, output_format=output_format)
+        self.stats["files"] += 1
+        self.stats["rows"] += summary["input_rows"]
+        # The client runs somewhere else, paths are absolute
+        summary["output"] = os.path.abspath(summary["output"])
+        if summary.get("proteins"):
+            summary["proteins"] = os.path.abspath(summary["proteins"])
+        summary["density"] = os.path.abspath(engine.plots_folder + "InformationContent_" + name + ".density.tsv")
+        summary["plot"] = os.path.abspath(engine.plots_folder + "InformationContent_" + name + ".jpeg") if plot else None
+        return summary
+
+    def health(self):
+        engine = self.engine
+        return {
+            "status": "ok",
+            "pid": os.getpid(),
+            "uptime_s": round(time.time() - self.started, 3),
+            "data_version": engine.godag.meta.get("data_version"),
+            "precomputed_db": engine.precomputed_path,
+            "precomputed_terms": len(engine.precomputed_ics),
+            "stats": dict(self.stats),
+        }
+
+
+# "None" stays as is, like in the output files
+def to_number(value):
+    if value == "None":
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+###############################################################################
+# HTTP
+###############################################################################
+class ICRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def send(self, status, body, content_type="application/json"):
+        if content_type == "application/json":
+            body = json.dumps(body)
+        body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type + "; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_REQUEST_BYTES:
+            raise ValueError("request too large")
+        return self.rfile.read(length).decode("utf-8")
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send(200, self.server.service.health())
+        else:
+            self.send(404, {"error": "unknown path " + self.path})
+
+    def do_POST(self):
+        service = self.server.service
+        try:
+            body = self.read_body()
+            content_type = (self.headers.get("Content-Type") or "").split(";")[0].strip()
+            if self.path == "/precalc" and content_type in TSV_CONTENT_TYPES:
+                self.send(200, service.precalc_tsv(body), "text/tab-separated-values")
+            elif self.path == "/precalc":
+                self.send(200, service.precalc_rows(json.loads(body)["rows"]))
+            elif self.path == "/precalc_IC":
+                request = json.loads(body)
+                if not os.path.exists(request.get("inputfile", "")):
+                    self.send(400, {"error": "inputfile not found"})
+                    return
+                self.send(200, service.precalc_IC(
+                    request["inputfile"],
+                    request.get("gzip", False),
+                    request.get("plot", True),
+                    request.get("plot_mode", "kde"),
+                    request.get("proteins", False),
+                    request.get("ic_variants"),
+                    request.get("output_format", "tsv"),
+                ))
+            elif self.path == "/reload":
+                self.send(200, {"reloaded": service.reload(force=True)})
+            else:
+                self.send(404, {"error": "unknown path " + self.path})
+        except (ValueError, KeyError, TypeError) as error:
+            self.send(400, {"error": repr(error)})
+        except Exception as error:
+            # Anything else (I/O errors writing outputs, engine errors) still
+            # gets an answer instead of a dropped connection
+            self.send(500, {"error": repr(error)})
+
+
+class ICHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service, verbose=False):
+        self.service = service
+        self.verbose = verbose
+        ThreadingHTTPServer.__init__(self, address, ICRequestHandler)
+
+
+class ICUnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, service, verbose=False):
+        self.service = service
+        self.verbose = verbose
+        if os.path.exists(path):
+            os.remove(path)
+        socketserver.ThreadingUnixStreamServer.__init__(self, path, ICRequestHandler)
+
+
+def serve(engine, host=SERVER_HOST, port=SERVER_PORT, socket_path=None, verbose=False):
+    print("Loading GO DAG and precomputed DB")
+    service = ICService(engine)
+    if socket_path:
+        server = ICUnixServer(socket_path, service, verbose)
+        print("Serving on", socket_path)
+    else:
+        server = ICHTTPServer((host, port), service, verbose)
+        print("Serving on http://{}:{}".format(host, port))
+    # Stopped with SIGTERM too, so the Unix socket is removed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+###############################################################################
+# CLIENT
+###############################################################################
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=None):
+        http.client.HTTPConnection.__init__(self, "localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+
+# address: "http://host:port", "host:port" or the path of a Unix socket
+class ICClient:
+    def __init__(self, address, timeout=None):
+        self.address = address
+        self.timeout = timeout
+
+    def connection(self):
+        address = self.address
+        if address.startswith("unix:"):
+            return UnixHTTPConnection(address[len("unix:"):], self.timeout)
+        if "://" not in address and os.path.sep in address:
+            return UnixHTTPConnection(address, self.timeout)
+        address = address.split("://")[-1].rstrip("/")
+        host, _, port = address.partition(":")
+        return http.client.HTTPConnection(host, int(port or SERVER_PORT), timeout=self.timeout)
+
+    def request(self, method, path, body=None, content_type="application/json"):
+        connection = self.connection()
+        try:
+            if content_type == "application/json" and body is not None:
+                body = json.dumps(body)
+            headers = {"Content-Type": content_type} if body is not None else {}
+            connection.request(method, path, body=body.encode("utf-8") if body is not None else None, headers=headers)
+            response = connection.getresponse()
+            data = response.read().decode("utf-8")
+        finally:
+            connection.close()
+        if response.getheader("Content-Type", "").startswith("application/json"):
+            data = json.loads(data)
+        if response.status != 200:
+            raise RuntimeError("IC server error {}: {}".format(response.status, data))
+        return data
+
+    def health(self):
+        return self.request("GET", "/health")
+
+    def precalc(self, rows):
+        return self.request("POST", "/precalc", {"rows": [list(x[0:2]) for x in rows]})
+
+    def precalc_tsv(self, text):
+        return self.request("POST", "/precalc", text, "text/tab-separated-values")
+
+    def precalc_IC(self, inputfile, gzip_output=False, plot=True, plot_mode="kde", proteins=False, ic_variants=None, output_format="tsv"):
+        return self.request("POST", "/precalc_IC", {
+            "inputfile": os.path.abspath(inputfile),
+            "gzip": gzip_output,
+            "plot": plot,
+            "plot_mode": plot_mode,
+            "proteins": proteins,
+            "ic_variants": ic_variants,
+            "output_format": output_format,
+        })
+
+    def reload(self):
+        return self.request("POST", "/reload", {})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="GOIC-server", description="Warm GO Information Content server"
+    )
+    parser.add_argument("--host",help="Address to listen on (localhost by default)",default=SERVER_HOST)
+    parser.add_argument("--port",type=int,default=SERVER_PORT)
+    parser.add_argument("--socket",help="Listen on this Unix socket instead of HTTP",default=None)
+    parser.add_argument("--precomputed_db",help="Path to precomputed IC values (.icdb or pickled dict), reloaded when it changes",default=None)
+    parser.add_argument("--verbose",help="Log every request",action="store_true")
+    args = parser.parse_args()
+
+    if args.precomputed_db is not None and not os.path.exists(args.precomputed_db):
+        print("Wrong precomputed DB")
+        sys.exit(1)
+    engine = IC.ICEngine(precomputed_path=args.precomputed_db)
+    serve(engine, args.host, args.port, args.socket, args.verbose)
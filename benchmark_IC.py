@@ -0,0 +1,475 @@
+# ----------------------------------------------------------------------------
+# Benchmarks for the GO Information Content pipeline
+# Synthetic ontologies, annotation universes and inputs, so it runs offline.
+# Every phase runs in its own forked process, which gives clean per phase
+# peak RSS numbers and no warm caches between phases.
+# ---------------------------------------------------------------------------
+# python benchmark_IC.py --rows 10000 100000 1000000 -o results.json
+# python benchmark_IC.py --compare old.json new.json
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import contextlib
+
+import numpy
+
+import IC_lib as IC
+
+###############################################################################
+# CONFIG CONSTANTS
+###############################################################################
+BENCHMARK_FOLDER = "benchmarks/"
+BENCHMARK_FORMAT_VERSION = 1
+NAMESPACES = IC.NAMESPACES
+WRITE_CHUNK_ROWS = 1000000
+# Share of the input rows pointing to alt_ids or to unknown GO ids
+ALT_ID_FRACTION = 0.005
+UNKNOWN_FRACTION = 0.01
+GO_PER_PROTEIN = 8
+
+GLOBAL_PHASES = [
+    "parse_obo",
+    "dag_compile",
+    "dag_load",
+    "count_annotations",
+    "compile_universe",
+    "precompute_data",
+]
+INPUT_PHASES = [
+    "precalc_lookup",
+    "dump_ic_data",
+    "plot_density",
+    "precalc_IC",
+]
+
+###############################################################################
+# SYNTHETIC DATA
+###############################################################################
+# Random GO DAG: terms are split per namespace into `depth` levels growing
+# towards the leaves, every term has an is_a parent in the level above plus
+# up to max_parents-1 extra is_a parents (and sometimes a part_of) anywhere
+# above it, so the graph is always acyclic. Some terms get alt_ids and a few
+# obsolete terms are added with replaced_by.
+def synthetic_ontology(n_terms, depth, max_parents, seed):
+    rng = numpy.random.default_rng(seed)
+    terms = []
+    for ns_index, namespace in enumerate(NAMESPACES):
+        size = n_terms // len(NAMESPACES) + (ns_index < n_terms % len(NAMESPACES))
+        weights = 1.6 ** numpy.arange(depth)
+        level_sizes = numpy.maximum(1, numpy.floor(weights / weights.sum() * (size - 1)).astype(int))
+        level_sizes = numpy.concatenate([[1], level_sizes])
+        level_sizes[-1] += max(size - level_sizes.sum(), 0)
+        starts = len(terms) + numpy.concatenate([[0], numpy.cumsum(level_sizes)[:-1]])
+        for level, level_size in enumerate(level_sizes):
+            for position in range(level_size):
+                term = {"index": starts[level] + position, "namespace": namespace, "is_a": [], "part_of": []}
+                if level:
+                    first = starts[0]
+                    parents = {int(rng.integers(starts[level - 1], starts[level]))}
+                    for _ in range(int(rng.integers(0, max_parents))):
+                        parents.add(int(rng.integers(first, starts[level])))
+                    term["is_a"] = sorted(parents)
+                    if rng.random() < 0.1:
+                        term["part_of"] = [int(rng.integers(first, starts[level]))]
+                terms.append(term)
+    go_numbers = 1 + rng.permutation(len(terms) * 2)[:len(terms)]
+    alt_numbers = iter(len(terms) * 2 + 1 + numpy.arange(len(terms)))
+    for term in terms:
+        term["id"] = IC.go_string(int(go_numbers[term["index"]]))
+        term["alt_id"] = [IC.go_string(int(next(alt_numbers)))] if rng.random() < 0.02 else []
+    obsolete = []
+    for i in range(max(1, len(terms) // 200)):
+        replaced_by = terms[int(rng.integers(0, len(terms)))]
+        obsolete.append({
+            "id": IC.go_string(int(next(alt_numbers))),
+            "namespace": replaced_by["namespace"],
+            "replaced_by": replaced_by["id"],
+        })
+    return terms, obsolete
+
+
+def write_obo(FILEPATH, terms, obsolete):
+    with open(FILEPATH, "w") as fwrite:
+        fwrite.write("format-version: 1.2\ndata-version: releases/synthetic\nontology: go\n")
+        for term in terms:
+            lines = ["", "[Term]", "id: " + term["id"], "name: synthetic term " + str(term["index"]), "namespace: " + term["namespace"]]
+            lines += ["alt_id: " + x for x in term["alt_id"]]
+            lines += ["is_a: " + terms[x]["id"] + " ! parent" for x in term["is_a"]]
+            lines += ["relationship: part_of " + terms[x]["id"] + " ! part" for x in term["part_of"]]
+            fwrite.write("\n".join(lines) + "\n")
+        for term in obsolete:
+            fwrite.write("\n[Term]\nid: {id}\nname: obsolete synthetic term\nnamespace: {namespace}\nis_obsolete: true\nreplaced_by: {replaced_by}\n".format(**term))
+    return FILEPATH
+
+
+# Zipf like popularity of the terms, a few terms get most annotations
+def term_weights(n_terms, seed):
+    rng = numpy.random.default_rng(seed + 1)
+    weights = 1.0 / (1 + rng.permutation(n_terms)) ** 0.9
+    return weights / weights.sum()
+
+
+# GPAD 1.1 file with n_annotations lines, about half of them IEA and 2% NOT
+def write_gpad(FILEPATH, terms, n_annotations, seed):
+    rng = numpy.random.default_rng(seed + 2)
+    go_ids = numpy.array([x["id"] for x in terms])
+    weights = term_weights(len(terms), seed)
+    with open(FILEPATH, "w") as fwrite:
+        fwrite.write("!gpad-version: 1.1\n")
+        for start in range(0, n_annotations, WRITE_CHUNK_ROWS):
+            size = min(WRITE_CHUNK_ROWS, n_annotations - start)
+            goterms = go_ids[rng.choice(len(terms), size, p=weights)]
+            iea = rng.random(size) < 0.5
+            negated = rng.random(size) < 0.02
+            fwrite.write("".join([
+                "UniProtKB\tP{}\t{}enables\t{}\tPMID:1\t{}\t\t\t20240101\tBENCH\t\t\n".format(
+                    start + i, "NOT|" if negated[i] else "", goterms[i], "ECO:0000501" if iea[i] else "ECO:0000314")
+                for i in range(size)
+            ]))
+    return FILEPATH
+
+
+# "ID\tGO_ID" input with n_rows rows, GO_PER_PROTEIN rows per accession,
+# some of them alt_ids or unknown GO ids
+def write_input(FILEPATH, terms, obsolete, n_rows, seed):
+    rng = numpy.random.default_rng(seed + 3)
+    go_ids = numpy.array([x["id"] for x in terms])
+    alt_ids = numpy.array([y for x in terms for y in x["alt_id"]] or [terms[0]["id"]])
+    unknown = numpy.array(["GO:9999999", "GO:9999998"] + [x["id"] for x in obsolete])
+    weights = term_weights(len(terms), seed)
+    with open(FILEPATH, "w") as fwrite:
+        for start in range(0, n_rows, WRITE_CHUNK_ROWS):
+            size = min(WRITE_CHUNK_ROWS, n_rows - start)
+            goterms = go_ids[rng.choice(len(terms), size, p=weights)]
+            draw = rng.random(size)
+            alt = draw < ALT_ID_FRACTION
+            goterms[alt] = alt_ids[rng.integers(0, len(alt_ids), alt.sum())]
+            missing = (draw >= ALT_ID_FRACTION) & (draw < ALT_ID_FRACTION + UNKNOWN_FRACTION)
+            goterms[missing] = unknown[rng.integers(0, len(unknown), missing.sum())]
+            fwrite.write("".join([
+                "prot_{}\t{}\n".format((start + i) // GO_PER_PROTEIN, goterms[i]) for i in range(size)
+            ]))
+    return FILEPATH
+
+
+# Generated files live in a folder named after the parameters, so they are
+# only written once per configuration
+def prepare_data(config):
+    workdir = os.path.join(
+        config["workdir"],
+        "t{terms}_d{depth}_p{max_parents}_a{annotations}_s{seed}".format(**config),
+    ) + "/"
+    paths = {
+        "workdir": workdir,
+        "obo": workdir + "data/go.obo",
+        "dag": workdir + "data/godag.compiled",
+        "gpad": workdir + "annotations/synthetic.gpad",
+        "precomputed": workdir + "data/synthetic.icdb",
+        "universe_count": workdir + "data/universe.pickle",
+        "inputs": {},
+    }
+    terms = None
+    if not (os.path.exists(paths["obo"]) and os.path.exists(paths["gpad"])):
+        print("Generating synthetic ontology with", config["terms"], "terms")
+        terms, obsolete = synthetic_ontology(config["terms"], config["depth"], config["max_parents"], config["seed"])
+        write_obo(IC.new_folder(workdir + "data/") + "go.obo", terms, obsolete)
+        print("Generating", config["annotations"], "synthetic annotations")
+        write_gpad(IC.new_folder(workdir + "annotations/") + "synthetic.gpad", terms, config["annotations"], config["seed"])
+    for n_rows in config["rows"]:
+        path = workdir + "inputs/input_{}.tsv".format(n_rows)
+        if not os.path.exists(path):
+            if terms is None:
+                terms, obsolete = synthetic_ontology(config["terms"], config["depth"], config["max_parents"], config["seed"])
+            print("Generating input with", n_rows, "rows")
+            write_input(IC.new_folder(workdir + "inputs/") + "input_{}.tsv.tmp".format(n_rows), terms, obsolete, n_rows, config["seed"])
+            os.replace(path + ".tmp", path)
+        paths["inputs"][n_rows] = path
+    return paths
+
+
+def new_engine(paths):
+    workdir = paths["workdir"]
+    return IC.ICEngine(
+        data_folder=workdir + "data/",
+        annotations_folder=workdir + "annotations/",
+        plots_folder=workdir + "plots/",
+        outputs_folder=workdir + "outputs/",
+        obo_path=paths["obo"],
+        dag_path=paths["dag"],
+        precomputed_path=paths["precomputed"],
+        universe_count_path=paths["universe_count"],
+    )
+
+
+###############################################################################
+# MEASUREMENT
+###############################################################################
+# setup() runs untimed, run(state) is measured and returns the number of
+# rows it processed (or None)
+def measure(setup, run):
+    state = setup()
+    # The peak of the phase only, not of its setup or of the parent
+    peak_reset = IC.reset_peak_rss()
+    rss_start = IC.rss_mb()
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    rows = run(state)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    peak = IC.peak_rss_mb()
+    result = {
+        "wall_s": round(wall, 6),
+        "cpu_s": round(cpu, 6),
+        "rss_start_mb": IC.round_or_none(rss_start, 2),
+        "peak_rss_mb": IC.round_or_none(peak, 2),
+        # False where the peak cannot be reset: it then includes the setup
+        "peak_rss_reset": peak_reset,
+        "rss_delta_mb": round(max(peak - rss_start, 0.0), 2) if None not in (peak, rss_start) else None,
+    }
+    if rows is not None:
+        result["rows"] = rows
+        result["rows_per_s"] = round(rows / wall, 2) if wall > 0 else None
+    return result
+
+
+# Runs measure(setup, run) in a forked child and returns its result.
+# The library output goes to /dev/null unless verbose.
+def run_phase(setup, run, verbose=False):
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        try:
+            if verbose:
+                result = measure(setup, run)
+            else:
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+                    result = measure(setup, run)
+        except BaseException as error:
+            result = {"error": repr(error)}
+        with os.fdopen(write_fd, "w") as fwrite:
+            json.dump(result, fwrite)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as fread:
+        output = fread.read()
+    os.waitpid(pid, 0)
+    return json.loads(output) if output else {"error": "phase process died"}
+
+
+###############################################################################
+# PHASES
+###############################################################################
+# name -> (setup, run) for the phases that do not depend on the input size
+def global_phases(paths):
+    def nothing():
+        return None
+
+    def loaded_engine():
+        engine = new_engine(paths)
+        engine.obo
+        return engine
+
+    def counts():
+        return IC.count_annotation_file(paths["gpad"])
+
+    def universe_setup():
+        engine = loaded_engine()
+        return engine, list(counts().elements())
+
+    def parse_obo(state):
+        return len(IC.parse_obo(paths["obo"]))
+
+    def dag_compile(state):
+        IC.compile_godag(paths["obo"], paths["dag"])
+        return None
+
+    def dag_load(state):
+        godag = IC.load_godag(paths["obo"], paths["dag"])
+        return len(IC.OboTable(godag))
+
+    def count_annotations(state):
+        return int(sum(IC.count_annotation_file(paths["gpad"]).values()))
+
+    def compile_universe(state):
+        engine, all_annot = state
+        engine.compile_universe(all_annot)
+        return len(all_annot)
+
+    def precompute_data(state):
+        state.precompute_data(paths["gpad"], paths["precomputed"])
+        return len(state.godag)
+
+    return {
+        "parse_obo": (nothing, parse_obo),
+        "dag_compile": (nothing, dag_compile),
+        "dag_load": (nothing, dag_load),
+        "count_annotations": (nothing, count_annotations),
+        "compile_universe": (universe_setup, compile_universe),
+        "precompute_data": (loaded_engine, precompute_data),
+    }
+
+
+# name -> (setup, run) for the phases run once per input file
+def input_phases(paths, n_rows):
+    input_path = paths["inputs"][n_rows]
+    name = "bench_{}".format(n_rows)
+
+    def engine():
+        engine = new_engine(paths)
+        engine.obo
+        engine.precomputed_ics
+        return engine
+
+    def density():
+        engine_ = engine()
+        ic_density = IC.ICDensity()
+        for line in engine_.iter_precalc_lines(IC.iter_input_rows(input_path), ic_density):
+            pass
+        return engine_, ic_density
+
+    def precalc_lookup(state):
+        ic_density = IC.ICDensity()
+        for line in state.iter_precalc_lines(IC.iter_input_rows(input_path), ic_density):
+            pass
+        return n_rows
+
+    # Streams the lookup into the writer, the write cost is this minus
+    # precalc_lookup
+    def dump_ic_data(state):
+        state.dump_ic_data(state.iter_precalc(IC.iter_input_rows(input_path)), name + ".tsv")
+        return n_rows
+
+    def plot_density(state):
+        engine_, ic_density = state
+        engine_.plot_density(ic_density, name)
+        return len(ic_density.go_set)
+
+    def precalc_IC(state):
+        state.precalc_IC(input_path)
+        return n_rows
+
+    return {
+        "precalc_lookup": (engine, precalc_lookup),
+        "dump_ic_data": (engine, dump_ic_data),
+        "plot_density": (density, plot_density),
+        "precalc_IC": (engine, precalc_IC),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(config, phases=None, verbose=False):
+    paths = prepare_data(config)
+    selected = set(phases or GLOBAL_PHASES + INPUT_PHASES)
+    results = []
+
+    def report(phase, n_rows, result):
+        result = dict({"phase": phase, "input_rows": n_rows}, **result)
+        results.append(result)
+        if "error" in result:
+            print("{:<18} {:>12}  ERROR {}".format(phase, n_rows or "-", result["error"]))
+        else:
+            print("{:<18} {:>12}  {:>9.3f} s wall {:>9.3f} s cpu {:>9.1f} MB peak".format(
+                phase, n_rows or "-", result["wall_s"], result["cpu_s"], result["peak_rss_mb"] or float("nan")))
+
+    # Later phases need the compiled DAG and the precomputed DB
+    if "dag_compile" not in selected and not os.path.exists(paths["dag"]):
+        IC.compile_godag(paths["obo"], paths["dag"])
+    if selected & set(INPUT_PHASES) and "precompute_data" not in selected and not os.path.exists(paths["precomputed"]):
+        run_phase(*global_phases(paths)["precompute_data"], verbose=verbose)
+
+    for phase, (setup, run) in global_phases(paths).items():
+        if phase in selected:
+            report(phase, None, run_phase(setup, run, verbose))
+    for n_rows in config["rows"]:
+        for phase, (setup, run) in input_phases(paths, n_rows).items():
+            if phase in selected:
+                report(phase, n_rows, run_phase(setup, run, verbose))
+
+    return {
+        "format_version": BENCHMARK_FORMAT_VERSION,
+        "meta": {
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "numpy": numpy.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": config,
+        "results": results,
+    }
+
+
+# Prints new/old wall time and peak RSS ratios for the phases in both files
+def compare_results(old_path, new_path):
+    with open(old_path) as fread:
+        old = json.load(fread)
+    with open(new_path) as fread:
+        new = json.load(fread)
+    old_results = {(x["phase"], x["input_rows"]): x for x in old["results"] if "error" not in x}
+    print("{:<18} {:>12} {:>11} {:>11} {:>8} {:>8}".format("phase", "rows", "old wall", "new wall", "wall", "peak"))
+    for result in new["results"]:
+        key = (result["phase"], result["input_rows"])
+        if key not in old_results or "error" in result:
+            continue
+        before = old_results[key]
+        print("{:<18} {:>12} {:>11.3f} {:>11.3f} {:>7.2f}x {:>7.2f}x".format(
+            key[0], key[1] or "-", before["wall_s"], result["wall_s"],
+            result["wall_s"] / before["wall_s"] if before["wall_s"] else float("nan"),
+            result["peak_rss_mb"] / before["peak_rss_mb"] if before["peak_rss_mb"] and result["peak_rss_mb"] else float("nan"),
+        ))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="GOIC-benchmark", description="Offline benchmarks for the GO Information Content Calculator"
+    )
+    parser.add_argument("-o","--outputpath",help="JSON results file (default benchmarks/results_<date>.json)",default=None)
+    parser.add_argument("--rows",help="Input sizes in rows (e.g. 1e4 1e6 1e8)",nargs="+",type=float,default=[1e4,1e5,1e6])
+    parser.add_argument("--terms",help="Terms in the synthetic ontology",type=int,default=45000)
+    parser.add_argument("--depth",help="Levels below the root of every namespace",type=int,default=12)
+    parser.add_argument("--max_parents",help="Maximum is_a parents per term",type=int,default=3)
+    parser.add_argument("--annotations",help="Lines in the synthetic GPAD universe",type=int,default=1000000)
+    parser.add_argument("--seed",type=int,default=0)
+    parser.add_argument("--workdir",help="Folder for the generated data",default=BENCHMARK_FOLDER+"work/")
+    parser.add_argument("--phases",help="Only run these phases",nargs="+",choices=GLOBAL_PHASES+INPUT_PHASES,default=None)
+    parser.add_argument("--verbose",help="Show the pipeline output",action="store_true")
+    parser.add_argument("--compare",help="Compare two results files instead of running",nargs=2,metavar=("OLD","NEW"),default=None)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare_results(*args.compare)
+        exit()
+
+    config = {
+        "terms": args.terms,
+        "depth": args.depth,
+        "max_parents": args.max_parents,
+        "annotations": args.annotations,
+        "rows": [int(x) for x in args.rows],
+        "seed": args.seed,
+        "workdir": args.workdir,
+    }
+    results = run_benchmarks(config, args.phases, args.verbose)
+    outputpath = args.outputpath or IC.new_folder(BENCHMARK_FOLDER) + "results_{}.json".format(time.strftime("%Y%m%d_%H%M%S"))
+    with open(outputpath, "w") as fwrite:
+        json.dump(results, fwrite, indent=1)
+    print("Results written to", outputpath)
@@ -12,8 +12,31 @@
 # Pauli Virtanen, Ralf Gommers, Travis E. Oliphant, Matt Haberland, Tyler Reddy, David Cournapeau, Evgeni Burovski, Pearu Peterson, Warren Weckesser, Jonathan Bright, Stéfan J. van der Walt, Matthew Brett, Joshua Wilson, K. Jarrod Millman, Nikolay Mayorov, Andrew R. J. Nelson, Eric Jones, Robert Kern, Eric Larson, CJ Carey, İlhan Polat, Yu Feng, Eric W. Moore, Jake VanderPlas, Denis Laxalde, Josef Perktold, Robert Cimrman, Ian Henriksen, E.A. Quintero, Charles R Harris, Anne M. Archibald, Antônio H. Ribeiro, Fabian Pedregosa, Paul van Mulbregt, and SciPy 1.0 Contributors. (2020) SciPy 1.0: Fundamental Algorithms for Scientific Computing in Python. Nature Methods, 17(3), 261-272.
 
 import os
+import glob
 import argparse
 import IC_lib as IC
+
+
+# Input files from paths, glob patterns and a manifest (one path or pattern
+# per line, relative to the manifest), in order and without repeats
+def expand_inputs(patterns, manifest=None):
+    patterns = list(patterns)
+    if manifest is not None:
+        with open(manifest) as fread:
+            base = os.path.dirname(manifest)
+            patterns += [
+                os.path.join(base, x.strip()) for x in fread
+                if x.strip() and not x.startswith("#")
+            ]
+    inputfiles = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            inputfiles += sorted(glob.glob(pattern))
+        else:
+            inputfiles.append(pattern)
+    return list(dict.fromkeys(inputfiles))
+
+
 if __name__ == "__main__":
     import argparse
 
@@ -21,40 +44,112 @@ if __name__ == "__main__":
         prog="GOIC", description="GO Information Content Calculator"
     )
     parser.add_argument(
-        "inputfile", help="Tab separated file with \"ID\tGO_ID\" rows")
-    parser.add_argument("-o","--outputpath",help="Output file.\n A pickled dict if --precompute is selected or a tsv with ICs if it's not",default=None)
+        "inputfile", help="Tab separated file with \"ID\tGO_ID\" rows. Several files or glob patterns are processed in parallel",nargs="*")
+    parser.add_argument("-o","--outputpath",help="Output file.\n A precomputed IC DB if --precompute is selected (binary .icdb, or a pickled dict if it ends with .pickle) or a tsv with ICs if it's not",default=None)
     parser.add_argument("--precompute",help="Precompute IC values into PATH",action="store_true")
-    parser.add_argument("--precomputed_db",help="Path to pickled dict with precomputed IC values",default=None)
+    parser.add_argument("--incremental",help="With --precompute, only recompute the terms changed since the previous OUTPUTPATH (from OUTPUTPATH.manifest)",action="store_true")
+    parser.add_argument("--precomputed_db",help="Path to precomputed IC values (.icdb or pickled dict)",default=None)
+    parser.add_argument("--annotation",help="GPAD, GAF or \\n separated GO list to use as the universe. Only the GO terms of the inputfile are computed, no precomputed DB is needed",default=None)
+    parser.add_argument("--gzip",help="Write the tsv output gzip compressed",action="store_true")
+    parser.add_argument("--output_format",help="ICs as tsv or as a binary columnar file (outputs/<name>.icres, read with IC_lib.read_ic_results)",choices=["tsv","binary"],default="tsv")
+    parser.add_argument("--exclude_evidence",help="Evidence codes to ignore while counting the --precompute/--annotation annotations (e.g. IEA)",nargs="+",default=None)
+    parser.add_argument("--skip_not",help="Ignore NOT qualified annotations while counting the --precompute/--annotation annotations",action="store_true")
+    parser.add_argument("--no_plot","--no-plot",dest="no_plot",help="Only write the density data (plots/*.density.tsv), skip the density plot",action="store_true")
+    parser.add_argument("--plot_mode",help="Density plot: binned gaussian KDE or exact histogram",choices=["kde","hist"],default="kde")
+    parser.add_argument("--proteins",help="Also write outputs/<name>.proteins.tsv: per protein and aspect annotation counts, max/mean/sum IC and the most specific GO terms",action="store_true")
+    parser.add_argument("--ic_variants",help="IC definitions: the IC columns written (first one plotted; the DAG based ones for every GO term, annotated or not), or with --precompute the extra ones stored in the DB (all by default)",nargs="+",choices=list(IC.IC_VARIANTS),default=None)
+    parser.add_argument("--profile",help="Write a JSON report (time, CPU, peak RSS, rows/s per phase, dropped rows) next to the output",action="store_true")
+    parser.add_argument("--server",help="Send the inputfile to a running IC_server.py (http://host:port or a Unix socket path) instead of loading the data here. The server uses its own precomputed DB",default=None)
+    parser.add_argument("--manifest",help="File listing input files (or glob patterns), one per line",default=None)
+    parser.add_argument("--workers",help="Processes for several input files",type=int,default=IC.CPU_COUNT)
+    parser.add_argument("--skip_up_to_date",help="Skip input files whose output is newer than the input and the precomputed DB and was written with the same options",action="store_true")
+    parser.add_argument("--summary",help="Summary table for several input files (default outputs/summary.tsv)",default=None)
+    parser.add_argument("--similarity",help="All vs all protein semantic similarity per aspect instead of ICs (outputs/<name>.similarity.tsv)",choices=list(IC.SIMILARITY_METHODS),default=None)
+    parser.add_argument("--aggregate",help="Protein similarity from its GO terms: best match average or best pair",choices=list(IC.SIMILARITY_AGGREGATES),default="bma")
+    parser.add_argument("--top_k",help="Only write the top K partners of every protein (--similarity)",type=int,default=None)
+    parser.add_argument("--min_score",help="Only write pairs with at least this similarity (--similarity)",type=float,default=None)
     args = parser.parse_args()
+    if args.server is not None:
+        # The server answers with the DB it loaded, see IC_server.py --precomputed_db
+        local_only = [x for x, y in [("--precomputed_db", args.precomputed_db), ("--annotation", args.annotation), ("--precompute", args.precompute), ("--similarity", args.similarity)] if y]
+        if local_only:
+            parser.error("--server cannot be combined with " + ", ".join(local_only) + ", start IC_server.py --precomputed_db DB to use another DB")
+
+    inputfiles = expand_inputs(args.inputfile, args.manifest)
+    for x in inputfiles:
+        if not os.path.exists(x):
+            print("Wrong inputfile", x)
+    inputfiles = [x for x in inputfiles if os.path.exists(x)]
+    if not inputfiles:
+        print("No input files")
+        exit()
+    args.inputfile = inputfiles[0]
+    several = len(inputfiles) > 1 or args.manifest is not None or args.skip_up_to_date or args.summary is not None
 
     if (args.precompute):
+        if len(inputfiles) > 1:
+            print("Only one annotations file can be precomputed at a time")
+            exit()
         if (args.outputpath is not None) and (os.path.exists(args.inputfile)):
             outputpath=args.outputpath
             if os.path.isdir(outputpath):
                 os.mkdir(outputpath)
-                outputpath=outputpath+"/precomputed_IC_file.pickle"
-            IC.precompute_data(args.inputfile,outputpath)
+                outputpath=outputpath+"/precomputed_IC_file.icdb"
+            IC.precompute_data(args.inputfile,outputpath,args.exclude_evidence,args.skip_not,args.profile,args.incremental,args.ic_variants)
         else:
             print("""
             An universe of GOs need to be used to precompute ICs.\n
             Use 'python compute_IC.py --precompute ANNOTATIONSFILEPATH OUTPUTPATH'\n
-            ANNOTATIONSFILEPATH -> Can be a \\n separated list of GOs or a GAF file
+            ANNOTATIONSFILEPATH -> Can be a \\n separated list of GOs, a GAF or a GPAD file
             """)
             exit()
+    elif args.annotation is not None and not os.path.exists(args.annotation):
+        print("Wrong annotation file")
+        exit()
+    elif args.similarity is not None:
+        ic_source="precomputed"
+        if args.annotation is not None:
+            IC.load_annotation_universe(args.annotation,args.exclude_evidence,args.skip_not)
+            ic_source="universe"
+        elif args.precomputed_db is not None:
+            IC.default_engine().set_precomputed_path(args.precomputed_db)
+        for inputfile in inputfiles:
+            outputpath=args.outputpath if (args.outputpath is not None and len(inputfiles)==1) else IC.new_folder(IC.TSVOUTPUTS_FOLDER)+IC.ICEngine.output_name(inputfile)+".similarity.tsv"+(".gz" if args.gzip else "")
+            IC.similarity_all_vs_all(inputfile,outputpath,args.similarity,args.aggregate,ic_source,workers=args.workers,top_k=args.top_k,min_score=args.min_score)
+            print("Written",outputpath)
+    elif args.server is not None:
+        import IC_server
+        client=IC_server.ICClient(args.server)
+        for inputfile in inputfiles:
+            result=client.precalc_IC(inputfile,args.gzip,not args.no_plot,args.plot_mode,args.proteins,args.ic_variants,args.output_format)
+            print("Written",result["output"])
+    elif args.annotation is not None:
+        print("Computing ICs against", args.annotation)
+        IC.set_annotation_universe(args.annotation,inputfiles,args.exclude_evidence,args.skip_not)
+        if several:
+            IC.precalc_files(inputfiles,gzip_output=args.gzip,plot=not args.no_plot,plot_mode=args.plot_mode,workers=args.workers,skip_up_to_date=args.skip_up_to_date,summary_path=args.summary,profile=args.profile,proteins=args.proteins,ic_variants=args.ic_variants,output_format=args.output_format)
+        else:
+            IC.precalc_IC(args.inputfile,gzip_output=args.gzip,plot=not args.no_plot,plot_mode=args.plot_mode,profile=args.profile,proteins=args.proteins,ic_variants=args.ic_variants,output_format=args.output_format)
     else:
         if args.precomputed_db is not None:    
             if os.path.exists(args.inputfile) and os.path.exists(args.precomputed_db):
                 print("Using custom precomputed DB")
-                IC.precalc_IC(args.inputfile,args.precomputed_db)
+                if several:
+                    IC.precalc_files(inputfiles,args.precomputed_db,args.gzip,not args.no_plot,args.plot_mode,args.workers,args.skip_up_to_date,args.summary,args.profile,args.proteins,args.ic_variants,args.output_format)
+                else:
+                    IC.precalc_IC(args.inputfile,args.precomputed_db,args.gzip,not args.no_plot,args.plot_mode,args.profile,args.proteins,args.ic_variants,args.output_format)
                 
             else:
                 if not os.path.exists(args.inputfile):
                     print("Wrong inputfile")
                 elif not os.path.exists(args.precomputed_db):
                     print("""
-                    Wrong precomputed pickle\n
+                    Wrong precomputed DB\n
                     If you want to create it, use 'python compute_IC.py --precompute ANNOTATIONSFILEPATH OUTPUTPATH'
                     """)
         else:
             print("Using default GOA_UNIPROT precomputed DB")
-            IC.precalc_IC(args.inputfile)
\ No newline at end of file
+            if several:
+                IC.precalc_files(inputfiles,gzip_output=args.gzip,plot=not args.no_plot,plot_mode=args.plot_mode,workers=args.workers,skip_up_to_date=args.skip_up_to_date,summary_path=args.summary,profile=args.profile,proteins=args.proteins,ic_variants=args.ic_variants,output_format=args.output_format)
+            else:
+                IC.precalc_IC(args.inputfile,gzip_output=args.gzip,plot=not args.no_plot,plot_mode=args.plot_mode,profile=args.profile,proteins=args.proteins,ic_variants=args.ic_variants,output_format=args.output_format)
\ No newline at end of file
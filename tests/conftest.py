@@ -0,0 +1,118 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import IC_lib as IC
+
+
+# Small ontology: a chain and a leaf per aspect, one alt_id and one obsolete
+# term
+OBO_TEXT = """format-version: 1.2
+data-version: releases/2000-01-01
+
+[Term]
+id: GO:0008150
+name: biological_process
+namespace: biological_process
+
+[Term]
+id: GO:0000001
+name: process child
+namespace: biological_process
+alt_id: GO:0000009
+is_a: GO:0008150 ! biological_process
+
+[Term]
+id: GO:0000002
+name: process grandchild
+namespace: biological_process
+is_a: GO:0000001 ! process child
+
+[Term]
+id: GO:0000003
+name: process leaf
+namespace: biological_process
+is_a: GO:0008150 ! biological_process
+
+[Term]
+id: GO:0003674
+name: molecular_function
+namespace: molecular_function
+
+[Term]
+id: GO:0000004
+name: function child
+namespace: molecular_function
+is_a: GO:0003674 ! molecular_function
+
+[Term]
+id: GO:0005575
+name: cellular_component
+namespace: cellular_component
+
+[Term]
+id: GO:0000005
+name: component child
+namespace: cellular_component
+is_a: GO:0005575 ! cellular_component
+
+[Term]
+id: GO:0000006
+name: obsolete term
+namespace: biological_process
+is_obsolete: true
+"""
+
+UNIVERSE = ["GO:0008150", "GO:0000001", "GO:0000001", "GO:0000002", "GO:0003674", "GO:0000004", "GO:0005575"]
+
+
+# Engine working in a temporary folder on the small ontology, nothing is
+# downloaded
+@pytest.fixture
+def engine(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    (data / "go.obo").write_text(OBO_TEXT)
+    (tmp_path / "universe.list").write_text("\n".join(UNIVERSE) + "\n")
+    return IC.ICEngine(
+        data_folder=str(data) + "/",
+        annotations_folder=str(tmp_path) + "/",
+        plots_folder=str(tmp_path / "plots") + "/",
+        outputs_folder=str(tmp_path / "outputs") + "/",
+        precomputed_path=str(tmp_path / "db.icdb"),
+    )
+
+
+# Engine with a precomputed DB of the small universe
+@pytest.fixture
+def precomputed_engine(engine, tmp_path):
+    engine.precompute_data(str(tmp_path / "universe.list"), str(tmp_path / "db.icdb"))
+    engine.set_precomputed_path(str(tmp_path / "db.icdb"))
+    return engine
+
+
+# Engine on a random ontology of benchmark_IC (multiple parents, alt_ids,
+# obsolete terms) with a GPAD universe and an input file
+@pytest.fixture
+def synthetic(tmp_path):
+    import benchmark_IC
+
+    terms, obsolete = benchmark_IC.synthetic_ontology(300, 5, 3, seed=7)
+    data = tmp_path / "data"
+    data.mkdir()
+    paths = {
+        "obo": benchmark_IC.write_obo(str(data / "go.obo"), terms, obsolete),
+        "gpad": benchmark_IC.write_gpad(str(tmp_path / "synthetic.gpad"), terms, 5000, seed=7),
+        "input": benchmark_IC.write_input(str(tmp_path / "input.tsv"), terms, obsolete, 400, seed=7),
+    }
+    engine = IC.ICEngine(
+        data_folder=str(data) + "/",
+        annotations_folder=str(tmp_path) + "/",
+        plots_folder=str(tmp_path / "plots") + "/",
+        outputs_folder=str(tmp_path / "outputs") + "/",
+        precomputed_path=str(tmp_path / "synthetic.icdb"),
+    )
+    return engine, paths
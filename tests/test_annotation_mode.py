@@ -0,0 +1,29 @@
+import IC_lib as IC
+
+
+def read_lines(path):
+    with open(path) as fread:
+        return fread.read().splitlines()
+
+
+# --annotation computes only the input terms and gives the rows a DB
+# precomputed from the same annotation file gives
+def test_annotation_mode_matches_precompute(synthetic, tmp_path):
+    engine, paths = synthetic
+    table = engine.set_annotation_universe(paths["gpad"], [paths["input"]])
+    direct = read_lines(engine.precalc_IC(paths["input"], plot=False, ic_variants=["annotation", "zhou"])["output"])
+    input_terms = set(x for _, x in IC.iter_input_rows(paths["input"]))
+    assert set(table) <= input_terms
+    assert len(table) < len(engine.godag)
+
+    precomputed = IC.ICEngine(
+        data_folder=engine.data_folder,
+        annotations_folder=engine.annotations_folder,
+        plots_folder=engine.plots_folder,
+        outputs_folder=engine.outputs_folder,
+        precomputed_path=str(tmp_path / "full.icdb"),
+    )
+    precomputed.precompute_data(paths["gpad"], str(tmp_path / "full.icdb"))
+    full = read_lines(precomputed.precalc_IC(paths["input"], plot=False, ic_variants=["annotation", "zhou"])["output"])
+    assert direct == full
+    assert {x: y for x, y in IC.PrecomputedDB(str(tmp_path / "full.icdb")).items() if x in input_terms} == table
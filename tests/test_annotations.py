@@ -0,0 +1,85 @@
+import gzip
+from collections import Counter
+
+import IC_lib as IC
+
+
+GAF_LINES = [
+    "!gaf-version: 2.2",
+    "UniProtKB\tP1\tA\tenables\tGO:0000004\tPMID:1\tIDA\t\tF\tA\t\tprotein\ttaxon:1\t20240101\tX",
+    "UniProtKB\tP1\tA\tinvolved_in\tGO:0000001\tPMID:1\tIEA\t\tP\tA\t\tprotein\ttaxon:1\t20240101\tX",
+    "UniProtKB\tP2\tB\tNOT|involved_in\tGO:0000001\tPMID:1\tIMP\t\tP\tB\t\tprotein\ttaxon:1\t20240101\tX",
+    "UniProtKB\tP3\tC\tinvolved_in\tGO:0000002\tPMID:1\tIMP\t\tP\tC\t\tprotein\ttaxon:1\t20240101\tX",
+]
+GPAD1_LINES = [
+    "!gpad-version: 1.1",
+    "UniProtKB\tP1\tenables\tGO:0000004\tPMID:1\tECO:0000314\t\t\t20240101\tX\t\t",
+    "UniProtKB\tP1\tinvolved_in\tGO:0000001\tPMID:1\tECO:0007669\t\t\t20240101\tX\t\t",
+    "UniProtKB\tP2\tNOT|involved_in\tGO:0000001\tPMID:1\tECO:0000315\t\t\t20240101\tX\t\t",
+    "UniProtKB\tP3\tinvolved_in\tGO:0000002\tPMID:1\tECO:0000315\t\t\t20240101\tX\t\t",
+]
+GPAD2_LINES = [
+    "!gpad-version: 2.0",
+    "UniProtKB:P1\t\tRO:0002327\tGO:0000004\tPMID:1\tECO:0000314\t\t\t2024-01-01\tX\t\t",
+    "UniProtKB:P1\t\tRO:0002331\tGO:0000001\tPMID:1\tECO:0007669\t\t\t2024-01-01\tX\t\t",
+    "UniProtKB:P2\tNOT\tRO:0002331\tGO:0000001\tPMID:1\tECO:0000315\t\t\t2024-01-01\tX\t\t",
+    "UniProtKB:P3\t\tRO:0002331\tGO:0000002\tPMID:1\tECO:0000315\t\t\t2024-01-01\tX\t\t",
+]
+ALL = Counter({"GO:0000004": 1, "GO:0000001": 2, "GO:0000002": 1})
+
+
+def write_lines(path, lines, compress=False):
+    text = "\n".join(lines) + "\n"
+    if compress:
+        with gzip.open(path, "wt") as fwrite:
+            fwrite.write(text)
+    else:
+        path.write_text(text)
+    return str(path)
+
+
+def test_count_formats_and_filters(tmp_path):
+    for name, lines in [("a.gaf", GAF_LINES), ("a.gpad", GPAD1_LINES), ("b.gpad", GPAD2_LINES)]:
+        path = write_lines(tmp_path / name, lines)
+        assert IC.count_annotation_file(path) == ALL
+        assert IC.count_annotation_file(path, skip_not=True) == ALL - Counter({"GO:0000001": 1})
+        assert IC.count_annotation_file(path, exclude_evidence=["IEA"]) == ALL - Counter({"GO:0000001": 1})
+        assert IC.count_annotation_file(path, exclude_evidence=["IEA", "IMP"], skip_not=True) == Counter({"GO:0000004": 1})
+
+
+def test_count_gzip_and_list(tmp_path):
+    path = write_lines(tmp_path / "a.gpad.gz", GPAD1_LINES, compress=True)
+    assert IC.count_annotation_file(path) == ALL
+    path = write_lines(tmp_path / "universe.list", ["GO:0000001", "GO:0000001 ", "", "GO:0000002"])
+    assert IC.count_annotation_file(path) == Counter({"GO:0000001": 2, "GO:0000002": 1})
+    assert IC.read_gpad(write_lines(tmp_path / "c.gpad", GPAD1_LINES)) == ["GO:0000004", "GO:0000001", "GO:0000001", "GO:0000002"]
+
+
+# Lines cut by the chunk boundaries come back whole
+def test_line_chunks_keep_lines(tmp_path):
+    lines = ["line %d %s" % (i, "x" * (i % 13)) for i in range(200)]
+    path = write_lines(tmp_path / "lines.txt", lines)
+    for chunk_size in [1, 7, 64, 4096]:
+        chunks = list(IC.iter_line_chunks(path, chunk_size))
+        assert [x.decode() for chunk in chunks for x in chunk] == lines
+    path = str(tmp_path / "no_newline.txt")
+    with open(path, "w") as fwrite:
+        fwrite.write("a\nb")
+    assert [x for chunk in IC.iter_line_chunks(path, 3) for x in chunk] == [b"a", b"b"]
+
+
+def test_cached_counts(tmp_path, monkeypatch):
+    path = write_lines(tmp_path / "a.gpad", GPAD1_LINES)
+    cache = str(tmp_path / "counts") + "/"
+    assert IC.count_annotation_file_cached(path, cache_folder=cache) == ALL
+    # Same size and mtime and the same filters, the file is not read again
+    calls = []
+    count_annotation_file = IC.count_annotation_file
+    monkeypatch.setattr(IC, "count_annotation_file", lambda *args: calls.append(args) or count_annotation_file(*args))
+    assert IC.count_annotation_file_cached(path, cache_folder=cache) == ALL
+    assert calls == []
+    assert IC.count_annotation_file_cached(path, cache_folder=cache, skip_not=True) == ALL - Counter({"GO:0000001": 1})
+    assert len(calls) == 1
+    write_lines(tmp_path / "a.gpad", GPAD1_LINES[:-1] + [GPAD1_LINES[-1].replace("GO:0000002", "GO:0000003")])
+    assert IC.count_annotation_file_cached(path, cache_folder=cache)["GO:0000003"] == 1
+    assert len(calls) == 2
@@ -0,0 +1,31 @@
+
+
+import IC_lib as IC
+
+
+# batch_IC gives the values precalc_term gives row by row
+def test_batch_IC_matches_precalc_term(precomputed_engine):
+    engine = precomputed_engine
+    goterms = ["GO:0000002", "GO:0000009", "GO:0000003", "GO:9999999", "bad", "GO:-000001", "GO:0003674", "GO:0000006"]
+    result = engine.batch_IC(["P%d" % i for i in range(len(goterms))], goterms)
+    resolved = engine.batch_IC(["P"] * len(goterms), goterms, resolve_alt_ids=False)
+    for i, goterm in enumerate(goterms):
+        index = engine.godag.resolve(goterm)
+        if index is None:
+            assert result["term"].mask[i] and result["ic"].mask[i]
+            continue
+        assert result["term"][i] == index
+        assert IC.NAMESPACES[result["aspect"][i]] == engine.godag.aspect(index)
+        values = engine.precalc_term(engine.godag.go_id(index))
+        for name, value in zip(["descendant_count", "depth", "ic"], values[2:5]):
+            if value == "None":
+                assert result[name].mask[i]
+            else:
+                assert result[name][i] == value
+    assert resolved["term"].mask[1] and not result["term"].mask[1]
+    assert list(result["accession"]) == ["P%d" % i for i in range(len(goterms))]
+
+
+def test_batch_IC_empty(precomputed_engine):
+    result = precomputed_engine.batch_IC([], [])
+    assert len(result["ic"]) == 0
@@ -0,0 +1,21 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+COMPUTE_IC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "compute_IC.py")
+
+
+def run_cli(args, cwd):
+    return subprocess.run([sys.executable, COMPUTE_IC] + args, cwd=str(cwd), capture_output=True, text=True)
+
+
+# Options the server would silently ignore are rejected
+@pytest.mark.parametrize("option", [["--precomputed_db", "db.icdb"], ["--annotation", "a.gpad"], ["--similarity", "lin"], ["--precompute"]])
+def test_server_rejects_local_options(tmp_path, option):
+    (tmp_path / "input.tsv").write_text("P1\tGO:0008150\n")
+    result = run_cli(["input.tsv", "--server", "http://127.0.0.1:1"] + option, tmp_path)
+    assert result.returncode == 2
+    assert "--server cannot be combined with " + option[0] in result.stderr
@@ -0,0 +1,113 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import IC_lib as IC
+
+
+# Serves one file with an ETag, answering If-None-Match with a 304 and
+# Range/If-Range with a 206. cut_at sends the full Content-Length but closes
+# the connection after that many bytes
+class FileHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        remote = self.server.remote
+        remote["requests"].append(dict(self.headers))
+        body, etag = remote["body"], remote["etag"]
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header and self.headers.get("If-Range") == etag:
+            start = int(range_header.split("=")[1].rstrip("-"))
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes %d-%d/%d" % (start, len(body) - 1, len(body)))
+        else:
+            self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body) - start))
+        self.end_headers()
+        cut_at = remote.pop("cut_at", None)
+        self.wfile.write(body[start:cut_at])
+        self.wfile.flush()
+        if cut_at is not None:
+            self.close_connection = True
+
+
+@pytest.fixture
+def remote(monkeypatch):
+    # Small chunks so the bytes received before a cut are written to the part
+    monkeypatch.setattr(IC, "DOWNLOAD_CHUNK_SIZE", 16)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FileHandler)
+    server.remote = {"body": bytes(range(256)) * 4, "etag": '"v1"', "requests": []}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.remote["url"] = "http://127.0.0.1:%d/go.obo" % server.server_address[1]
+    yield server.remote
+    server.shutdown()
+    server.server_close()
+
+
+def test_resume_after_cut_transfer(remote, tmp_path):
+    path = str(tmp_path / "go.obo")
+    remote["cut_at"] = 512
+
+    with pytest.raises(Exception):
+        IC.download_file(remote["url"], path)
+    assert not os.path.exists(path)
+    assert os.path.getsize(path + ".part") == 512
+
+    assert IC.download_file(remote["url"], path) == (path, True)
+    assert remote["requests"][-1]["Range"] == "bytes=512-"
+    assert remote["requests"][-1]["If-Range"] == '"v1"'
+    with open(path, "rb") as fread:
+        assert fread.read() == remote["body"]
+    assert not os.path.exists(path + ".part")
+    meta = IC.read_download_meta(path)
+    assert meta["etag"] == '"v1"'
+    assert meta["size"] == len(remote["body"])
+    assert meta["sha256"] == IC.file_sha256(path)
+
+
+def test_refresh_not_modified(remote, tmp_path):
+    path = str(tmp_path / "go.obo")
+    assert IC.download_file(remote["url"], path) == (path, True)
+    mtime = os.path.getmtime(path)
+
+    assert IC.download_file(remote["url"], path, refresh=True) == (path, False)
+    assert remote["requests"][-1]["If-None-Match"] == '"v1"'
+    assert os.path.getmtime(path) == mtime
+    # Without refresh the server is not asked again
+    assert IC.download_file(remote["url"], path) == (path, False)
+    assert len(remote["requests"]) == 2
+
+
+def test_refresh_etag_changed(remote, tmp_path):
+    path = str(tmp_path / "go.obo")
+    IC.download_file(remote["url"], path)
+    remote["body"], remote["etag"] = b"format-version: 1.2\n", '"v2"'
+
+    assert IC.download_file(remote["url"], path, refresh=True) == (path, True)
+    with open(path, "rb") as fread:
+        assert fread.read() == b"format-version: 1.2\n"
+    assert IC.read_download_meta(path)["etag"] == '"v2"'
+
+
+def test_resume_after_etag_changed(remote, tmp_path):
+    path = str(tmp_path / "go.obo")
+    remote["cut_at"] = 512
+    with pytest.raises(Exception):
+        IC.download_file(remote["url"], path)
+    remote["body"], remote["etag"] = b"format-version: 1.2\n", '"v2"'
+
+    # If-Range does not match anymore, the server sends the whole new file
+    assert IC.download_file(remote["url"], path) == (path, True)
+    with open(path, "rb") as fread:
+        assert fread.read() == b"format-version: 1.2\n"
@@ -0,0 +1,71 @@
+import os
+
+import IC_lib as IC
+from conftest import OBO_TEXT
+
+
+# is_a ancestors of every term by walking read_obo's parent lists
+def walked_ancestors(ontology):
+    parents = dict(zip(ontology["ids"], ontology["is_a"]))
+    ancestors = {}
+    for goterm in ontology["ids"]:
+        seen, stack = set(), list(parents[goterm])
+        while stack:
+            x = stack.pop()
+            if x not in seen:
+                seen.add(x)
+                stack.extend(parents.get(x, []))
+        ancestors[goterm] = seen
+    return ancestors
+
+
+def test_compiled_dag_matches_obo(engine):
+    dag = engine.godag
+    ontology = IC.read_obo(engine.obo_path)
+    ancestors = walked_ancestors(ontology)
+
+    assert len(dag) == len(ontology["ids"])
+    assert dag.meta["data_version"] == "releases/2000-01-01"
+    for i, goterm in enumerate(ontology["ids"]):
+        index = dag.get(goterm)
+        assert dag.go_id(index) == goterm
+        assert dag.name(index) == ontology["names"][i]
+        assert dag.aspect(index) == ontology["namespaces"][i]
+        assert bool(dag.obsolete[index]) == ontology["obsolete"][i]
+        assert sorted(dag.go_id(x) for x in dag.parents(index)) == sorted(ontology["is_a"][i])
+        assert set(dag.go_id(x) for x in dag.ancestors(index)) == ancestors[goterm]
+        descendants = set(x for x in ancestors if goterm in ancestors[x])
+        assert set(dag.go_id(x) for x in dag.descendants(index)) == descendants
+    # Every term comes after all its parents
+    order = [int(x) for g in dag.generations() for x in g]
+    assert sorted(order) == list(range(len(dag)))
+    for index in range(len(dag)):
+        assert all(order.index(x) < order.index(index) for x in dag.parents(index))
+
+
+def test_obo_table_matches_parse_obo(engine):
+    assert dict(engine.obo) == IC.parse_obo(engine.obo_path)
+
+
+def test_alt_ids_and_unknown_ids(engine):
+    dag = engine.godag
+    child = dag.get("GO:0000001")
+    assert dag.get("GO:0000009") is None
+    assert dag.resolve("GO:0000009") == child
+    assert dag.alt_ids(child) == ["GO:0000009"]
+    for goterm in ["GO:-1", "GO:-0000001", "GO:+0000001", "GO: 0000001", "GO:", "GO:abc", "8150", "GO:9999999"]:
+        assert dag.get(goterm) is None
+        assert dag.resolve(goterm) is None
+    assert IC.go_number("GO:-1") is None
+    assert list(dag.indices(IC.go_numbers_array(["GO:0000009", "GO:-000001", "GO:0008150"]))) == [
+        child, -1, dag.get("GO:0008150")]
+
+
+def test_load_godag_recompiles_when_obo_changes(engine):
+    dag = engine.godag
+    assert IC.load_godag(engine.obo_path, engine.dag_path).get("GO:0000007") is None
+    with open(engine.obo_path, "w") as fwrite:
+        fwrite.write(OBO_TEXT + "\n[Term]\nid: GO:0000007\nname: new\nnamespace: biological_process\nis_a: GO:0000003\n")
+    os.utime(engine.obo_path, (0, 0))
+    dag = IC.load_godag(engine.obo_path, engine.dag_path)
+    assert dag.go_id(dag.parents(dag.get("GO:0000007"))[0]) == "GO:0000003"
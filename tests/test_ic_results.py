@@ -0,0 +1,69 @@
+import math
+import os
+
+import numpy
+import pytest
+
+import IC_lib as IC
+
+
+def read_lines(path):
+    with IC.open_text_file(path) as fread:
+        return fread.read().splitlines()
+
+
+@pytest.fixture
+def synthetic_db(synthetic, tmp_path):
+    engine, paths = synthetic
+    engine.precompute_data(paths["gpad"], str(tmp_path / "synthetic.icdb"))
+    engine.set_precomputed_path(str(tmp_path / "synthetic.icdb"))
+    return engine, paths
+
+
+# The binary results hold the same rows as the TSV
+@pytest.mark.parametrize("ic_variants", [None, ["seco", "annotation"]])
+def test_binary_output_matches_tsv(synthetic_db, ic_variants):
+    engine, paths = synthetic_db
+    tsv = engine.precalc_IC(paths["input"], plot=False, ic_variants=ic_variants, gzip_output=True)
+    binary = engine.precalc_IC(paths["input"], plot=False, ic_variants=ic_variants, output_format="binary")
+    assert binary["output"].endswith(IC.ICRESULTS_EXTENSION)
+    assert {x: y for x, y in tsv.items() if x != "output"} == {x: y for x, y in binary.items() if x != "output"}
+
+    results = IC.read_ic_results(binary["output"])
+    lines = read_lines(tsv["output"])
+    assert len(results) == len(lines) == tsv["output_rows"]
+    assert list(results.lines(chunk_rows=7)) == lines
+    assert results.ic_variants == (ic_variants or ["annotation"])
+    fields = [x.split("\t") for x in lines]
+    assert results.accession_ids() == list(dict.fromkeys(x[0] for x in fields))
+    assert [IC.NAMESPACES[x] for x in results.aspect.tolist()] == [x[1] for x in fields]
+    ic = results.column("ic")
+    assert [None if math.isnan(x) else x for x in ic.tolist()] == [None if x[5] == "None" else float(x[5]) for x in fields]
+
+
+def test_writer_chunks_and_discard(tmp_path):
+    path = str(tmp_path / "rows.icres")
+    rows = [["P%d" % (i % 5), "biological_process", "GO:%07d" % (i % 3), i % 3, 1, 0.5 * (i % 3) or "None", "term %d" % (i % 3)] for i in range(23)]
+    with IC.ICResultsWriter(path, chunk_rows=4) as writer:
+        for row in rows:
+            writer.add(row)
+    results = IC.read_ic_results(path)
+    assert list(results.lines()) == ["\t".join(str(y) for y in x) for x in rows]
+    numpy.testing.assert_array_equal(results.column("depth"), numpy.ones(23))
+    assert os.listdir(str(tmp_path)) == ["rows.icres"]
+
+    with pytest.raises(RuntimeError):
+        with IC.ICResultsWriter(str(tmp_path / "failed.icres")) as writer:
+            writer.add(rows[0])
+            raise RuntimeError("stop")
+    assert os.listdir(str(tmp_path)) == ["rows.icres"]
+
+    with IC.ICResultsWriter(str(tmp_path / "empty.icres")):
+        pass
+    assert len(IC.read_ic_results(str(tmp_path / "empty.icres"))) == 0
+    assert list(IC.read_ic_results(str(tmp_path / "empty.icres")).lines()) == []
+
+
+def test_read_rejects_other_files(synthetic_db, tmp_path):
+    with pytest.raises(ValueError):
+        IC.read_ic_results(str(tmp_path / "synthetic.icdb"))
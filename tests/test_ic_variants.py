@@ -0,0 +1,46 @@
+import math
+
+import numpy
+
+import IC_lib as IC
+
+
+def output_rows(engine, tmp_path, rows, ic_variants):
+    inputfile = tmp_path / "input.tsv"
+    inputfile.write_text("".join("%s\t%s\n" % x for x in rows))
+    summary = engine.precalc_IC(str(inputfile), plot=False, progress=False, ic_variants=ic_variants)
+    with open(summary["output"]) as fread:
+        return {x.split("\t")[2]: x.split("\t") for x in fread.read().splitlines()}
+
+
+def test_intrinsic_variants_stored_in_db(precomputed_engine, tmp_path):
+    db = IC.PrecomputedDB(str(tmp_path / "db.icdb"))
+    assert db.ic_variants == ["annotation"] + list(IC.INTRINSIC_IC_VARIANTS)
+    # GO:0000001 has 2 offspring in a 4 term aspect
+    assert math.isclose(db["GO:0000001"][2], -math.log2(3 / 4))
+    assert math.isclose(float(db.ic_seco[db.row("GO:0000001")]), 1 - math.log(2) / math.log(4))
+
+
+# GO:0000003 is not annotated: no annotation IC, but its DAG based ICs are
+# defined
+def test_intrinsic_variants_for_unannotated_terms(precomputed_engine, tmp_path):
+    rows = output_rows(precomputed_engine, tmp_path, [("P1", "GO:0000001"), ("P1", "GO:0000003")], ["annotation", "seco", "zhou", "offspring_ratio"])
+    leaf = rows["GO:0000003"]
+    assert leaf[5] == "None"
+    assert float(leaf[6]) == 1.0
+    assert math.isclose(float(leaf[7]), 0.5 + 0.5 * math.log(2) / math.log(3))
+    assert float(leaf[8]) == 0.0
+    annotated = rows["GO:0000001"]
+    assert annotated[5] != "None"
+    assert math.isclose(float(annotated[6]), 1 - math.log(2) / math.log(4))
+
+
+# Tables without intrinsic columns (--annotation mode) give the same values
+def test_intrinsic_variants_annotation_mode(engine, tmp_path):
+    inputfile = tmp_path / "input.tsv"
+    inputfile.write_text("P1\tGO:0000001\nP1\tGO:0000003\n")
+    engine.set_annotation_universe(str(tmp_path / "universe.list"), [str(inputfile)])
+    ic = engine.term_ics(variant="seco")
+    leaf = engine.godag.get("GO:0000003")
+    assert ic[leaf] == 1.0
+    assert numpy.isnan(engine.term_ics()[leaf])
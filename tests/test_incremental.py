@@ -0,0 +1,87 @@
+import os
+
+import numpy
+import pytest
+
+import IC_lib as IC
+
+
+def new_engine(tmp_path):
+    return IC.ICEngine(
+        data_folder=str(tmp_path / "data") + "/",
+        annotations_folder=str(tmp_path) + "/",
+        plots_folder=str(tmp_path / "plots") + "/",
+        outputs_folder=str(tmp_path / "outputs") + "/",
+        profiler=IC.Profiler(),
+    )
+
+
+def assert_same_db(path_a, path_b):
+    a, b = IC.PrecomputedDB(path_a), IC.PrecomputedDB(path_b)
+    assert list(a) == list(b)
+    numpy.testing.assert_array_equal(a.descendant_count, b.descendant_count)
+    numpy.testing.assert_array_equal(a.depth, b.depth)
+    assert a.ic_variants == b.ic_variants
+    for variant in a.ic_variants:
+        numpy.testing.assert_allclose(a.variant_column(variant), b.variant_column(variant), rtol=1e-12, atol=1e-12)
+
+
+# Stanzas of an OBO file without the term `goterm`
+def remove_term(obo_text, goterm):
+    stanzas = obo_text.split("\n[Term]\n")
+    return "\n[Term]\n".join(x for x in stanzas if not x.startswith("id: " + goterm + "\n"))
+
+
+def test_incremental_matches_full_rebuild(synthetic, tmp_path):
+    engine, paths = synthetic
+    incremental = str(tmp_path / "incremental.icdb")
+    engine.precompute_data(paths["gpad"], incremental, incremental=True)
+    assert os.path.exists(incremental + IC.PRECOMPUTE_MANIFEST_EXTENSION)
+
+    # Nothing changed: nothing is recomputed
+    engine = new_engine(tmp_path)
+    engine.precompute_data(paths["gpad"], incremental, incremental=True)
+    assert engine.profiler.counters["terms_changed"] == 0
+    assert engine.profiler.counters["terms_recomputed"] == 0
+
+    # New release: a term removed, one added, one moved, other counts
+    dag = engine.godag
+    leaves = [x for x in range(len(dag)) if not dag.children(x) and not dag.obsolete[x] and dag.parents(x)]
+    removed, moved, parent = dag.go_id(leaves[0]), dag.go_id(leaves[1]), dag.go_id(dag.parents(leaves[2])[0])
+    with open(paths["obo"]) as fread:
+        obo_text = remove_term(fread.read(), removed)
+    obo_text = obo_text.replace("id: " + moved + "\n", "id: " + moved + "\nis_a: " + parent + " ! moved\n")
+    obo_text += "\n[Term]\nid: GO:0990000\nname: new term\nnamespace: {}\nis_a: {}\n".format(dag.aspect(leaves[2]), parent)
+    with open(paths["obo"], "w") as fwrite:
+        fwrite.write(obo_text)
+    os.utime(paths["obo"], (1, 1))
+    with open(paths["gpad"]) as fread:
+        lines = fread.read().splitlines()
+    dropped = lines[1].split("\t")[3]
+    lines = [x for x in lines if "\t" + dropped + "\t" not in x]
+    lines += ["UniProtKB\tQ{}\tenables\tGO:0990000\tPMID:1\tECO:0000314\t\t\t20240101\tX\t\t".format(i) for i in range(5)]
+    with open(paths["gpad"], "w") as fwrite:
+        fwrite.write("\n".join(lines) + "\n")
+
+    engine = new_engine(tmp_path)
+    engine.precompute_data(paths["gpad"], incremental, incremental=True)
+    counters = engine.profiler.counters
+    assert counters["terms_changed"] >= 4
+    assert 0 < counters["terms_recomputed"] < len(engine.godag)
+
+    full = str(tmp_path / "full.icdb")
+    new_engine(tmp_path).precompute_data(paths["gpad"], full)
+    assert_same_db(incremental, full)
+    assert removed not in IC.PrecomputedDB(incremental)
+    assert "GO:0990000" in IC.PrecomputedDB(incremental)
+
+
+def test_manifest_roundtrip(engine, tmp_path):
+    path = str(tmp_path / "db.icdb")
+    engine.precompute_data(str(tmp_path / "universe.list"), path)
+    meta, arrays = IC.read_precompute_manifest(path + IC.PRECOMPUTE_MANIFEST_EXTENSION)
+    assert meta["data_version"] == "releases/2000-01-01"
+    assert meta["totals"] == IC.universe_totals(engine.annotations)
+    numpy.testing.assert_array_equal(arrays["go_numbers"], engine.godag.go_numbers)
+    assert IC.read_precompute_manifest(path) is None
+    assert IC.read_precompute_manifest(str(tmp_path / "missing")) is None
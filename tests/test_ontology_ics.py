@@ -0,0 +1,57 @@
+import math
+
+import numpy
+import pytest
+
+import IC_lib as IC
+
+
+# The whole ontology pass gives what calculate_IC, get_depth and the
+# crow_compute descendant count give term by term
+def test_ontology_ics_match_term_by_term(synthetic):
+    engine, paths = synthetic
+    universe = engine.load_annotation_universe(paths["gpad"])
+    dag = engine.godag
+    ics = IC.compute_ontology_ics(dag, universe)
+
+    checked = 0
+    for index in range(len(dag)):
+        aspect = dag.aspect(index)
+        if dag.obsolete[index] or aspect is None:
+            continue
+        goterm = dag.go_id(index)
+        row = engine.crow_compute(["prot", goterm, aspect, dag.name(index)])
+        assert int(ics["descendant_count"][index]) == row[3]
+        assert int(ics["depth"][index]) == row[4]
+        if row[5] is None:
+            assert math.isnan(ics["ic"][index])
+        else:
+            assert float(ics["ic"][index]) == pytest.approx(row[5], abs=1e-12)
+            checked += 1
+    assert checked > 50
+
+
+def test_term_ics_match_ontology_ics(synthetic):
+    engine, paths = synthetic
+    universe = engine.load_annotation_universe(paths["gpad"])
+    dag = engine.godag
+    ics = IC.compute_ontology_ics(dag, universe)
+    terms = numpy.arange(0, len(dag), 3)
+    term_ics = IC.compute_term_ics(dag, universe, terms)
+    for name in ["descendant_count", "depth", "ic", "offspring_sum"]:
+        numpy.testing.assert_allclose(term_ics[name], ics[name][terms], rtol=0, atol=1e-12)
+
+
+# precompute_data rows against compute_compute over the same universe
+def test_precompute_data_matches_compute_compute(synthetic, tmp_path):
+    engine, paths = synthetic
+    engine.precompute_data(paths["gpad"], str(tmp_path / "synthetic.icdb"))
+    db = IC.open_precomputed(str(tmp_path / "synthetic.icdb"))
+    input_data = engine.process_file([["prot", x] for x in db])
+    for row in engine.compute_compute(input_data):
+        expected = db[row[2]]
+        assert expected[:2] == row[3:5]
+        if row[5] is None:
+            assert expected[2] == "None"
+        else:
+            assert expected[2] == pytest.approx(row[5], abs=1e-12)
@@ -0,0 +1,57 @@
+import json
+import os
+import shutil
+
+import IC_lib as IC
+
+
+def write_inputs(tmp_path, n):
+    paths = []
+    for i in range(n):
+        path = tmp_path / ("input_%d.tsv" % i)
+        path.write_text("P%d\tGO:0000002\nP%d\tGO:0000004\nQ%d\tGO:0000009\n" % (i, i, i))
+        paths.append(str(path))
+    return paths
+
+
+# With one worker the jobs run in this process, the profiler must survive
+def test_precalc_files_in_process_profile(precomputed_engine, tmp_path):
+    inputs = write_inputs(tmp_path, 2)
+    summary_path = str(tmp_path / "outputs" / "summary.tsv")
+    summaries = precomputed_engine.precalc_files(inputs, plot=False, workers=1, summary_path=summary_path, profile=True)
+    assert [x["status"] for x in summaries] == ["done", "done"]
+    assert isinstance(precomputed_engine.profiler, IC.Profiler)
+    with open(str(tmp_path / "outputs" / "summary.profile.json")) as fread:
+        report = json.load(fread)
+    assert "precalc_files" in json.dumps(report)
+    for x in summaries:
+        assert os.path.exists(x["output"])
+        assert x["output_rows"] == 2
+
+
+# Only one job left after skip_up_to_date also runs in process
+def test_precalc_files_skip_up_to_date_profile(precomputed_engine, tmp_path):
+    inputs = write_inputs(tmp_path, 2)
+    precomputed_engine.precalc_files(inputs[:1], plot=False, workers=2)
+    summaries = precomputed_engine.precalc_files(inputs, plot=False, workers=2, skip_up_to_date=True, profile=True)
+    assert [x["status"] for x in summaries] == ["skipped", "done"]
+    assert precomputed_engine.profiler is not None
+
+
+# skip_up_to_date only skips outputs written with the same options
+def test_skip_up_to_date_checks_options(precomputed_engine, tmp_path):
+    inputs = write_inputs(tmp_path, 1)
+    engine = precomputed_engine
+    status = lambda **options: engine.precalc_files(inputs, plot=False, workers=1, skip_up_to_date=True, **options)[0]["status"]
+    assert status() == "done"
+    assert status() == "skipped"
+    assert status(ic_variants=["seco"]) == "done"
+    assert status(ic_variants=["seco"]) == "skipped"
+    assert status() == "done"
+    assert status(proteins=True) == "done"
+    assert status(output_format="binary") == "done"
+    assert status(output_format="binary") == "skipped"
+    shutil.copy(engine.precomputed_path, str(tmp_path / "other.icdb"))
+    assert status(output_format="binary", precomputed_user_path=str(tmp_path / "other.icdb")) == "done"
+    with open(str(tmp_path / "outputs" / "input_0.summary.json")) as fread:
+        assert json.load(fread)["options"]["output_format"] == "binary"
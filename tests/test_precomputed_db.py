@@ -0,0 +1,78 @@
+import math
+import os
+import pickle
+
+import numpy
+import pytest
+
+import IC_lib as IC
+
+
+TABLE = {
+    "GO:0008150": [5, 0, 0.0, 0.1],
+    "GO:0000001": [1, 1, 1.5, 0.2],
+    "GO:0000002": ["None", "None", "None", "None"],
+    "GO:0003674": [2, 0, 0.25, 0.3],
+}
+
+
+def test_write_and_read_db(tmp_path):
+    path = str(tmp_path / "table.icdb")
+    IC.write_precomputed_db(path, TABLE, {"data_version": "v1"}, ["seco"])
+    db = IC.PrecomputedDB(path)
+
+    assert db.meta["data_version"] == "v1"
+    assert db.ic_variants == ["annotation", "seco"]
+    assert list(db) == ["GO:0000001", "GO:0000002", "GO:0003674", "GO:0008150"]
+    assert dict(db) == {x: y[:3] for x, y in TABLE.items()}
+    assert "GO:0000004" not in db and "GO:-1" not in db
+    assert db.get("GO:0000004", ["None"] * 3) == ["None"] * 3
+    rows = db.rows(IC.go_numbers_array(["GO:0008150", "GO:0000004", "GO:0000001", "bad"]))
+    assert rows.tolist() == [3, -1, 0, -1]
+    numpy.testing.assert_allclose(db.variant_column("seco")[rows[rows >= 0]], [0.1, 0.2])
+    assert math.isnan(db.variant_column("seco")[1])
+
+
+def test_open_rejects_other_array_files(engine):
+    with pytest.raises(ValueError):
+        IC.PrecomputedDB(engine.godag.path)
+
+
+# A pickle is converted once into the cache folder, never next to it
+def test_pickle_conversion_cache(tmp_path, capsys):
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    pickle_path = str(shared / "db.pickle")
+    with open(pickle_path, "wb") as fwrite:
+        pickle.dump({x: y[:3] for x, y in TABLE.items()}, fwrite)
+    cache = str(tmp_path / "data" / "precomputed") + "/"
+
+    assert IC.open_precomputed(pickle_path) == {x: y[:3] for x, y in TABLE.items()}
+    db = IC.open_precomputed(pickle_path, cache)
+    assert isinstance(db, IC.PrecomputedDB)
+    assert os.path.dirname(db.path) + "/" == cache
+    assert dict(db) == {x: y[:3] for x, y in TABLE.items()}
+    assert os.listdir(str(shared)) == ["db.pickle"]
+    assert "Converting" in capsys.readouterr().out
+
+    assert IC.open_precomputed(pickle_path, cache).path == db.path
+    assert "Converting" not in capsys.readouterr().out
+
+    with open(pickle_path, "wb") as fwrite:
+        pickle.dump({"GO:0000001": [9, 9, 9.0]}, fwrite)
+    os.utime(pickle_path, (1, 1))
+    assert dict(IC.open_precomputed(pickle_path, cache)) == {"GO:0000001": [9, 9, 9.0]}
+    assert "Converting" in capsys.readouterr().out
+
+
+# --precompute to .icdb and to .pickle give the same table
+def test_precompute_binary_and_pickle(engine, tmp_path):
+    universe = str(tmp_path / "universe.list")
+    engine.precompute_data(universe, str(tmp_path / "db.icdb"), ic_variants=[])
+    engine.precompute_data(universe, str(tmp_path / "db.pickle"))
+    db = IC.PrecomputedDB(str(tmp_path / "db.icdb"))
+    assert db.meta["data_version"] == "releases/2000-01-01"
+    assert db.meta["universe_sha256"] == IC.universe_sha256(engine.annotations)
+    assert db.ic_variants == ["annotation"]
+    assert dict(db) == IC.unpickle_object(str(tmp_path / "db.pickle"))
+    assert db["GO:0000001"][:2] == [1, 1]
@@ -0,0 +1,56 @@
+import json
+
+import IC_lib as IC
+from test_precalc_files import write_inputs
+
+
+def read_json(path):
+    with open(path) as fread:
+        return json.load(fread)
+
+
+def test_precalc_profile_caches(precomputed_engine, tmp_path):
+    path = write_inputs(tmp_path, 1)[0]
+    with open(path, "a") as fwrite:
+        fwrite.write("R0\tGO:0000002\nR0\tGO:9999999\n")
+    precomputed_engine.precalc_IC(path, plot=False, profile=True)
+    report = read_json(str(tmp_path / "outputs" / "input_0.profile.json"))
+    assert report["counters"]["input_rows"] == 5
+    assert report["counters"]["distinct_go"] == 4
+    # Only the caches that ran are reported
+    assert report["caches"] == {"precalc_terms": {"hits": 1, "misses": 4, "hit_rate": 0.2}}
+    assert [x["phase"] for x in report["phases"]] == ["load_godag", "load_precomputed", "precalc", "plot_density"]
+
+
+def test_precalc_files_profile_workers(precomputed_engine, tmp_path):
+    inputs = write_inputs(tmp_path, 3)
+    precomputed_engine.precalc_files(inputs, plot=False, workers=2, profile=True)
+    report = read_json(str(tmp_path / "outputs" / "summary.profile.json"))
+    workers = report["precalc_files"]
+    assert workers["workers"] == 2
+    assert workers["jobs"] == 3
+    assert 1 <= workers["workers_used"] <= 2
+    assert sum(x["rows"] for x in workers["per_worker"]) == 9
+    assert workers["utilization"] is not None
+    assert report["counters"]["input_rows"] == 9
+    assert report["caches"]["precalc_terms"]["misses"] == 9
+
+
+def test_precompute_profile(engine, tmp_path):
+    engine.precompute_data(str(tmp_path / "universe.list"), str(tmp_path / "db.icdb"), profile=True)
+    report = read_json(str(tmp_path / "db.icdb.profile.json"))
+    section = report["compute_ontology"]
+    assert section["terms"] == section["terms_computed"] == len(engine.godag)
+    assert section["ic_variants"] == list(IC.INTRINSIC_IC_VARIANTS)
+    assert report["caches"] == {}
+
+
+def test_compute_compute_profile(engine):
+    engine.profiler = IC.Profiler()
+    engine.annotations = engine.compile_universe_counts(IC.Counter({"GO:0008150": 2, "GO:0000001": 1, "GO:0000002": 1}))
+    input_data = engine.process_file([["P1", "GO:0000002"], ["P1", "GO:0000001"], ["P2", "GO:0000002"]])
+    assert len(engine.compute_compute(input_data)) == 3
+    workers = engine.profile_report()["compute_compute"]
+    assert workers["jobs"] == 1
+    assert workers["caches"]["calculate_IC"]["misses"] == 2
+    assert workers["caches"]["calculate_IC"]["hits"] == 1
@@ -0,0 +1,97 @@
+import math
+
+import numpy
+import pytest
+
+import IC_lib as IC
+
+
+# Summary lines by walking the rows protein by protein
+def brute_lines(dag, ic, rows):
+    proteins = {}
+    for accession, goterm in rows:
+        proteins.setdefault(accession, []).append(dag.get(goterm))
+    lines = []
+    for accession, terms in proteins.items():
+        distinct = set(terms)
+        ancestors = set(y for x in distinct for y in dag.ancestors(x))
+        for code, aspect in enumerate(IC.NAMESPACES):
+            in_aspect = sorted(x for x in distinct if dag.namespace[x] == code)
+            if not in_aspect:
+                continue
+            specific = [x for x in in_aspect if x not in ancestors]
+            ics = [ic[x] for x in in_aspect if not math.isnan(ic[x])]
+            lines.append([
+                accession,
+                aspect,
+                sum(dag.namespace[x] == code for x in terms),
+                len(in_aspect),
+                len(specific),
+                max(ics) if ics else None,
+                sum(ics) / len(ics) if ics else None,
+                sum(ics) if ics else None,
+                ",".join(dag.go_id(x) for x in specific),
+            ])
+    return lines
+
+
+def parse_lines(lines):
+    parsed = []
+    for line in lines:
+        fields = line.split("\t")
+        values = [None if x == "None" else float(x) for x in fields[5:8]]
+        parsed.append(fields[:2] + [int(x) for x in fields[2:5]] + values + fields[8:])
+    return parsed
+
+
+def assert_same_lines(found, expected):
+    assert len(found) == len(expected)
+    for a, b in zip(found, expected):
+        assert a[:5] == b[:5] and a[8] == b[8]
+        for x, y in zip(a[5:8], b[5:8]):
+            assert x == y if y is None else x == pytest.approx(y, rel=1e-9)
+
+
+@pytest.mark.parametrize("buffer_rows,part_size", [(IC.PROTEIN_BUFFER_ROWS, IC.PROTEIN_PART_SIZE), (17, 3), (1, 1)])
+def test_protein_summary_brute_force(synthetic, buffer_rows, part_size):
+    engine, paths = synthetic
+    engine.load_annotation_universe(paths["gpad"])
+    dag = engine.godag
+    ic = engine.term_ics("universe")
+    # Primary ids only, as precalc adds them; the input is not sorted
+    rows = [x for x in IC.iter_input_rows(paths["input"]) if dag.get(x[1]) is not None]
+    rows = rows[1::2] + rows[::2]
+    summary = IC.ProteinSummary(dag, ic, buffer_rows, part_size)
+    for accession, goterm in rows:
+        summary.add(accession, goterm)
+    lines = list(summary.lines())
+    assert lines[0] == "#" + "\t".join(IC.PROTEIN_COLUMNS)
+    assert_same_lines(parse_lines(lines[1:]), brute_lines(dag, ic, rows))
+
+
+def test_redundant_terms_chunks(synthetic):
+    engine, paths = synthetic
+    dag = engine.godag
+    rows = [x for x in IC.iter_input_rows(paths["input"]) if dag.get(x[1]) is not None]
+    names = {}
+    keys = numpy.unique([names.setdefault(a, len(names)) * len(dag) + dag.get(g) for a, g in rows])
+    expected = IC.redundant_terms(dag, keys, keys // len(dag), keys % len(dag))
+    assert expected.any()
+    for chunk_pairs in [1, 5, 100]:
+        numpy.testing.assert_array_equal(
+            IC.redundant_terms(dag, keys, keys // len(dag), keys % len(dag), chunk_pairs), expected)
+
+
+def test_precalc_writes_protein_summary(precomputed_engine, tmp_path):
+    path = tmp_path / "input.tsv"
+    path.write_text("P1\tGO:0000002\nP1\tGO:0000001\nP1\tGO:0000002\nP1\tGO:0000004\nP2\tGO:0000003\nP2\tGO:0000009\n")
+    summary = precomputed_engine.precalc_IC(str(path), plot=False, proteins=True)
+    with open(summary["proteins"]) as fread:
+        lines = fread.read().splitlines()
+    ic = precomputed_engine.precomputed_ics
+    assert lines[1:] == [
+        "P1\tbiological_process\t3\t2\t1\t{0}\t{1}\t{2}\tGO:0000002".format(
+            ic["GO:0000002"][2], (ic["GO:0000002"][2] + ic["GO:0000001"][2]) / 2, ic["GO:0000002"][2] + ic["GO:0000001"][2]),
+        "P1\tmolecular_function\t1\t1\t1\t{0}\t{0}\t{0}\tGO:0000004".format(ic["GO:0000004"][2]),
+        "P2\tbiological_process\t1\t1\t1\tNone\tNone\tNone\tGO:0000003",
+    ]
@@ -0,0 +1,50 @@
+import os
+import threading
+
+import pytest
+
+import IC_server
+
+
+@pytest.fixture
+def server(precomputed_engine, tmp_path, monkeypatch):
+    # Relative outputs, as with the default folders
+    monkeypatch.chdir(tmp_path)
+    precomputed_engine.outputs_folder = "outputs/"
+    precomputed_engine.plots_folder = "plots/"
+    service = IC_server.ICService(precomputed_engine)
+    httpd = IC_server.ICHTTPServer(("127.0.0.1", 0), service)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def client(httpd):
+    return IC_server.ICClient("http://127.0.0.1:%d" % httpd.server_address[1], timeout=30)
+
+
+def test_precalc_IC_returns_absolute_paths(server, tmp_path):
+    inputfile = tmp_path / "input.tsv"
+    inputfile.write_text("P1\tGO:0000002\nP2\tGO:0000004\n")
+    result = client(server).precalc_IC(str(inputfile), plot=False, proteins=True)
+    for key in ("output", "density", "proteins"):
+        assert os.path.isabs(result[key])
+        assert os.path.exists(result[key])
+    assert result["plot"] is None
+
+
+def test_unexpected_errors_get_a_500(server, tmp_path):
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    server.service.precalc_IC = fail
+    inputfile = tmp_path / "input.tsv"
+    inputfile.write_text("P1\tGO:0000002\n")
+    with pytest.raises(RuntimeError) as error:
+        client(server).precalc_IC(str(inputfile), plot=False)
+    assert "500" in str(error.value)
+    assert "disk full" in str(error.value)
+    # The server keeps answering
+    assert client(server).health()["status"] == "ok"
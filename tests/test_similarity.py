@@ -0,0 +1,110 @@
+import itertools
+
+import numpy
+import pytest
+
+import IC_lib as IC
+
+
+# MICA of two DAG terms by intersecting their ancestor sets
+def brute_mica(dag, ic, a, b):
+    common = (set(dag.ancestors(a)) | {a}) & (set(dag.ancestors(b)) | {b})
+    return max([ic[x] for x in common if ic[x] > 0] or [0.0])
+
+
+def brute_similarity(dag, ic, a, b, method):
+    mica = brute_mica(dag, ic, a, b)
+    ic_sum = ic[a] + ic[b]
+    if method == "resnik":
+        return mica
+    if method == "lin":
+        return 2 * mica / ic_sum if ic_sum > 0 else 1.0
+    return 1 / (1 + max(ic_sum - 2 * mica, 0))
+
+
+@pytest.fixture
+def universe_engine(synthetic):
+    engine, paths = synthetic
+    engine.load_annotation_universe(paths["gpad"])
+    return engine, paths, engine.term_ics("universe")
+
+
+@pytest.mark.parametrize("method", IC.SIMILARITY_METHODS)
+def test_term_similarity_brute_force(universe_engine, method):
+    engine, _, ic = universe_engine
+    dag = engine.godag
+    terms = [x for x in range(len(dag)) if numpy.isfinite(ic[x])][::4]
+    goterms = [dag.go_id(x) for x in terms]
+    result = engine.term_similarity(goterms, goterms, method, "universe")
+    for i, j in itertools.product(range(len(terms)), repeat=2):
+        if dag.namespace[terms[i]] != dag.namespace[terms[j]]:
+            assert numpy.isnan(result[i, j])
+        else:
+            assert result[i, j] == pytest.approx(brute_similarity(dag, ic, terms[i], terms[j], method), rel=1e-5, abs=1e-6)
+
+
+# GO sets per protein and aspect as protein_term_sets builds them
+def brute_sets(dag, ic, rows):
+    sets = {}
+    for prot_id, goterm in rows:
+        index = dag.resolve(goterm)
+        if index is not None and numpy.isfinite(ic[index]):
+            sets.setdefault(dag.aspect(index), {}).setdefault(prot_id, set()).add(index)
+    return sets
+
+
+@pytest.mark.parametrize("method,aggregate", [("resnik", "bma"), ("lin", "max"), ("jiang_conrath", "bma")])
+def test_protein_similarity_brute_force(universe_engine, method, aggregate):
+    engine, paths, ic = universe_engine
+    dag = engine.godag
+    rows = list(IC.iter_input_rows(paths["input"]))[:160]
+    result = engine.protein_similarity(rows, method, aggregate, "universe")
+    sets = brute_sets(dag, ic, rows)
+    assert sorted(result) == sorted(sets)
+    for aspect, proteins in sets.items():
+        assert list(result[aspect]["accessions"]) == sorted(proteins)
+        for i, p in enumerate(sorted(proteins)):
+            for j, q in enumerate(sorted(proteins)):
+                scores = numpy.array([[brute_similarity(dag, ic, a, b, method) for b in proteins[q]] for a in proteins[p]])
+                if aggregate == "max":
+                    expected = scores.max()
+                else:
+                    expected = (scores.max(axis=1).mean() + scores.max(axis=0).mean()) / 2
+                assert result[aspect]["similarity"][i, j] == pytest.approx(expected, rel=1e-5, abs=1e-6)
+
+
+def read_pairs(path):
+    pairs = {}
+    with open(path) as fread:
+        for line in fread:
+            a, b, aspect, score = line.rstrip("\n").split("\t")
+            pairs[(a, b, aspect)] = float(score)
+    return pairs
+
+
+# Blocks and workers give every pair once, as the dense matrix does
+def test_all_vs_all_matches_dense(universe_engine, tmp_path):
+    engine, paths, ic = universe_engine
+    dense = engine.protein_similarity(paths["input"], "lin", "bma", "universe")
+    output = str(tmp_path / "pairs.tsv")
+    engine.similarity_all_vs_all(paths["input"], output, "lin", "bma", "universe", block_size=7, workers=2)
+    pairs = read_pairs(output)
+    expected = {}
+    for aspect, result in dense.items():
+        names = result["accessions"]
+        for i, j in itertools.combinations(range(len(names)), 2):
+            expected[(names[i], names[j], aspect)] = result["similarity"][i, j]
+    assert len(pairs) > 100
+    assert pairs.keys() == expected.keys()
+    for key, score in pairs.items():
+        assert score == pytest.approx(expected[key], rel=1e-6)
+
+    engine.similarity_all_vs_all(paths["input"], output, "lin", "bma", "universe", block_size=5, workers=1, top_k=3, min_score=0.2)
+    top = read_pairs(output)
+    for aspect, result in dense.items():
+        names = list(result["accessions"])
+        for i, name in enumerate(names):
+            found = sorted((score for (a, _, x), score in top.items() if a == name and x == aspect), reverse=True)
+            others = numpy.delete(result["similarity"][i], i)
+            best = sorted(others[others >= 0.2], reverse=True)[:3]
+            numpy.testing.assert_allclose(found, best, rtol=1e-6)